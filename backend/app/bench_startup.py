@@ -0,0 +1,114 @@
+"""Mide el tiempo de import y la memoria de arranque de los puntos de entrada.
+
+Uso: python -m app.bench_startup [api|worker|whisper ...] [--runs N] [--whisper-dir RUTA] [--top N]
+
+Cada medida se hace en un intérprete nuevo (sin cachés de módulos compartidas), así
+que refleja lo que paga una réplica de la API, un worker o un reinicio con --reload.
+Se informa la mediana de wall time del import, el RSS máximo del proceso y los
+módulos de primer nivel que más tardan en importarse (-X importtime).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_WHISPER_DIR = BACKEND_DIR.parent / "whisper_service"
+
+# Código que importa cada punto de entrada tal y como arranca en producción
+ENTRY_POINTS = {
+    "api": "import app.main",
+    # El worker importa los módulos de tareas (celery include) al arrancar
+    "worker": "from app.celery_app import celery; celery.loader.import_default_modules()",
+    "whisper": "import service",
+}
+
+_PROBE = """
+import resource, sys, time
+started = time.perf_counter()
+exec(compile({code!r}, "<entry>", "exec"))
+elapsed = time.perf_counter() - started
+print("BENCH", elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(sys.modules))
+"""
+
+
+def _run(entry: str, cwd: Path, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _PROBE.format(code=ENTRY_POINTS[entry])]
+    env = {**os.environ, "PYTHONPATH": str(cwd), "PYTHONDONTWRITEBYTECODE": "1"}
+    return subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _top_imports(stderr: str, top: int) -> list:
+    """Paquetes por tiempo acumulado de import (-X importtime)"""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # El import más externo de cada paquete es el de mayor tiempo acumulado (incluye
+        # lo que arrastra: app incluye todo lo demás)
+        package = name.strip().split(".")[0]
+        totals[package] = max(totals[package], int(cumulative))
+    return sorted(((package, us / 1e6) for package, us in totals.items()), key=lambda item: -item[1])[:top]
+
+
+def bench(entry: str, cwd: Path, runs: int, top: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        proc = _run(entry, cwd)
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("BENCH")), None)
+        if proc.returncode != 0 or line is None:
+            return {"entry": entry, "error": proc.stderr.strip().splitlines()[-1:] or ["unknown error"]}
+        _, elapsed, maxrss_kb, modules = line.split()
+        samples.append((float(elapsed), int(maxrss_kb), int(modules)))
+
+    profile = _run(entry, cwd, importtime=True)
+    return {
+        "entry": entry,
+        "import_seconds": round(statistics.median(s[0] for s in samples), 3),
+        "max_rss_mb": round(statistics.median(s[1] for s in samples) / 1024, 1),
+        "modules": samples[0][2],
+        "slowest_imports": [[package, round(seconds, 3)] for package, seconds in _top_imports(profile.stderr, top)],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entries", nargs="*", metavar="{" + ",".join(ENTRY_POINTS) + "}")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--whisper-dir", type=Path, default=DEFAULT_WHISPER_DIR)
+    parser.add_argument("--json", action="store_true", help="salida JSON (para comparar entre commits)")
+    args = parser.parse_args(argv)
+    unknown = set(args.entries) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+
+    results = [
+        bench(entry, args.whisper_dir if entry == "whisper" else BACKEND_DIR, args.runs, args.top)
+        for entry in args.entries or list(ENTRY_POINTS)
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        if "error" in result:
+            print(f"{result['entry']:8s} failed: {result['error'][0]}")
+            continue
+        print(f"{result['entry']:8s} import {result['import_seconds']:.3f}s  "
+              f"max RSS {result['max_rss_mb']:.1f} MB  {result['modules']} modules")
+        for package, seconds in result["slowest_imports"]:
+            print(f"{'':10s}{package:24s}{seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
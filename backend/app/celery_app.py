@@ -1,5 +1,7 @@
 import os
+import json
 from celery import Celery
+from app.utils.json_codec import register_celery_serializer
 
 redis_url = os.environ.get("REDIS_URL", "redis://redis:6379/0")
 
@@ -7,9 +9,68 @@ celery = Celery(
     "streamsculptor",
     broker=redis_url,
     backend=redis_url,
-    include=["app.tasks.process_vod"],
+    include=["app.tasks.process_vod", "app.tasks.analyze_audio", "app.tasks.sharded", "app.tasks.pipeline", "app.tasks.scheduling", "app.tasks.live"],
 )
 
-celery.conf.task_routes = {
-    "app.tasks.process_vod.*": {"queue": "vod"},
+# Colas por clase de recurso: una descarga larga no ocupa los slots de encoding
+QUEUE_VOD = "vod"            # orquestación del pipeline (ligera)
+QUEUE_IO = "io"              # descargas yt-dlp y subidas a MinIO
+QUEUE_ENCODE = "encode"      # encoding de clips con ffmpeg
+QUEUE_ANALYSIS = "analysis"  # análisis de audio con numpy/librosa
+QUEUE_ASR = "asr"            # llamadas al servicio Whisper
+
+# Se evalúan en orden: nombres exactos primero y luego los patrones
+DEFAULT_TASK_ROUTES = {
+    "app.tasks.process_vod.download_and_extract_audio": QUEUE_IO,
+    "app.tasks.process_vod.download_full_video": QUEUE_IO,
+    "app.tasks.analyze_audio.fetch_clip_sections": QUEUE_IO,
+    "app.tasks.live.start_live_ingest": QUEUE_IO,
+    "app.tasks.live.live_ingest_step": QUEUE_IO,
+    "app.tasks.process_vod.transcribe_vod_audio": QUEUE_ASR,
+    "app.tasks.analyze_audio.analyze_audio_segments": QUEUE_ANALYSIS,
+    "app.tasks.analyze_audio.generate_clips_task": QUEUE_ENCODE,
+    "app.tasks.analyze_audio.generate_window_clip_task": QUEUE_ENCODE,
+    "app.tasks.sharded.analyze_audio_shard": QUEUE_ANALYSIS,
+    "app.tasks.sharded.merge_shard_analyses": QUEUE_ANALYSIS,
+    "app.tasks.sharded.transcribe_audio_shard": QUEUE_ASR,
+    "app.tasks.sharded.merge_shard_transcripts": QUEUE_ASR,
+    "app.tasks.*": QUEUE_VOD,
 }
+
+def load_task_routes() -> dict:
+    """Rutas por defecto, sobrescribibles con CELERY_TASK_ROUTES='{"task.name": "queue"}'"""
+    routes = dict(DEFAULT_TASK_ROUTES)
+    routes.update(json.loads(os.environ.get("CELERY_TASK_ROUTES", "{}")))
+    return {name: {"queue": queue} for name, queue in routes.items()}
+
+# Mensajes y resultados con orjson: numpy nativo y sin pasada previa de sanitizado
+register_celery_serializer()
+celery.conf.task_serializer = "orjson"
+celery.conf.result_serializer = "orjson"
+celery.conf.accept_content = ["orjson", "json"]
+celery.conf.result_accept_content = ["orjson", "json"]
+
+celery.conf.task_routes = load_task_routes()
+celery.conf.task_default_queue = QUEUE_VOD
+# Tareas largas: cada worker reserva solo lo que está ejecutando
+celery.conf.task_acks_late = True
+celery.conf.worker_prefetch_multiplier = 1
+
+# Tamaño de pool por clase de worker (ver app/worker.py); sobrescribible con
+# WORKER_<CLASE>_POOL / _CONCURRENCY / _PREFETCH, p. ej. WORKER_ENCODE_CONCURRENCY=4
+_cpus = os.cpu_count() or 2
+DEFAULT_WORKER_CLASSES = {
+    "vod": {"queues": [QUEUE_VOD], "pool": "threads", "concurrency": 8, "prefetch": 1},
+    "io": {"queues": [QUEUE_IO], "pool": "threads", "concurrency": 8, "prefetch": 1},
+    "encode": {"queues": [QUEUE_ENCODE], "pool": "prefork", "concurrency": max(1, _cpus // 2), "prefetch": 1},
+    "analysis": {"queues": [QUEUE_ANALYSIS], "pool": "prefork", "concurrency": max(1, _cpus // 2), "prefetch": 1},
+    "asr": {"queues": [QUEUE_ASR], "pool": "threads", "concurrency": 2, "prefetch": 1},
+}
+
+def worker_class_settings(name: str) -> dict:
+    settings = dict(DEFAULT_WORKER_CLASSES[name])
+    prefix = f"WORKER_{name.upper()}_"
+    settings["pool"] = os.environ.get(prefix + "POOL", settings["pool"])
+    settings["concurrency"] = int(os.environ.get(prefix + "CONCURRENCY", settings["concurrency"]))
+    settings["prefetch"] = int(os.environ.get(prefix + "PREFETCH", settings["prefetch"]))
+    return settings
@@ -1,17 +1,62 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Literal
 from datetime import timedelta
 import uuid
 import json
-from app.tasks.process_vod import download_and_extract_audio, transcribe_vod_audio, process_vod_complete, process_vod_with_clips
-from app.tasks.analyze_audio import analyze_audio_segments, generate_clips_task
+import redis.asyncio as aioredis
+from app.tasks import signatures as tasks
+from app.tasks.signatures import DEFAULT_SHARD_SECONDS
+from app.services.analysis_store import load_analysis_result
+from app.services.live_state import load_live_state, live_active_key
 from app.services.minio_client import get_minio_client
-from app.services.whisper_client import transcribe_audio, transcribe_audio_from_minio
+from app.services.redis_client import get_redis_url, get_redis_client
+from app.services.source_media import source_object
+from app.services.async_storage import (
+    get_async_minio_client, close_async_minio_client, read_object, read_json, object_exists, open_object_stream
+)
+from app.services.clip_previews import PREVIEW_ASSETS
+from app.services.clip_bundle import ClipBundle, abundle_entries
+from app.services.transcript_index import (
+    DEFAULT_PAGE_SEGMENTS, query_transcript, save_transcript_index, transcript_index_object
+)
+from app.services.srt_generator import SRTGenerator
+from app.services.transcript_search import search as search_transcripts, DEFAULT_SEARCH_LIMIT
+from app.services.progress import progress_channel, progress_snapshot_key, TERMINAL_STAGES
+from app.services.segment_selection import DEFAULT_MAX_OVERLAP, DEFAULT_MIN_GAP
+from app.services.live_highlights import DEFAULT_LIVE_TOP_N
+from app.services.scheduler import (
+    JobScheduler, LANE_PRIORITY, estimate_pipeline_seconds, estimate_render_seconds
+)
 from app.models.clip_models import GenerateClipsRequest, ClipsResponse, AudioAnalysisResponse
+from app.utils.json_codec import dumps
+
+class FastJSONResponse(Response):
+    """Respuesta JSON con el mismo codificador que las tareas (numpy nativo)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+# Mientras la descarga diferida del VOD está en curso no se encola otra
+VIDEO_FETCH_TTL_SECONDS = 3600
 
-app = FastAPI(title="StreamSculptor - Ingest & Clips API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_async_minio_client()
+
+# Los endpoints que leen de MinIO son async (cliente miniopy-async) y no ocupan el
+# threadpool; los que solo hablan con Redis o SQLite son cortos y siguen siendo def
+app = FastAPI(
+    title="StreamSculptor - Ingest & Clips API",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
+)
 
 # Configurar CORS para el frontend
 app.add_middleware(
@@ -33,11 +78,35 @@ class TranscribeMinIORequest(BaseModel):
 class DownloadRequest(BaseModel):
     source_url: str
     user_id: int | None = None
+    expected_duration: float | None = None  # segundos de VOD, si se conocen (para el scheduler)
+    # audio_first: solo se descarga el audio; el vídeo completo se baja cuando se pide
+    ingest_mode: Literal["full", "audio_first"] = "full"
 
 class ProcessVODWithClipsRequest(BaseModel):
     source_url: str
     user_id: int | None = None
     max_clips: int = 10
+    expected_duration: float | None = None
+    caption_mode: Literal["none", "burned", "both"] = "none"
+    # audio_first: audio para el análisis y solo las secciones de vídeo de los clips
+    ingest_mode: Literal["full", "audio_first"] = "full"
+    # Modo sharded: reparte el análisis (y opcionalmente la transcripción) entre workers
+    sharded: bool = False
+    shard_seconds: float = DEFAULT_SHARD_SECONDS
+    shard_transcription: bool = False
+
+class SearchClipRequest(BaseModel):
+    job_id: str
+    start: float
+    end: float
+    user_id: int | None = None
+    caption_mode: Literal["none", "burned", "both"] = "none"
+
+class LiveIngestRequest(BaseModel):
+    source_url: str  # canal en directo (yt-dlp) o manifiesto HLS .m3u8
+    user_id: int | None = None
+    top_n: int = DEFAULT_LIVE_TOP_N
+    caption_mode: Literal["none", "burned", "both"] = "none"
 
 @app.get("/health")
 def health():
@@ -50,23 +119,39 @@ def health():
 @app.post("/ingest/download")
 def ingest_download(req: DownloadRequest):
     job_id = str(uuid.uuid4())
-    task = download_and_extract_audio.delay(job_id, req.source_url, req.user_id)
-    return {"job_id": job_id, "task_id": task.id, "status": "queued"}
+    queue = JobScheduler().submit(
+        tasks.DOWNLOAD_AND_EXTRACT_AUDIO,
+        [job_id, req.source_url, req.user_id, req.ingest_mode],
+        user_id=req.user_id,
+        job_id=job_id,
+        estimated_seconds=estimate_pipeline_seconds(req.expected_duration, fraction=0.2),
+        publish_outcome=True
+    )
+    return {"job_id": job_id, "task_id": queue["task_id"], "status": "queued", "queue": queue}
 
 @app.post("/ingest/download-and-transcribe")
 def ingest_download_and_transcribe(req: DownloadRequest):
     job_id = str(uuid.uuid4())
-    task = process_vod_complete.delay(job_id, req.source_url, req.user_id)
-    return {"job_id": job_id, "task_id": task.id, "status": "processing"}
+    queue = JobScheduler().submit(
+        tasks.PROCESS_VOD_COMPLETE,
+        [job_id, req.source_url, req.user_id, req.ingest_mode],
+        user_id=req.user_id,
+        job_id=job_id,
+        estimated_seconds=estimate_pipeline_seconds(req.expected_duration, fraction=0.7),
+        publish_outcome=True
+    )
+    return {"job_id": job_id, "task_id": queue["task_id"], "status": "processing", "queue": queue}
 
-@app.post("/transcribe/from-minio")
+@app.post("/transcribe/from-minio", status_code=202)
 def transcribe_from_minio_endpoint(req: TranscribeMinIORequest):
-    try:
-        audio_object = f"{req.job_id}/audio.wav"
-        result = transcribe_audio_from_minio(req.bucket, audio_object)
-        return {"job_id": req.job_id, "transcription": result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Encola la transcripción y responde enseguida; el resultado queda en /transcript/{job_id}"""
+    queue = JobScheduler().submit(
+        tasks.TRANSCRIBE_VOD_AUDIO,
+        [req.job_id, req.bucket],
+        job_id=req.job_id,
+        publish_outcome=True
+    )
+    return {"job_id": req.job_id, "task_id": queue["task_id"], "status": "transcribing", "queue": queue}
 
 # ===============================
 # NUEVOS ENDPOINTS - CLIPS
@@ -76,73 +161,132 @@ def transcribe_from_minio_endpoint(req: TranscribeMinIORequest):
 def process_vod_with_clips_endpoint(req: ProcessVODWithClipsRequest):
     """Pipeline completo: descarga + transcribe + análisis + clips"""
     job_id = str(uuid.uuid4())
-    task = process_vod_with_clips.delay(
-        job_id,
-        req.source_url,
-        req.user_id,
-        req.max_clips
+    if req.sharded:
+        task_name = tasks.PROCESS_VOD_WITH_CLIPS_SHARDED
+        args = [job_id, req.source_url, req.user_id, req.max_clips, req.shard_seconds, req.shard_transcription, req.caption_mode, req.ingest_mode]
+    else:
+        task_name = tasks.PROCESS_VOD_WITH_CLIPS
+        args = [job_id, req.source_url, req.user_id, req.max_clips, req.caption_mode, req.ingest_mode]
+    queue = JobScheduler().submit(
+        task_name,
+        args,
+        user_id=req.user_id,
+        job_id=job_id,
+        estimated_seconds=estimate_pipeline_seconds(req.expected_duration)
     )
     return {
         "job_id": job_id,
-        "task_id": task.id,
-        "status": "processing",
+        "task_id": queue["task_id"],
+        "status": "processing" if queue["state"] == "running" else "queued",
+        "queue": queue,
         "message": "Full pipeline started: download → transcribe → analyze → generate clips"
     }
 
 @app.post("/audio/analyze/{job_id}")
-def analyze_audio_endpoint(job_id: str, window_size: float = 30.0, step_size: float = 10.0):
-    """Analizar audio y encontrar segmentos con alta energía"""
-    task = analyze_audio_segments.delay(job_id, window_size, step_size)
-    return {"job_id": job_id, "task_id": task.id, "status": "analyzing"}
+def analyze_audio_endpoint(
+    job_id: str,
+    window_size: float = 30.0,
+    step_size: float = 10.0,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP,
+    mode: Literal["fixed", "variable", "coarse_to_fine"] = "fixed",
+    min_duration: float = 15.0,
+    max_duration: float = 60.0,
+    refine_step: float = 1.0
+):
+    """Analizar audio y encontrar segmentos con alta energía (sin ventanas solapadas).
+
+    mode="variable" ajusta la duración de cada segmento entre min_duration y max_duration;
+    mode="coarse_to_fine" busca en una envolvente gruesa y refina solo los candidatos.
+    """
+    if min_duration <= 0 or max_duration < min_duration:
+        raise HTTPException(status_code=400, detail="Invalid duration range")
+    queue = JobScheduler().submit(
+        tasks.ANALYZE_AUDIO_SEGMENTS,
+        [job_id, window_size, step_size],
+        {
+            "max_overlap": max_overlap,
+            "min_gap": min_gap,
+            "mode": mode,
+            "min_duration": min_duration,
+            "max_duration": max_duration,
+            "refine_step": refine_step
+        },
+        job_id=job_id,
+        lane=LANE_PRIORITY,
+        publish_outcome=True
+    )
+    return {"job_id": job_id, "task_id": queue["task_id"], "status": "analyzing", "queue": queue}
 
 @app.get("/audio/analysis/{job_id}")
-def get_audio_analysis(job_id: str):
+async def get_audio_analysis(job_id: str):
     """Obtener resultado del análisis de audio"""
-    client = get_minio_client()
-    bucket = "vods"
-    analysis_object = f"{job_id}/audio_analysis.json"
-
     try:
-        data = client.get_object(bucket, analysis_object)
-        analysis = json.loads(data.read().decode('utf-8'))
-        return analysis
+        # Lectura y decodificación de la tabla numpy fuera del event loop
+        analysis, segments = await run_in_threadpool(load_analysis_result, job_id)
+        # La tabla binaria solo se convierte a JSON aquí, en el borde HTTP
+        analysis["segments"] = segments.to_dicts()
+        return FastJSONResponse(analysis)
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Analysis not found for job {job_id}: {e}")
 
 @app.post("/clips/generate")
 def generate_clips_endpoint(req: GenerateClipsRequest):
-    """Generar clips basados en análisis de audio"""
-    task = generate_clips_task.delay(req.job_id, req.max_clips)
+    """Generar clips basados en análisis de audio (re-render: carril prioritario)"""
+    queue = JobScheduler().submit(
+        tasks.GENERATE_CLIPS,
+        [req.job_id, req.max_clips, req.caption_mode],
+        user_id=req.user_id,
+        job_id=req.job_id,
+        estimated_seconds=estimate_render_seconds(req.max_clips),
+        lane=LANE_PRIORITY,
+        publish_outcome=True
+    )
     return {
         "job_id": req.job_id,
-        "task_id": task.id,
+        "task_id": queue["task_id"],
         "status": "generating_clips",
-        "max_clips": req.max_clips
+        "max_clips": req.max_clips,
+        "queue": queue
     }
 
-@app.get("/clips/{job_id}")
-def get_clips(job_id: str):
-    """Listar todos los clips generados para un job"""
-    client = get_minio_client()
-    bucket = "vods"
-    metadata_object = f"{job_id}/clips_metadata.json"
+async def load_clips_metadata(job_id: str) -> dict:
+    """clips_metadata.json del job (puede ser un conjunto parcial)"""
+    clips_data = await read_json(get_async_minio_client(), "vods", f"{job_id}/clips_metadata.json")
+    # Metadata anterior a la publicación incremental: siempre es definitiva
+    clips_data.setdefault("status", "completed")
+    clips_data.setdefault("completed", True)
+    clips_data.setdefault("clips_expected", clips_data.get("clips_count", len(clips_data.get("clips", []))))
+    return clips_data
 
+@app.get("/clips/{job_id}")
+async def get_clips(job_id: str):
+    """Listar los clips publicados para un job (puede ser un conjunto parcial)"""
     try:
-        data = client.get_object(bucket, metadata_object)
-        clips_data = json.loads(data.read().decode('utf-8'))
-        return clips_data
+        return FastJSONResponse(await load_clips_metadata(job_id))
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Clips not found for job {job_id}: {e}")
 
-@app.get("/clips/{job_id}/download/{clip_index}")
-def download_clip(job_id: str, clip_index: int):
-    """Descargar un clip específico"""
-    client = get_minio_client()
-    bucket = "vods"
-    clip_object = f"{job_id}/clips/clip_{clip_index:02d}.mp4"
+async def resolve_clip_object(job_id: str, clip_index: int, captioned: bool = False) -> str:
+    """Objeto del clip según la metadata (los renders viven en la caché por clave)"""
+    for clip in (await load_clips_metadata(job_id)).get("clips", []):
+        if clip["clip_index"] != clip_index:
+            continue
+        if not captioned:
+            return clip["object_name"]
+        if clip.get("captioned_object"):
+            return clip["captioned_object"]
+        if clip.get("captions_burned"):
+            return clip["object_name"]
+        raise HTTPException(status_code=404, detail=f"Clip {clip_index} has no captioned version")
+    raise HTTPException(status_code=404, detail=f"Clip {clip_index} not found for job {job_id}")
 
+@app.get("/clips/{job_id}/download/{clip_index}")
+async def download_clip(job_id: str, clip_index: int, captioned: bool = False):
+    """Descargar un clip específico (captioned=true: versión con subtítulos quemados)"""
     try:
-        data = client.get_object(bucket, clip_object)
+        clip_object = await resolve_clip_object(job_id, clip_index, captioned)
+        data = await open_object_stream(get_async_minio_client(), "vods", clip_object)
         filename = f"clip_{clip_index}_{job_id}.mp4"
 
         return StreamingResponse(
@@ -150,18 +294,111 @@ def download_clip(job_id: str, clip_index: int):
             media_type="video/mp4",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Clip not found: {e}")
 
+# Los assets de preview están direccionados por contenido: nunca cambian para una misma URL de objeto
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def parse_byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """Rango "bytes=a-b" (un solo rango) como (inicio, fin inclusivo); None si no aplica"""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            # Sufijo: los últimos N bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"}, detail="Range not satisfiable")
+    return start, min(end, size - 1)
+
+async def stream_object(bucket: str, object_name: str, media_type: str, range_header: str | None = None, headers: dict | None = None):
+    """Sirve un objeto de MinIO con soporte de Range (seek en <video>, reanudar descargas)"""
+    client = get_async_minio_client()
+    size = (await client.stat_object(bucket, object_name)).size
+    headers = {"Accept-Ranges": "bytes", **(headers or {})}
+    byte_range = parse_byte_range(range_header, size)
+    if byte_range is None:
+        data = await open_object_stream(client, bucket, object_name)
+        return StreamingResponse(data, media_type=media_type, headers={**headers, "Content-Length": str(size)})
+    start, end = byte_range
+    data = await open_object_stream(client, bucket, object_name, offset=start, length=end - start + 1)
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(data, status_code=206, media_type=media_type, headers=headers)
+
+@app.get("/clips/{job_id}/assets/{clip_index}/{asset}")
+async def get_clip_asset(job_id: str, clip_index: int, asset: str, range_header: str | None = Header(None, alias="Range")):
+    """Preview ligera (preview, poster, sprite, thumbnails) de un clip para el dashboard"""
+    if asset not in PREVIEW_ASSETS:
+        raise HTTPException(status_code=400, detail=f"Invalid asset, expected one of {list(PREVIEW_ASSETS)}")
+    try:
+        clips = (await load_clips_metadata(job_id)).get("clips", [])
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Clips not found for job {job_id}: {e}")
+    clip = next((c for c in clips if c["clip_index"] == clip_index), None)
+    if clip is None or not clip.get("assets"):
+        raise HTTPException(status_code=404, detail=f"No preview assets for clip {clip_index}")
+    try:
+        return await stream_object(
+            "vods", clip["assets"][asset], PREVIEW_ASSETS[asset][1], range_header,
+            headers={"Cache-Control": ASSET_CACHE_CONTROL}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Asset not found: {e}")
+
+@app.get("/clips/{job_id}/bundle")
+async def download_clips_bundle(
+    job_id: str,
+    format: Literal["zip", "tar"] = "zip",
+    range_header: str | None = Header(None, alias="Range"),
+    if_range: str | None = Header(None, alias="If-Range")
+):
+    """Todos los clips, SRT y metadata en un ZIP/TAR generado al vuelo (reanudable con Range)"""
+    client = get_async_minio_client()
+    bucket = "vods"
+    try:
+        clips_data = await load_clips_metadata(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Clips not found for job {job_id}: {e}")
+    try:
+        bundle = ClipBundle(client, bucket, await abundle_entries(client, bucket, job_id, clips_data), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error preparing bundle: {e}")
+
+    headers = {
+        "ETag": bundle.etag,
+        "Accept-Ranges": "bytes" if bundle.supports_range else "none",
+        "Content-Disposition": f'attachment; filename="clips_{job_id}.{format}"',
+    }
+    byte_range = None
+    # If-Range con un ETag distinto: el bundle cambió y se reenvía completo
+    if bundle.supports_range and (if_range is None or if_range == bundle.etag):
+        byte_range = parse_byte_range(range_header, bundle.size)
+    if byte_range is None:
+        headers["Content-Length"] = str(bundle.size)
+        return StreamingResponse(bundle.aiter_range(), media_type=bundle.media_type, headers=headers)
+    start, end = byte_range
+    headers.update({"Content-Range": f"bytes {start}-{end}/{bundle.size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(bundle.aiter_range(start, end), status_code=206, media_type=bundle.media_type, headers=headers)
+
 @app.get("/clips/{job_id}/srt/{clip_index}")
-def download_srt(job_id: str, clip_index: int):
+async def download_srt(job_id: str, clip_index: int):
     """Descargar subtítulos SRT de un clip"""
-    client = get_minio_client()
-    bucket = "vods"
     srt_object = f"{job_id}/clips/clip_{clip_index:02d}.srt"
 
     try:
-        data = client.get_object(bucket, srt_object)
+        data = await open_object_stream(get_async_minio_client(), "vods", srt_object)
         filename = f"clip_{clip_index}_{job_id}.srt"
 
         return StreamingResponse(
@@ -172,15 +409,28 @@ def download_srt(job_id: str, clip_index: int):
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"SRT not found: {e}")
 
+@app.get("/clips/{job_id}/vtt/{clip_index}")
+async def download_vtt(job_id: str, clip_index: int):
+    """Subtítulos WebVTT de un clip (para <track> en el reproductor)"""
+    vtt_object = f"{job_id}/clips/clip_{clip_index:02d}.vtt"
+
+    try:
+        data = await open_object_stream(get_async_minio_client(), "vods", vtt_object)
+        return StreamingResponse(data, media_type="text/vtt")
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"VTT not found: {e}")
+
 @app.get("/clips/{job_id}/preview")
-def get_clips_preview(job_id: str):
+async def get_clips_preview(job_id: str):
     """Vista previa de clips con metadata básica"""
     try:
-        clips_data = get_clips(job_id)
+        clips_data = await load_clips_metadata(job_id)
 
         preview = {
             "job_id": job_id,
             "total_clips": len(clips_data.get("clips", [])),
+            "clips_expected": clips_data["clips_expected"],
+            "completed": clips_data["completed"],
             "clips": [
                 {
                     "clip_index": clip["clip_index"],
@@ -188,7 +438,8 @@ def get_clips_preview(job_id: str):
                     "start_time": clip["start_time"],
                     "composite_score": clip["composite_score"],
                     "file_size_mb": clip["file_size_mb"],
-                    "has_srt": clip.get("has_srt", False)
+                    "has_srt": clip.get("has_srt", False),
+                    "has_assets": bool(clip.get("assets"))
                 }
                 for clip in clips_data.get("clips", [])
             ]
@@ -198,8 +449,133 @@ def get_clips_preview(job_id: str):
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+# ===============================
+# BÚSQUEDA EN TRANSCRIPCIONES
+# ===============================
+
+@app.get("/search")
+def search_endpoint(q: str, job_id: str | None = None, limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0):
+    """Búsqueda de texto en todas las transcripciones indexadas (o en las de un job)"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    try:
+        return search_transcripts(q, job_id=job_id, limit=limit, offset=max(0, offset))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+@app.post("/search/clip")
+def clip_from_search_hit(req: SearchClipRequest):
+    """Genera un clip para la ventana de un resultado de búsqueda (carril prioritario)"""
+    if req.end <= req.start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    queue = JobScheduler().submit(
+        tasks.GENERATE_WINDOW_CLIP,
+        [req.job_id, req.start, req.end, req.caption_mode],
+        user_id=req.user_id,
+        job_id=req.job_id,
+        estimated_seconds=estimate_render_seconds(1),
+        lane=LANE_PRIORITY,
+        publish_outcome=True
+    )
+    return {"job_id": req.job_id, "task_id": queue["task_id"], "status": "generating_clip", "queue": queue}
+
+# ===============================
+# DIRECTO
+# ===============================
+
+@app.post("/live/start")
+def live_start(req: LiveIngestRequest):
+    """Sigue un directo HLS y publica clips de los highlights mientras el stream continúa"""
+    if req.top_n <= 0:
+        raise HTTPException(status_code=400, detail="top_n must be positive")
+    job_id = str(uuid.uuid4())
+    queue = JobScheduler().submit(
+        tasks.START_LIVE_INGEST,
+        [job_id, req.source_url, req.user_id, req.top_n, req.caption_mode],
+        user_id=req.user_id,
+        job_id=job_id
+    )
+    return {"job_id": job_id, "task_id": queue["task_id"], "status": "starting", "queue": queue}
+
+@app.get("/live/{job_id}")
+def live_status(job_id: str):
+    state = load_live_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Live job {job_id} not found")
+    tracker = state["tracker"]
+    return {
+        "job_id": job_id,
+        "status": state["status"],
+        "source_url": state["source_url"],
+        "stream_time": state["stream_time"],
+        "clips_requested": state["clips_requested"],
+        "retained_segments": len(state["segments"]),
+        "highlights": sorted((h for _, _, h in tracker["top"]), key=lambda h: -h["score"]),
+        "pending": tracker["pending"],
+    }
+
+@app.post("/live/{job_id}/stop")
+def live_stop(job_id: str):
+    """El siguiente paso de ingesta ve el flag, confirma el último candidato y termina"""
+    state = load_live_state(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Live job {job_id} not found")
+    get_redis_client().delete(live_active_key(job_id))
+    return {"job_id": job_id, "status": "stopping" if state["status"] == "live" else state["status"]}
+
+# ===============================
+# PROGRESO EN TIEMPO REAL (SSE)
+# ===============================
+
+SSE_HEARTBEAT_SECONDS = 15.0
+
+def _sse_message(payload: str) -> str:
+    return f"data: {payload}\n\n"
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream SSE con los eventos de progreso publicados por las tareas del job"""
+    redis_client = aioredis.from_url(get_redis_url(), decode_responses=True)
+    pubsub = redis_client.pubsub()
+    # Suscribirse antes de leer el snapshot para no perder eventos intermedios
+    await pubsub.subscribe(progress_channel(job_id))
+
+    async def event_stream():
+        try:
+            snapshot = await redis_client.hgetall(progress_snapshot_key(job_id))
+            past_events = sorted((json.loads(v) for v in snapshot.values()), key=lambda e: e.get("ts", 0))
+            for event in past_events:
+                yield _sse_message(json.dumps(event))
+            if any(event.get("stage") in TERMINAL_STAGES for event in past_events):
+                return
+
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_message(message["data"])
+                if json.loads(message["data"]).get("stage") in TERMINAL_STAGES:
+                    return
+        finally:
+            # También se ejecuta cuando el cliente cierra la conexión
+            await pubsub.unsubscribe(progress_channel(job_id))
+            await pubsub.close()
+            await redis_client.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # UTILS ENDPOINTS
 
+@app.get("/queue/{task_id}")
+def get_queue_position(task_id: str):
+    """Posición en la cola del scheduler y hora estimada de inicio"""
+    return JobScheduler().status(task_id)
+
 @app.get("/task/{task_id}")
 def get_task_status(task_id: str):
     """Obtener estado de una tarea Celery"""
@@ -211,6 +587,10 @@ def get_task_status(task_id: str):
             'state': task.state,
             'status': 'Task is waiting to be processed'
         }
+        queue = JobScheduler().status(task_id)
+        if queue["state"] == "queued":
+            response['queue'] = queue
+            response['status'] = f"Queued (position {queue['position']})"
     elif task.state != 'FAILURE':
         response = {
             'state': task.state,
@@ -228,31 +608,47 @@ def get_task_status(task_id: str):
             'status': str(task.info),
             'error': str(task.info)
         }
-    return response
+    return FastJSONResponse(response)
 
 @app.get("/test-minio")
-def test_minio():
-    client = get_minio_client()
-    buckets = [b.name for b in client.list_buckets()]
+async def test_minio():
+    client = get_async_minio_client()
+    buckets = [b.name for b in await client.list_buckets()]
     return {"buckets": buckets}
 
 @app.get("/test-minio-files/{job_id}")
-def list_job_files(job_id: str):
-    client = get_minio_client()
+async def list_job_files(job_id: str):
+    client = get_async_minio_client()
     bucket = "vods"
-    objects = [obj.object_name for obj in client.list_objects(bucket, prefix=f"{job_id}/")]
+    objects = [obj.object_name async for obj in client.list_objects(bucket, prefix=f"{job_id}/")]
     return {"objects": objects}
 
+def request_full_video(job_id: str):
+    """Job audio_first sin VOD completo: se encola su descarga (una sola vez) y se responde 202"""
+    redis_client = get_redis_client()
+    fetch_key = f"video_fetch:{job_id}"
+    task_id = redis_client.get(fetch_key)
+    if not task_id:
+        queue = JobScheduler().submit(tasks.DOWNLOAD_FULL_VIDEO, [job_id], job_id=job_id, publish_outcome=True)
+        task_id = queue["task_id"]
+        redis_client.set(fetch_key, task_id, ex=VIDEO_FETCH_TTL_SECONDS)
+    return FastJSONResponse(
+        {"job_id": job_id, "status": "fetching_video", "task_id": task_id},
+        status_code=202
+    )
+
 @app.get("/download/{job_id}/{file_type}")
-def download_file(job_id: str, file_type: str):
-    client = get_minio_client()
+async def download_file(job_id: str, file_type: str):
+    client = get_async_minio_client()
     bucket = "vods"
 
     file_mapping = {
         "video": "input.mp4",
         "audio": "audio.wav",
         "transcript": "transcript.json",
+        "transcript_index": "transcript_index.bin",
         "analysis": "audio_analysis.json",
+        "analysis_table": "audio_analysis.npy",
         "clips_metadata": "clips_metadata.json"
     }
 
@@ -261,15 +657,22 @@ def download_file(job_id: str, file_type: str):
 
     object_name = f"{job_id}/{file_mapping[file_type]}"
 
+    if file_type == "video" and not await object_exists(client, bucket, object_name):
+        if not await object_exists(client, bucket, source_object(job_id)):
+            raise HTTPException(status_code=404, detail=f"Video not found for job {job_id}")
+        return await run_in_threadpool(request_full_video, job_id)
+
     try:
-        data = client.get_object(bucket, object_name)
+        data = await open_object_stream(client, bucket, object_name)
         filename = f"{file_type}_{job_id}.{file_mapping[file_type].split('.')[-1]}"
 
         media_types = {
             "video": "video/mp4",
             "audio": "audio/wav",
             "transcript": "application/json",
+            "transcript_index": "application/octet-stream",
             "analysis": "application/json",
+            "analysis_table": "application/octet-stream",
             "clips_metadata": "application/json"
         }
 
@@ -281,16 +684,44 @@ def download_file(job_id: str, file_type: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading file: {e}")
 
-@app.get("/transcript/{job_id}")
-def get_transcript(job_id: str):
-    """Obtener la transcripción de un job específico"""
+def _query_transcript_window(job_id: str, start, end, cursor: int, limit: int, bucket: str = "vods"):
     client = get_minio_client()
+    try:
+        client.stat_object(bucket, transcript_index_object(job_id))
+    except Exception:
+        # Job anterior al índice compacto: se genera una vez desde el JSON
+        transcript = SRTGenerator().load_transcript(job_id)
+        if transcript is None:
+            raise HTTPException(status_code=404, detail=f"Transcript not found for job {job_id}")
+        save_transcript_index(client, bucket, job_id, transcript)
+    return query_transcript(job_id, start, end, cursor, limit, bucket)
+
+@app.get("/transcript/{job_id}")
+async def get_transcript(
+    job_id: str,
+    start: float | None = None,
+    end: float | None = None,
+    cursor: int = 0,
+    limit: int = DEFAULT_PAGE_SEGMENTS
+):
+    """Transcripción de un job.
+
+    Sin parámetros devuelve el JSON completo de Whisper. Con start/end (segundos)
+    o cursor devuelve solo los segmentos de esa ventana, paginados.
+    """
     bucket = "vods"
+
+    if start is not None or end is not None or cursor:
+        if start is not None and end is not None and end < start:
+            raise HTTPException(status_code=400, detail="end must be >= start")
+        # Índice con caché en memoria (lru por etag): consulta síncrona, en el threadpool
+        return await run_in_threadpool(_query_transcript_window, job_id, start, end, cursor, limit, bucket)
+
     object_name = f"{job_id}/transcript.json"
 
     try:
-        data = client.get_object(bucket, object_name)
-        transcript_data = json.loads(data.read().decode('utf-8'))
-        return transcript_data
+        content = await read_object(get_async_minio_client(), bucket, object_name)
+        # Ya es JSON en MinIO: se devuelve tal cual, sin decodificar y recodificar
+        return Response(content=content, media_type="application/json")
     except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Transcript not found for job {job_id}: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=f"Transcript not found for job {job_id}: {e}")
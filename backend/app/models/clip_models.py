@@ -1,13 +1,15 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Literal
 from datetime import datetime
 
 class GenerateClipsRequest(BaseModel):
     job_id: str
+    user_id: Optional[int] = None
     max_clips: int = 10
     window_size: float = 30.0
     step_size: float = 10.0
     energy_threshold: float = 0.01  # Umbral mínimo de energía
+    caption_mode: Literal["none", "burned", "both"] = "none"  # Subtítulos quemados en el clip
 
 class AudioSegmentModel(BaseModel):
     start_time: float
@@ -17,6 +19,7 @@ class AudioSegmentModel(BaseModel):
     peak_amplitude: float
     spectral_centroid: float
     zero_crossing_rate: float
+    visual_score: float = 0.0
     composite_score: Optional[float] = None
 
 class ClipMetadata(BaseModel):
@@ -28,17 +31,27 @@ class ClipMetadata(BaseModel):
     duration: float
     rms_score: float
     peak_amplitude: float
+    visual_score: float = 0.0
     composite_score: float
     file_size_mb: float
     has_srt: bool = False
     srt_object: Optional[str] = None
+    vtt_object: Optional[str] = None
+    captions_burned: bool = False
+    captioned_object: Optional[str] = None
+    captioned_size_mb: Optional[float] = None
+    renders_saved: int = 0  # salidas servidas desde la caché de renders
+    assets: Optional[Dict[str, str]] = None  # preview / poster / sprite / thumbnails
 
 class ClipsResponse(BaseModel):
     job_id: str
     clips_count: int
+    clips_expected: int
     clips: List[ClipMetadata]
+    renders_saved: int = 0
     generated_at: datetime
-    status: str = "completed"
+    status: str = "completed"  # in_progress / completed / failed
+    completed: bool = True
 
 class AudioAnalysisResponse(BaseModel):
     job_id: str
@@ -0,0 +1,40 @@
+import io
+from app.services.minio_client import get_minio_client
+from app.services.segment_table import SegmentTable, save_segment_table, load_segment_table
+from app.utils.json_codec import dumps, loads
+
+
+def save_analysis_result(job_id: str, analysis_result: dict, segments: SegmentTable, bucket: str = "vods") -> str:
+    """Guarda el análisis en MinIO: segmentos como tabla binaria y un resumen JSON pequeño.
+
+    Devuelve el objeto del resumen, que referencia la tabla en "segments_object".
+    """
+    client = get_minio_client()
+    analysis_object = f"{job_id}/audio_analysis.json"
+    analysis_result["segments_object"] = save_segment_table(
+        client, bucket, f"{job_id}/audio_analysis.npy", segments
+    )
+
+    payload = dumps(analysis_result, indent=True)
+    client.put_object(bucket, analysis_object, io.BytesIO(payload), length=len(payload), content_type="application/json")
+    return analysis_object
+
+
+def load_analysis_result(job_id: str, bucket: str = "vods"):
+    """Devuelve (resumen, SegmentTable) del análisis de un job.
+
+    Los análisis antiguos guardaban los segmentos como lista de dicts dentro del JSON.
+    """
+    client = get_minio_client()
+    data = client.get_object(bucket, f"{job_id}/audio_analysis.json")
+    try:
+        analysis_result = loads(data.read())
+    finally:
+        data.close()
+        data.release_conn()
+
+    if "segments_object" in analysis_result:
+        segments = load_segment_table(client, bucket, analysis_result["segments_object"])
+    else:
+        segments = SegmentTable.from_dicts(analysis_result.pop("segments", []))
+    return analysis_result, segments
@@ -0,0 +1,88 @@
+import os
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+from app.utils.json_codec import loads
+
+if TYPE_CHECKING:
+    from miniopy_async import Minio as AsyncMinio
+
+# Conexiones simultáneas de la API con MinIO (el valor por defecto del cliente es 10)
+ASYNC_POOL_SIZE = int(os.environ.get("MINIO_ASYNC_POOL_SIZE", 256))
+STREAM_CHUNK_BYTES = 256 * 1024
+
+_client: Optional["AsyncMinio"] = None
+
+
+def get_async_minio_client() -> "AsyncMinio":
+    """Cliente MinIO asíncrono de la API, compartido por todas las peticiones del proceso.
+
+    Se crea dentro del event loop la primera vez que se usa; close_async_minio_client
+    cierra su sesión al apagar la aplicación. aiohttp y el SDK se importan aquí, no
+    al arrancar la API.
+    """
+    global _client
+    if _client is None:
+        import aiohttp
+        from miniopy_async import Minio as AsyncMinio
+
+        endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
+        if "://" in endpoint:
+            endpoint = endpoint.split("://")[1]
+        _client = AsyncMinio(
+            endpoint,
+            access_key=os.environ.get("MINIO_KEY", "minioadmin"),
+            secret_key=os.environ.get("MINIO_SECRET", "minioadmin"),
+            secure=False,
+            session=aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=ASYNC_POOL_SIZE),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300),
+            ),
+        )
+    return _client
+
+
+async def close_async_minio_client():
+    global _client
+    if _client is not None:
+        await _client.close_session()
+        _client = None
+
+
+async def read_object(client: "AsyncMinio", bucket: str, object_name: str) -> bytes:
+    response = await client.get_object(bucket, object_name)
+    try:
+        return await response.read()
+    finally:
+        response.release()
+
+
+async def read_json(client: "AsyncMinio", bucket: str, object_name: str):
+    return loads(await read_object(client, bucket, object_name))
+
+
+async def object_exists(client: "AsyncMinio", bucket: str, object_name: str) -> bool:
+    try:
+        await client.stat_object(bucket, object_name)
+        return True
+    except Exception:
+        return False
+
+
+async def open_object_stream(
+    client: "AsyncMinio",
+    bucket: str,
+    object_name: str,
+    offset: int = 0,
+    length: int = 0
+) -> AsyncIterator[bytes]:
+    """Abre el objeto (los errores saltan aquí, antes de enviar cabeceras) y devuelve su stream"""
+    response = await client.get_object(bucket, object_name, offset=offset, length=length)
+
+    async def chunks():
+        try:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+                yield chunk
+        finally:
+            # También al cortar el cliente la descarga: la conexión vuelve al pool
+            response.release()
+
+    return chunks()
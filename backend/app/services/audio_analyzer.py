@@ -1,14 +1,30 @@
 import numpy as np
-import librosa
-import tempfile
-import os
-from typing import List, Dict, Tuple
+from pathlib import Path
+from typing import Dict, Tuple, Callable, Optional
 from dataclasses import dataclass
 from app.services.minio_client import get_minio_client
+from app.services.audio_features import FrameFeatures, compute_frame_features, composite_score, DEFAULT_FRAME_SECONDS
+from app.services.visual_activity import activity_percentiles, interval_activity
+from app.services.highlight_detection import find_highlight_intervals, DEFAULT_BASELINE_PERCENTILE
+from app.services.segment_selection import select_top_segments, select_top_indices, DEFAULT_MAX_OVERLAP, DEFAULT_MIN_GAP
+from app.services.segment_table import SegmentTable
+from app.services.wav_io import WavInfo, read_wav_info_from_minio, read_wav_frames_from_minio, pcm16_to_mono_float, int16_to_mono_float
+from app.services.pcm_cache import open_pcm, PCMView
+from app.services.parallel_analysis import resolve_workers, split_range, map_blocks, BLOCKS_PER_WORKER
 import logging
 
 LOG = logging.getLogger(__name__)
 
+# Frames de features que se descargan y procesan por bloque en el análisis por frames
+FRAME_BLOCK_SECONDS = 300.0
+
+# Búsqueda multi-resolución: envolvente gruesa, candidatos por top-N y paso fino al refinar
+COARSE_FRAME_SECONDS = 1.0
+COARSE_CANDIDATES_FACTOR = 3
+DEFAULT_REFINE_STEP = 1.0
+# Holgura alrededor de cada candidata gruesa en la que se buscan las ventanas finas
+REFINE_MARGIN_SECONDS = 5.0
+
 @dataclass
 class AudioSegment:
     start_time: float
@@ -18,82 +34,352 @@ class AudioSegment:
     peak_amplitude: float
     spectral_centroid: float
     zero_crossing_rate: float
+    visual_score: float = 0.0
     
 class AudioAnalyzer:
     """Analizador de audio para detectar segmentos con alta energía"""
     
-    def __init__(self, window_size: float = 30.0, step_size: float = 10.0):
+    def __init__(
+        self,
+        window_size: float = 30.0,
+        step_size: float = 10.0,
+        visual_activity: np.ndarray = None,
+        workers: Optional[int] = None
+    ):
         self.window_size = window_size
         self.step_size = step_size
+        # Actividad visual por segundo como percentil del VOD (ver visual_activity); None = solo audio
+        self.visual_activity = activity_percentiles(visual_activity)
+        # Procesos para extraer features (None = ANALYSIS_WORKERS, ver parallel_analysis)
+        self.workers = workers
+
+    def attach_visual_scores(self, segments):
+        """Asigna a cada segmento la actividad visual media de su intervalo"""
+        if self.visual_activity is None or not len(segments):
+            return segments
+        if isinstance(segments, SegmentTable):
+            segments.rows["visual_score"] = interval_activity(
+                self.visual_activity, segments.rows["start_time"], segments.rows["end_time"]
+            )
+            return segments
+        scores = interval_activity(
+            self.visual_activity,
+            np.array([s.start_time for s in segments]),
+            np.array([s.end_time for s in segments])
+        )
+        for segment, score in zip(segments, scores):
+            segment.visual_score = float(score)
+        return segments
         
-    def analyze_audio_from_minio(self, bucket: str, audio_object: str) -> List[AudioSegment]:
-        """Analiza audio desde MinIO y devuelve segmentos con scores"""
-        client = get_minio_client()
+    def analyze_audio_from_minio(
+        self,
+        bucket: str,
+        audio_object: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> SegmentTable:
+        """Analiza audio desde MinIO y devuelve segmentos con scores.
+
+        El WAV se mapea en memoria desde la caché local (ver pcm_cache): cada ventana
+        se convierte a float al vuelo en lugar de cargar todo el audio en float32.
+        """
+        pcm = open_pcm(get_minio_client(), bucket, audio_object)
+        workers = resolve_workers(self.workers)
+        if workers > 1:
+            segments = self._create_sliding_windows_parallel(pcm, workers, progress_callback)
+        else:
+            segments = self._create_sliding_windows(pcm.frames, pcm.sample_rate, progress_callback)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            try:
-                # Descargar audio a archivo temporal
-                LOG.info(f"Downloading {audio_object} for analysis...")
-                data = client.get_object(bucket, audio_object)
-                for chunk in data.stream(8192):
-                    temp_file.write(chunk)
-                
-                temp_file.flush()
-                temp_file_path = temp_file.name
-                
-
-                LOG.info("Loading audio with librosa...")
-                y, sr = librosa.load(temp_file_path, sr=None)
-                
-
-                segments = self._create_sliding_windows(y, sr)
-                
-                LOG.info(f"Generated {len(segments)} audio segments")
-                return segments
-                
-            finally:
-
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+        LOG.info(f"Generated {len(segments)} audio segments")
+        return segments
     
-    def _create_sliding_windows(self, y: np.ndarray, sr: int) -> List[AudioSegment]:
-        """Crea ventanas deslizantes y calcula métricas"""
-        segments = []
-        
+    def count_windows(self, num_samples: int, sr: int) -> int:
+        """Número de ventanas que produce _create_sliding_windows para un audio de num_samples"""
+        window_samples = int(self.window_size * sr)
+        step_samples = int(self.step_size * sr)
+        if num_samples < window_samples:
+            return 0
+        return (num_samples - window_samples) // step_samples + 1
 
+    def analyze_windows_from_minio(
+        self,
+        bucket: str,
+        audio_object: str,
+        first_window: int,
+        last_window: int,
+        wav_info: Optional[WavInfo] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> SegmentTable:
+        """Analiza solo las ventanas [first_window, last_window) de la rejilla global.
+
+        Descarga por rango únicamente las muestras que cubren esas ventanas (incluida
+        la cola de la última), así que las ventanas que cruzan el borde de un shard
+        se calculan completas y con los mismos tiempos que en el análisis completo.
+        """
+        client = get_minio_client()
+        info = wav_info or read_wav_info_from_minio(client, bucket, audio_object)
+        sr = info.sample_rate
         window_samples = int(self.window_size * sr)
         step_samples = int(self.step_size * sr)
-        
 
-        for start_sample in range(0, len(y) - window_samples + 1, step_samples):
-            end_sample = start_sample + window_samples
-            
+        start_sample = first_window * step_samples
+        end_sample = (last_window - 1) * step_samples + window_samples
+        LOG.info(f"Downloading samples {start_sample}-{end_sample} of {audio_object} for analysis...")
+        pcm = read_wav_frames_from_minio(client, bucket, audio_object, info, start_sample, end_sample)
+        y = pcm16_to_mono_float(pcm, info.channels)
 
-            segment_audio = y[start_sample:end_sample]
+        return self._create_sliding_windows(y, sr, progress_callback, offset_samples=start_sample)
 
-            start_time = start_sample / sr
-            end_time = end_sample / sr
-            duration = self.window_size
-            
+    def analyze_frames_from_minio(
+        self,
+        bucket: str,
+        audio_object: str,
+        frame_seconds: float = DEFAULT_FRAME_SECONDS,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> FrameFeatures:
+        """Features por frame de todo el audio, leído del memmap local en bloques de frames completos"""
+        pcm = open_pcm(get_minio_client(), bucket, audio_object)
+        info = pcm.info
+        sr = info.sample_rate
+        frame_len = max(1, int(round(frame_seconds * sr)))
+        block_frames = frame_len * max(1, int(FRAME_BLOCK_SECONDS // (frame_len / sr)))
 
-            rms_score = self._calculate_rms(segment_audio)
-            peak_amplitude = np.max(np.abs(segment_audio))
-            spectral_centroid = self._calculate_spectral_centroid(segment_audio, sr)
-            zero_crossing_rate = self._calculate_zcr(segment_audio)
-            
-            segment = AudioSegment(
-                start_time=start_time,
-                end_time=end_time,
-                duration=duration,
-                rms_score=rms_score,
-                peak_amplitude=peak_amplitude,
-                spectral_centroid=spectral_centroid,
-                zero_crossing_rate=zero_crossing_rate
+        workers = resolve_workers(self.workers)
+        if workers > 1:
+            # Mismos bloques que en serie (en frames de features): el FFT por lotes da
+            # exactamente los mismos valores solo si cada lote agrupa las mismas filas
+            features_total = info.num_frames // frame_len
+            features_per_block = block_frames // frame_len
+            blocks = [
+                (first, min(first + features_per_block, features_total))
+                for first in range(0, features_total, features_per_block)
+            ]
+            parts = map_blocks(
+                _frame_features_block, pcm.path, blocks, workers, args=(frame_seconds,),
+                progress_callback=(lambda done, total: progress_callback(done * frame_len, info.num_frames))
+                if progress_callback else None
             )
+            return FrameFeatures.concatenate(parts, frame_len / sr)
+
+        parts = []
+        for start_frame in range(0, info.num_frames, block_frames):
+            end_frame = min(start_frame + block_frames, info.num_frames)
+            parts.append(compute_frame_features(pcm.mono_float(start_frame, end_frame), sr, frame_seconds))
+            if progress_callback:
+                progress_callback(end_frame, info.num_frames)
+
+        return FrameFeatures.concatenate(parts, frame_len / sr)
+
+    def detect_highlights_from_minio(
+        self,
+        bucket: str,
+        audio_object: str,
+        min_duration: float = 15.0,
+        max_duration: float = 60.0,
+        top_n: int = 10,
+        frame_seconds: float = DEFAULT_FRAME_SECONDS,
+        baseline_percentile: float = DEFAULT_BASELINE_PERCENTILE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> SegmentTable:
+        """Detecta highlights de duración variable entre min_duration y max_duration.
+
+        Una sola pasada de features por frame sustituye a varios análisis con distintos
+        window_size, y los bordes de cada clip quedan a resolución de frame.
+        """
+        features = self.analyze_frames_from_minio(
+            bucket, audio_object, frame_seconds, progress_callback=progress_callback
+        )
+        return self.segments_from_frame_features(features, min_duration, max_duration, top_n, baseline_percentile)
+
+    def segments_from_frame_features(
+        self,
+        features: FrameFeatures,
+        min_duration: float,
+        max_duration: float,
+        top_n: int,
+        baseline_percentile: float = DEFAULT_BASELINE_PERCENTILE
+    ) -> SegmentTable:
+        """Convierte los mejores intervalos de frames en segmentos con sus métricas agregadas"""
+        frame_seconds = features.frame_seconds
+        intervals = find_highlight_intervals(
+            features.scores(self.visual_activity),
+            min_len=max(1, int(round(min_duration / frame_seconds))),
+            max_len=max(1, int(round(max_duration / frame_seconds))),
+            top_n=top_n,
+            baseline_percentile=baseline_percentile
+        )
+
+        table = SegmentTable.empty(len(intervals))
+        rows = table.rows
+        for i, (start, end, _) in enumerate(intervals):
+            rows["start_time"][i] = start * frame_seconds
+            rows["end_time"][i] = end * frame_seconds
+            rows["duration"][i] = (end - start) * frame_seconds
+            rows["rms_score"][i] = np.sqrt(np.mean(np.square(features.rms[start:end])))
+            rows["peak_amplitude"][i] = np.max(features.peak[start:end])
+            rows["spectral_centroid"][i] = np.mean(features.centroid[start:end])
+            rows["zero_crossing_rate"][i] = np.mean(features.zcr[start:end])
+
+        self.attach_visual_scores(table)
+        self.score_segments(table)
+        return table
+
+    def analyze_coarse_to_fine_from_minio(
+        self,
+        bucket: str,
+        audio_object: str,
+        top_n: int = 10,
+        refine_step: float = DEFAULT_REFINE_STEP,
+        max_overlap: float = DEFAULT_MAX_OVERLAP,
+        min_gap: float = DEFAULT_MIN_GAP,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[SegmentTable, Dict]:
+        """Búsqueda en dos niveles sobre el WAV de MinIO (ver coarse_to_fine_segments)"""
+        pcm = open_pcm(get_minio_client(), bucket, audio_object)
+        return self.coarse_to_fine_segments(
+            pcm.mono_float, len(pcm), pcm.sample_rate, top_n,
+            refine_step, max_overlap, min_gap, progress_callback
+        )
+
+    def coarse_to_fine_segments(
+        self,
+        read_samples: Callable[[int, int], np.ndarray],
+        num_samples: int,
+        sr: int,
+        top_n: int = 10,
+        refine_step: float = DEFAULT_REFINE_STEP,
+        max_overlap: float = DEFAULT_MAX_OVERLAP,
+        min_gap: float = DEFAULT_MIN_GAP,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[SegmentTable, Dict]:
+        """Top N ventanas de window_size buscando primero en grueso y refinando solo los candidatos.
+
+        1. Envolvente de energía (RMS y pico por segundo) de todo el audio: sin FFT.
+        2. Las top_n * COARSE_CANDIDATES_FACTOR ventanas gruesas sin solape son candidatas.
+        3. Cada candidata, ampliada REFINE_MARGIN_SECONDS por lado, se analiza con todas las
+           features y paso refine_step sobre la rejilla global; el resto del audio
+           (tiempo muerto) no vuelve a leerse.
+
+        `read_samples(start, end)` devuelve audio mono float de ese rango de muestras.
+        """
+        coarse_len = max(1, int(COARSE_FRAME_SECONDS * sr))
+        block_len = coarse_len * max(1, int(FRAME_BLOCK_SECONDS // COARSE_FRAME_SECONDS))
+        mean_square, peak = [], []
+        for start in range(0, num_samples, block_len):
+            end = min(start + block_len, num_samples)
+            y = read_samples(start, end)
+            n_frames = len(y) // coarse_len
+            frames = y[:n_frames * coarse_len].reshape(n_frames, coarse_len)
+            mean_square.append(np.mean(np.square(frames), axis=1))
+            peak.append(np.max(np.abs(frames), axis=1) if n_frames else np.zeros(0, np.float32))
+            if progress_callback:
+                progress_callback(end, num_samples)
+        mean_square = np.concatenate(mean_square) if mean_square else np.zeros(0)
+        peak = np.concatenate(peak) if peak else np.zeros(0)
+
+        # Score grueso de cada ventana de window_size con paso de un frame grueso
+        window_frames = max(1, int(round(self.window_size / COARSE_FRAME_SECONDS)))
+        stats = {"coarse_frames": len(mean_square), "candidates": 0, "refined_seconds": 0.0}
+        if len(mean_square) < window_frames:
+            return SegmentTable(), stats
+        prefix = np.concatenate(([0.0], np.cumsum(mean_square, dtype=np.float64)))
+        window_rms = np.sqrt((prefix[window_frames:] - prefix[:-window_frames]) / window_frames)
+        window_peak = np.lib.stride_tricks.sliding_window_view(peak, window_frames).max(axis=1)
+        coarse_visual = 0.0
+        if self.visual_activity is not None:
+            first_seconds = np.arange(len(window_rms)) * COARSE_FRAME_SECONDS
+            coarse_visual = interval_activity(self.visual_activity, first_seconds, first_seconds + self.window_size)
+        coarse_scores = composite_score(window_rms, window_peak, 0.0, coarse_visual)
+
+        taken = np.zeros(len(mean_square), dtype=bool)
+        candidates = []
+        for first in np.argsort(-coarse_scores, kind="stable"):
+            if len(candidates) >= top_n * COARSE_CANDIDATES_FACTOR:
+                break
+            if taken[first:first + window_frames].any():
+                continue
+            taken[first:first + window_frames] = True
+            candidates.append(int(first))
+        stats["candidates"] = len(candidates)
+
+        # Regiones de refinado alineadas a la rejilla fina global y fusionadas si se tocan
+        step_samples = max(1, int(refine_step * sr))
+        margin_samples = int(REFINE_MARGIN_SECONDS * sr)
+        regions = []
+        for first in sorted(candidates):
+            start = max(0, (first * coarse_len - margin_samples) // step_samples * step_samples)
+            end = min(num_samples, (first + window_frames) * coarse_len + margin_samples)
+            if regions and start <= regions[-1][1]:
+                regions[-1][1] = max(regions[-1][1], end)
+            else:
+                regions.append([start, end])
+
+        fine = AudioAnalyzer(window_size=self.window_size, step_size=refine_step, visual_activity=self.visual_activity)
+        tables = []
+        for start, end in regions:
+            tables.append(fine._create_sliding_windows(read_samples(start, end), sr, offset_samples=start))
+            stats["refined_seconds"] += (end - start) / sr
+        segments = self.attach_visual_scores(SegmentTable.concatenate(tables))
+
+        top_segments = self.rank_segments_by_energy(segments, top_n, max_overlap=max_overlap, min_gap=min_gap)
+        return top_segments, stats
+
+    def _create_sliding_windows_parallel(
+        self,
+        pcm: PCMView,
+        workers: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> SegmentTable:
+        """_create_sliding_windows repartido por rangos de ventanas entre procesos.
+
+        Cada ventana se calcula con las mismas muestras y operaciones que en serie,
+        y los bloques se concatenan en orden, así que la tabla es idéntica.
+        """
+        num_windows = self.count_windows(len(pcm), pcm.sample_rate)
+        blocks = split_range(num_windows, workers * BLOCKS_PER_WORKER)
+        LOG.info(f"Analyzing {num_windows} windows in {len(blocks)} blocks with {workers} processes")
+        parts = map_blocks(
+            _windows_block, pcm.path, blocks, workers,
+            args=(self.window_size, self.step_size), progress_callback=progress_callback
+        )
+        return SegmentTable.concatenate([SegmentTable(rows) for rows in parts])
+
+    def _create_sliding_windows(
+        self,
+        y: np.ndarray,
+        sr: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        offset_samples: int = 0
+    ) -> SegmentTable:
+        """Crea ventanas deslizantes y calcula métricas.
+
+        Las métricas se escriben directamente en las columnas de una SegmentTable,
+        sin crear un objeto por ventana. `y` puede ser audio float mono o frames int16
+        (n, canales), p. ej. un memmap, que se convierten ventana a ventana.
+        `offset_samples` desplaza los tiempos cuando `y` es un tramo del audio completo.
+        """
+        to_float = int16_to_mono_float if y.dtype == np.int16 else (lambda block: block)
+        window_samples = int(self.window_size * sr)
+        step_samples = int(self.step_size * sr)
+        starts = range(0, len(y) - window_samples + 1, step_samples)
+        
+        table = SegmentTable.empty(len(starts))
+        rows = table.rows
+        rows["start_time"] = (offset_samples + np.asarray(starts, dtype=np.int64)) / sr
+        rows["end_time"] = rows["start_time"] + window_samples / sr
+        rows["duration"] = self.window_size
+
+        for i, start_sample in enumerate(starts):
+            segment_audio = to_float(y[start_sample:start_sample + window_samples])
+
+            rows["rms_score"][i] = self._calculate_rms(segment_audio)
+            rows["peak_amplitude"][i] = np.max(np.abs(segment_audio))
+            rows["spectral_centroid"][i] = self._calculate_spectral_centroid(segment_audio, sr)
+            rows["zero_crossing_rate"][i] = self._calculate_zcr(segment_audio)
             
-            segments.append(segment)
+            if progress_callback:
+                progress_callback(i + 1, len(starts))
             
-        return segments
+        return table
     
     def _calculate_rms(self, audio: np.ndarray) -> float:
         """Calcula RMS (Root Mean Square) - indicador de energía"""
@@ -101,6 +387,8 @@ class AudioAnalyzer:
     
     def _calculate_spectral_centroid(self, audio: np.ndarray, sr: int) -> float:
         """Calcula centroide espectral - indicador de brillo/tono"""
+        # librosa arrastra scipy/numba: solo se importa en el análisis por ventanas
+        import librosa
         try:
             centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)[0]
             return float(np.mean(centroid))
@@ -109,21 +397,68 @@ class AudioAnalyzer:
     
     def _calculate_zcr(self, audio: np.ndarray) -> float:
         """Calcula Zero Crossing Rate - indicador de contenido tonal"""
+        import librosa
         try:
             zcr = librosa.feature.zero_crossing_rate(audio)[0]
             return float(np.mean(zcr))
         except:
             return 0.0
     
-    def rank_segments_by_energy(self, segments: List[AudioSegment], top_n: int = 10) -> List[AudioSegment]:
-        """Rankea segmentos por energía y devuelve los top N"""
-
+    def score_segments(self, segments):
+        """Calcula composite_score de cada segmento (vectorizado si es una SegmentTable)"""
+        if isinstance(segments, SegmentTable):
+            rows = segments.rows
+            rows["composite_score"] = composite_score(
+                rows["rms_score"], rows["peak_amplitude"], rows["spectral_centroid"], rows["visual_score"]
+            )
+            return segments
         for segment in segments:
-            segment.composite_score = (
-                0.7 * segment.rms_score + 
-                0.2 * segment.peak_amplitude + 
-                0.1 * (segment.spectral_centroid / 5000) 
+            segment.composite_score = composite_score(
+                segment.rms_score, segment.peak_amplitude, segment.spectral_centroid, segment.visual_score
             )
+        return segments
+
+    def rank_segments_by_energy(
+        self,
+        segments,
+        top_n: int = 10,
+        max_overlap: float = DEFAULT_MAX_OVERLAP,
+        min_gap: float = DEFAULT_MIN_GAP
+    ):
+        """Rankea segmentos por energía (y actividad visual) y devuelve los top N momentos distintos.
+
+        Las ventanas vecinas se solapan, así que se aplica supresión de no-máximos
+        (max_overlap / min_gap) para no gastar clips en el mismo momento. Acepta una
+        SegmentTable (devuelve otra) o una lista de AudioSegment.
+        """
+        self.score_segments(segments)
+        if isinstance(segments, SegmentTable):
+            rows = segments.rows
+            indices = select_top_indices(
+                rows["start_time"], rows["end_time"], rows["composite_score"], top_n,
+                max_overlap=max_overlap, min_gap=min_gap
+            )
+            return segments.take(indices)
         
-        ranked = sorted(segments, key=lambda x: x.composite_score, reverse=True)
-        return ranked[:top_n]
\ No newline at end of file
+        return select_top_segments(segments, top_n, max_overlap=max_overlap, min_gap=min_gap)
+
+
+# Funciones de bloque para el pool de procesos: reciben la ruta del WAV e índices, no muestras
+
+def _windows_block(path: str, window_size: float, step_size: float, first_window: int, last_window: int) -> np.ndarray:
+    pcm = PCMView(Path(path))
+    sr = pcm.sample_rate
+    window_samples = int(window_size * sr)
+    step_samples = int(step_size * sr)
+    start = first_window * step_samples
+    end = (last_window - 1) * step_samples + window_samples
+    analyzer = AudioAnalyzer(window_size=window_size, step_size=step_size)
+    return analyzer._create_sliding_windows(pcm.frames[start:end], sr, offset_samples=start).rows
+
+
+def _frame_features_block(path: str, frame_seconds: float, first_frame: int, last_frame: int) -> FrameFeatures:
+    pcm = PCMView(Path(path))
+    frame_len = max(1, int(round(frame_seconds * pcm.sample_rate)))
+    return compute_frame_features(
+        pcm.mono_float(first_frame * frame_len, last_frame * frame_len), pcm.sample_rate, frame_seconds
+    )
@@ -0,0 +1,79 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List
+from app.services.visual_activity import VISUAL_WEIGHT
+
+# Duración de cada frame de features: es la resolución de los bordes de los clips
+DEFAULT_FRAME_SECONDS = 0.5
+# Frames por bloque de FFT: acota la memoria del espectro en audios largos
+FFT_BLOCK_FRAMES = 256
+
+
+def composite_score(rms, peak_amplitude, spectral_centroid, visual_activity=0.0):
+    """Score compuesto de energía más actividad visual (percentil del VOD); acepta escalares o arrays por frame"""
+    return 0.7 * rms + 0.2 * peak_amplitude + 0.1 * (spectral_centroid / 5000) + VISUAL_WEIGHT * visual_activity
+
+
+@dataclass
+class FrameFeatures:
+    """Features de audio por frame fijo, como columnas numpy"""
+    frame_seconds: float
+    rms: np.ndarray
+    peak: np.ndarray
+    centroid: np.ndarray
+    zcr: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rms)
+
+    def scores(self, visual_activity: np.ndarray = None) -> np.ndarray:
+        """Score por frame; `visual_activity` es la serie por segundo del vídeo, si existe"""
+        visual = 0.0
+        if visual_activity is not None and len(visual_activity):
+            seconds = (np.arange(len(self.rms)) * self.frame_seconds).astype(np.int64)
+            visual = visual_activity[np.minimum(seconds, len(visual_activity) - 1)]
+        return composite_score(self.rms, self.peak, self.centroid, visual)
+
+    @classmethod
+    def concatenate(cls, parts: List["FrameFeatures"], frame_seconds: float) -> "FrameFeatures":
+        return cls(
+            frame_seconds=frame_seconds,
+            rms=np.concatenate([p.rms for p in parts]) if parts else np.zeros(0, np.float32),
+            peak=np.concatenate([p.peak for p in parts]) if parts else np.zeros(0, np.float32),
+            centroid=np.concatenate([p.centroid for p in parts]) if parts else np.zeros(0, np.float32),
+            zcr=np.concatenate([p.zcr for p in parts]) if parts else np.zeros(0, np.float32),
+        )
+
+
+def compute_frame_features(y: np.ndarray, sr: int, frame_seconds: float = DEFAULT_FRAME_SECONDS) -> FrameFeatures:
+    """Calcula RMS, pico, centroide espectral y ZCR de cada frame completo de `y`.
+
+    Todo vectorizado sobre una matriz (frames, muestras); las muestras sobrantes
+    al final que no llenan un frame se descartan.
+    """
+    frame_len = max(1, int(round(frame_seconds * sr)))
+    n_frames = len(y) // frame_len
+    frames = np.asarray(y[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    peak = np.max(np.abs(frames), axis=1) if n_frames else np.zeros(0, np.float32)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, frame_len - 1)
+
+    freqs = np.fft.rfftfreq(frame_len, d=1.0 / sr).astype(np.float32)
+    centroid = np.zeros(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, FFT_BLOCK_FRAMES):
+        magnitude = np.abs(np.fft.rfft(frames[first:first + FFT_BLOCK_FRAMES], axis=1))
+        total = magnitude.sum(axis=1)
+        weighted = magnitude @ freqs
+        centroid[first:first + FFT_BLOCK_FRAMES] = np.divide(
+            weighted, total, out=np.zeros_like(weighted), where=total > 0
+        )
+
+    return FrameFeatures(
+        frame_seconds=frame_len / sr,
+        rms=rms.astype(np.float32),
+        peak=peak.astype(np.float32),
+        centroid=centroid,
+        zcr=zcr.astype(np.float32),
+    )
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import struct
+import tarfile
+import time
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import logging
+
+LOG = logging.getLogger(__name__)
+
+BUNDLE_FORMATS = {"tar": "application/x-tar", "zip": "application/zip"}
+STREAM_CHUNK_BYTES = 1024 * 1024
+# CRC32 del contenido guardado como metadata del objeto al subirlo: permite fijar
+# el ZIP entero (y servir rangos) sin leer los MP4 antes de empezar a enviar
+CRC_METADATA_KEY = "crc32"
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def crc_metadata(crc: int) -> Dict[str, str]:
+    return {CRC_METADATA_KEY: f"{crc:08x}"}
+
+
+def file_crc32(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_BYTES), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+@dataclass
+class BundleEntry:
+    """Fichero del bundle: nombre en el archivo y objeto de MinIO del que sale"""
+    arcname: str
+    object_name: str
+    size: int
+    mtime: int
+    etag: str
+    crc32: Optional[int] = None
+
+
+def _entry_from_stat(arcname: str, object_name: str, stat) -> BundleEntry:
+    crc = (stat.metadata or {}).get(f"x-amz-meta-{CRC_METADATA_KEY}")
+    return BundleEntry(
+        arcname=arcname,
+        object_name=object_name,
+        size=stat.size,
+        mtime=int(stat.last_modified.timestamp()) if stat.last_modified else 0,
+        etag=stat.etag or "",
+        crc32=int(crc, 16) if crc else None,
+    )
+
+
+def stat_entry(client, bucket: str, arcname: str, object_name: str) -> BundleEntry:
+    return _entry_from_stat(arcname, object_name, client.stat_object(bucket, object_name))
+
+
+def bundle_members(job_id: str, clips_metadata: Dict) -> List[Tuple[str, str]]:
+    """(nombre en el archivo, objeto) de los clips (y versiones con subtítulos), SRT y clips_metadata.json"""
+    prefix = f"clips_{job_id}"
+    members = []
+    for clip in sorted(clips_metadata.get("clips", []), key=lambda c: c["clip_index"]):
+        name = f"clip_{clip['clip_index']:02d}"
+        members.append((f"{prefix}/{name}.mp4", clip["object_name"]))
+        if clip.get("captioned_object"):
+            members.append((f"{prefix}/{name}_captioned.mp4", clip["captioned_object"]))
+        if clip.get("srt_object"):
+            members.append((f"{prefix}/{name}.srt", clip["srt_object"]))
+    members.append((f"{prefix}/clips_metadata.json", f"{job_id}/clips_metadata.json"))
+    return members
+
+
+def bundle_entries(client, bucket: str, job_id: str, clips_metadata: Dict) -> List[BundleEntry]:
+    return [stat_entry(client, bucket, arcname, obj) for arcname, obj in bundle_members(job_id, clips_metadata)]
+
+
+async def abundle_entries(client, bucket: str, job_id: str, clips_metadata: Dict) -> List[BundleEntry]:
+    """Como bundle_entries con el cliente asíncrono: los stat van en paralelo"""
+    members = bundle_members(job_id, clips_metadata)
+    stats = await asyncio.gather(*(client.stat_object(bucket, obj) for _, obj in members))
+    return [_entry_from_stat(arcname, obj, stat) for (arcname, obj), stat in zip(members, stats)]
+
+
+def _dos_datetime(mtime: int) -> Tuple[int, int]:
+    t = time.gmtime(max(mtime, 315532800))  # ZIP no representa fechas anteriores a 1980
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+class ClipBundle:
+    """Archivo TAR o ZIP (sin compresión) generado al vuelo desde los objetos de MinIO.
+
+    El archivo se describe como una lista de partes: bytes fijos (cabeceras) u
+    objetos de MinIO. Como los tamaños se conocen de antemano, el tamaño total y la
+    posición de cada byte también, así que un rango se sirve leyendo solo los trozos
+    de objeto que caen dentro (get_object con offset/length). Memoria constante y
+    sin ficheros temporales; los MP4 no se recomprimen.
+    """
+
+    def __init__(self, client, bucket: str, entries: List[BundleEntry], fmt: str = "tar"):
+        if fmt not in BUNDLE_FORMATS:
+            raise ValueError(f"Invalid bundle format '{fmt}', expected one of {tuple(BUNDLE_FORMATS)}")
+        self.client = client
+        self.bucket = bucket
+        self.entries = entries
+        self.format = fmt
+        # (offset, longitud, bytes | BundleEntry | parte diferida del ZIP)
+        self.parts: List[Tuple[int, int, object]] = []
+        self.size = 0
+        if fmt == "tar":
+            self._layout_tar()
+        else:
+            self._layout_zip()
+
+    @property
+    def media_type(self) -> str:
+        return BUNDLE_FORMATS[self.format]
+
+    @property
+    def etag(self) -> str:
+        """Cambia si cambia cualquier objeto: un If-Range con otro valor descarta el rango"""
+        digest = hashlib.sha256(self.format.encode())
+        for entry in self.entries:
+            digest.update(f"{entry.arcname}\0{entry.etag}\0{entry.size}\0".encode())
+        return f'"{digest.hexdigest()[:32]}"'
+
+    @property
+    def supports_range(self) -> bool:
+        """El ZIP necesita el CRC de cada fichero por adelantado para conocer todos sus bytes"""
+        return self.format == "tar" or all(entry.crc32 is not None for entry in self.entries)
+
+    def _add(self, part):
+        if isinstance(part, tuple):
+            length = self._deferred_length(part)
+        else:
+            length = len(part) if isinstance(part, bytes) else part.size
+        if length:
+            self.parts.append((self.size, length, part))
+            self.size += length
+
+    @staticmethod
+    def _deferred_length(part) -> int:
+        """Longitud de las partes del ZIP que se generan al enviar (descriptor, directorio central)"""
+        if part[0] == "descriptor":
+            return 16
+        return 46 + len(part[2])
+
+    def _layout_tar(self):
+        for entry in self.entries:
+            info = tarfile.TarInfo(entry.arcname)
+            info.size = entry.size
+            info.mtime = entry.mtime
+            info.mode = 0o644
+            self._add(info.tobuf(format=tarfile.USTAR_FORMAT))
+            self._add(entry)
+            self._add(b"\0" * (-entry.size % tarfile.BLOCKSIZE))
+        self._add(b"\0" * (2 * tarfile.BLOCKSIZE))
+
+    def _layout_zip(self):
+        central = []
+        for entry in self.entries:
+            if entry.size > _ZIP32_LIMIT:
+                raise ValueError(f"{entry.arcname} is larger than 4 GiB: use the tar format")
+            name = entry.arcname.encode("utf-8")
+            mod_time, mod_date = _dos_datetime(entry.mtime)
+            offset = self.size
+            # Bit 3: el CRC va en el descriptor tras los datos (se puede calcular mientras se envía);
+            # bit 11: nombres en UTF-8
+            flags = 0x0808
+            self._add(struct.pack(
+                "<IHHHHHIIIHH", 0x04034B50, 20, flags, 0, mod_time, mod_date,
+                0, entry.size, entry.size, len(name), 0
+            ) + name)
+            self._add(entry)
+            self._add(("descriptor", entry))
+            central.append((entry, name, flags, mod_time, mod_date, offset))
+        if self.size > _ZIP32_LIMIT:
+            raise ValueError("Bundle is larger than 4 GiB: use the tar format")
+
+        central_offset = self.size
+        for entry, name, flags, mod_time, mod_date, offset in central:
+            self._add(("central", entry, name, flags, mod_time, mod_date, offset))
+        central_size = self.size - central_offset
+        self._add(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central), central_size, central_offset, 0
+        ))
+
+    @staticmethod
+    def _render_deferred(part, crcs: Dict[str, int]) -> bytes:
+        """Descriptor y entrada del directorio central: dependen del CRC del fichero"""
+        entry = part[1]
+        crc = crcs[entry.arcname]
+        if part[0] == "descriptor":
+            return struct.pack("<IIII", 0x08074B50, crc, entry.size, entry.size)
+        _, entry, name, flags, mod_time, mod_date, offset = part
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags, 0, mod_time, mod_date,
+            crc, entry.size, entry.size, len(name), 0, 0, 0, 0, 0o100644 << 16, offset
+        ) + name
+
+    def _read_object(self, entry: BundleEntry, offset: int, length: int) -> Iterator[bytes]:
+        data = self.client.get_object(self.bucket, entry.object_name, offset=offset, length=length)
+        try:
+            for chunk in data.stream(STREAM_CHUNK_BYTES):
+                yield chunk
+        finally:
+            data.close()
+            data.release_conn()
+
+    def _slices(self, start: int, end: Optional[int]):
+        """Partes que cubren [start, end] (inclusivo) como (parte, desde, hasta) relativos a la parte"""
+        end = self.size - 1 if end is None else end
+        if start > 0 or end < self.size - 1:
+            if not self.supports_range:
+                raise ValueError("Range requests need CRC32 metadata on every bundled object")
+        slices = []
+        for offset, length, part in self.parts:
+            if offset + length <= start:
+                continue
+            if offset > end:
+                break
+            lo = max(start, offset) - offset
+            hi = min(end, offset + length - 1) - offset + 1
+            slices.append((part, lo, hi))
+        return slices
+
+    def _known_crcs(self) -> Dict[str, int]:
+        # CRCs conocidos; los que faltan se calculan al enviar el fichero (solo en descargas completas)
+        crcs = {entry.arcname: entry.crc32 for entry in self.entries if entry.crc32 is not None}
+        crcs.update({entry.arcname: 0 for entry in self.entries if entry.size == 0})
+        return crcs
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes [start, end] (inclusivo) del archivo"""
+        crcs = self._known_crcs()
+        for part, lo, hi in self._slices(start, end):
+            if isinstance(part, BundleEntry):
+                if part.arcname in crcs:
+                    yield from self._read_object(part, lo, hi - lo)
+                else:
+                    crc = 0
+                    for chunk in self._read_object(part, lo, hi - lo):
+                        crc = zlib.crc32(chunk, crc)
+                        yield chunk
+                    crcs[part.arcname] = crc
+            elif isinstance(part, tuple):
+                yield self._render_deferred(part, crcs)[lo:hi]
+            else:
+                yield part[lo:hi]
+
+    async def aiter_range(self, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Como iter_range, para un cliente MinIO asíncrono (miniopy-async)"""
+        crcs = self._known_crcs()
+        for part, lo, hi in self._slices(start, end):
+            if isinstance(part, BundleEntry):
+                crc = 0
+                response = await self.client.get_object(self.bucket, part.object_name, offset=lo, length=hi - lo)
+                try:
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+                        if part.arcname not in crcs:
+                            crc = zlib.crc32(chunk, crc)
+                        yield chunk
+                finally:
+                    response.release()
+                crcs.setdefault(part.arcname, crc)
+            elif isinstance(part, tuple):
+                yield self._render_deferred(part, crcs)[lo:hi]
+            else:
+                yield part[lo:hi]
@@ -1,143 +1,393 @@
 import subprocess
 import tempfile
+import hashlib
+import zlib
 import os
+import io
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional, Tuple
 from app.services.minio_client import get_minio_client
+from app.services.source_media import has_full_video, ensure_video_sections, find_section
+from app.services.clip_bundle import crc_metadata, file_crc32
+from app.services.clip_previews import PREVIEW_ASSETS, preview_objects, preview_branches, thumbnails_vtt
 from app.services.audio_analyzer import AudioSegment
+from app.utils.json_codec import dumps, loads
 import logging
-import json
 
 LOG = logging.getLogger(__name__)
 
+# Modos de subtítulos: sin subtítulos, solo versión quemada, o limpia + quemada
+CAPTION_MODES = ("none", "burned", "both")
+CAPTION_STYLE = "FontName=DejaVu Sans,FontSize=18,Outline=2,Shadow=0,MarginV=30"
+
+# Parámetros de encoding; forman parte de la clave de la caché de renders
+VIDEO_CODEC = "libx264"
+AUDIO_CODEC = "aac"
+ENCODE_PRESET = "fast"
+ENCODE_CRF = 23
+# Subir si cambia el comando de ffmpeg de forma que invalide los renders guardados
+RENDER_CACHE_VERSION = 1
+
+def _escape_filter_value(value: str) -> str:
+    """Escapa un valor para usarlo dentro de un filtergraph de ffmpeg"""
+    return value.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+def render_key(source_id: str, start: float, end: float, overlay: Optional[Dict] = None) -> str:
+    """Clave determinista de un render: misma fuente, intervalo, encoding y overlay → mismo fichero"""
+    spec = {
+        "version": RENDER_CACHE_VERSION,
+        "source": source_id,
+        "start": round(float(start), 3),
+        "end": round(float(end), 3),
+        "video_codec": VIDEO_CODEC,
+        "audio_codec": AUDIO_CODEC,
+        "preset": ENCODE_PRESET,
+        "crf": ENCODE_CRF,
+        "overlay": overlay,
+    }
+    return hashlib.sha256(dumps(spec, sort_keys=True)).hexdigest()
+
+def render_object(job_id: str, key: str) -> str:
+    return f"{job_id}/renders/{key}.mp4"
+
+def _object_size(client, bucket: str, object_name: str) -> Optional[int]:
+    try:
+        return client.stat_object(bucket, object_name).size
+    except Exception:
+        return None
+
 class ClipGenerator:
     """Generador de clips de video usando ffmpeg"""
     
-    def __init__(self):
+    def __init__(self, caption_mode: str = "none"):
+        if caption_mode not in CAPTION_MODES:
+            raise ValueError(f"Invalid caption_mode '{caption_mode}', expected one of {CAPTION_MODES}")
         self.bucket = "vods"
+        self.caption_mode = caption_mode
     
     def generate_clips_from_segments(
         self, 
         job_id: str, 
         segments: List[AudioSegment], 
-        max_clips: int = 10
+        max_clips: int = 10,
+        on_clip_ready: Optional[Callable[[Dict], None]] = None,
+        subtitles_for_segment: Optional[Callable[[AudioSegment], str]] = None,
+        first_index: int = 0,
+        clip_indices: Optional[List[int]] = None
     ) -> List[Dict]:
-        """Genera clips de video para los segmentos seleccionados"""
+        """Genera clips de video para los segmentos seleccionados.
+
+        `subtitles_for_segment` devuelve el SRT (tiempos relativos al clip) que se
+        quema en el mismo comando de ffmpeg cuando caption_mode no es "none".
+        `first_index` numera los clips a partir de ese índice (clips añadidos a un job);
+        `clip_indices`, si se da, fija el índice de cada clip (re-render que reutiliza índices).
+        """
         
         client = get_minio_client()
         clips_metadata = []
         
-        # Descargar video original
-        video_object = f"{job_id}/input.mp4"
+        with tempfile.TemporaryDirectory(prefix="clip_sources_") as sourcedir:
+            source_for = self._source_resolver(client, job_id, segments[:max_clips], Path(sourcedir))
+            
+            # Generar clips para cada segmento
+            selected = segments[:max_clips]
+            if clip_indices is None:
+                clip_indices = range(first_index, first_index + len(selected))
+            for i, segment in zip(clip_indices, selected):
+                video_path, source_offset, source_id = source_for(segment)
+                srt_content = None
+                if self.caption_mode != "none" and subtitles_for_segment:
+                    srt_content = subtitles_for_segment(segment)
+                clip_metadata = self._create_clip(
+                    job_id=job_id,
+                    segment=segment,
+                    video_path=video_path,
+                    clip_index=i,
+                    client=client,
+                    srt_content=srt_content,
+                    source_offset=source_offset,
+                    source_id=source_id
+                )
+                clips_metadata.append(clip_metadata)
+                if on_clip_ready:
+                    on_clip_ready(clip_metadata)
+            
+            return clips_metadata
+    
+    def _source_resolver(
+        self,
+        client,
+        job_id: str,
+        segments: List[AudioSegment],
+        workdir: Path
+    ) -> Callable[[AudioSegment], Tuple[Optional[str], float, str]]:
+        """Devuelve una función segmento → (vídeo local, instante del VOD en que empieza, id de la fuente).
+
+        Con el VOD completo en MinIO se descarga una vez. En jobs audio_first solo hay
+        secciones: se bajan de la fuente las que falten y cada una se trae de MinIO
+        la primera vez que un clip la necesita. La descarga local es diferida: si
+        todos los renders del clip están en caché no se llega a bajar nada.
+        """
+        if has_full_video(client, self.bucket, job_id):
+            video_object = f"{job_id}/input.mp4"
+            source_id = f"{video_object}:{client.stat_object(self.bucket, video_object).etag}"
+            local_video = workdir / "input.mp4"
+            
+            def fetch_full() -> str:
+                if not local_video.exists():
+                    LOG.info(f"Downloading video {video_object} for clipping...")
+                    client.fget_object(self.bucket, video_object, str(local_video))
+                return str(local_video)
+            
+            return lambda segment: (fetch_full, 0.0, source_id)
+        
+        sections = ensure_video_sections(
+            client, self.bucket, job_id, [(seg.start_time, seg.end_time) for seg in segments]
+        )
+        local_sections: Dict[str, str] = {}
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-            try:
-                LOG.info(f"Downloading video {video_object} for clipping...")
-                data = client.get_object(self.bucket, video_object)
-                for chunk in data.stream(8192):
-                    temp_video.write(chunk)
-                
-                temp_video.flush()
-                video_path = temp_video.name
-                
-                # Generar clips para cada segmento
-                for i, segment in enumerate(segments[:max_clips]):
-                    clip_metadata = self._create_clip(
-                        job_id=job_id,
-                        segment=segment,
-                        video_path=video_path,
-                        clip_index=i,
-                        client=client
-                    )
-                    clips_metadata.append(clip_metadata)
-                
-                return clips_metadata
-                
-            finally:
-                if os.path.exists(video_path):
-                    os.unlink(video_path)
+        def resolve(segment: AudioSegment) -> Tuple[Callable[[], str], float, str]:
+            section = find_section(sections, segment.start_time, segment.end_time)
+            if section is None:
+                raise RuntimeError(f"No video section covers {segment.start_time:.1f}-{segment.end_time:.1f}s for job {job_id}")
+            object_name = section["object_name"]
+            
+            def fetch_section() -> str:
+                if object_name not in local_sections:
+                    local_path = workdir / Path(object_name).name
+                    LOG.info(f"Downloading video section {object_name} for clipping...")
+                    client.fget_object(self.bucket, object_name, str(local_path))
+                    local_sections[object_name] = str(local_path)
+                return local_sections[object_name]
+            
+            return fetch_section, section["start"], object_name
+        
+        return resolve
+    
+    def _build_ffmpeg_command(
+        self,
+        segment: AudioSegment,
+        video_path: str,
+        clean_path: Optional[str],
+        captioned_path: Optional[str],
+        srt_path: Optional[str],
+        source_offset: float = 0.0,
+        preview_paths: Optional[Dict[str, str]] = None
+    ) -> List[str]:
+        """Comando ffmpeg que corta, decodifica una vez y codifica todas las salidas.
+
+        El seek y la duración van antes de -i: los timestamps del clip empiezan en 0, que
+        es lo que esperan tanto el SRT relativo como el filtro subtitles, y la entrada
+        termina con el clip, así que todas las salidas del split quedan acotadas (un -t de
+        salida solo limitaría la primera). `source_offset` es el
+        instante del VOD en que empieza `video_path` (0 salvo para secciones).
+        Con `preview_paths` se añaden preview, póster y sprite como ramas del mismo split.
+        """
+        encode = ["-c:v", VIDEO_CODEC, "-c:a", AUDIO_CODEC, "-preset", ENCODE_PRESET, "-crf", str(ENCODE_CRF)]
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(segment.start_time - source_offset),
+            "-t", str(segment.duration),
+            "-i", video_path,
+        ]
+        subtitles = None
+        if captioned_path:
+            subtitles = f"subtitles=filename='{_escape_filter_value(srt_path)}':force_style='{CAPTION_STYLE}'"
+        if not preview_paths:
+            if not captioned_path:
+                return cmd + encode + [clean_path]
+            if not clean_path:
+                return cmd + ["-vf", subtitles] + encode + [captioned_path]
+
+        # Varias salidas desde la misma decodificación: split del vídeo decodificado
+        branches = []
+        if clean_path:
+            branches.append((None, ["-map", "0:a?", *encode, clean_path]))
+        if captioned_path:
+            branches.append((subtitles, ["-map", "0:a?", *encode, captioned_path]))
+        if preview_paths:
+            branches += preview_branches(segment.duration, preview_paths)
+
+        graph = [f"[0:v]split={len(branches)}" + "".join(f"[v{i}]" for i in range(len(branches)))]
+        outputs = []
+        for i, (video_filter, output_args) in enumerate(branches):
+            label = f"v{i}"
+            if video_filter:
+                graph.append(f"[v{i}]{video_filter}[o{i}]")
+                label = f"o{i}"
+            outputs += ["-map", f"[{label}]", *output_args]
+        return cmd + ["-filter_complex", ";".join(graph)] + outputs
     
     def _create_clip(
         self, 
         job_id: str, 
         segment: AudioSegment, 
-        video_path: str, 
+        video_path: Callable[[], str], 
         clip_index: int,
-        client
+        client,
+        srt_content: Optional[str] = None,
+        source_offset: float = 0.0,
+        source_id: str = ""
     ) -> Dict:
-        """Crea un clip individual usando ffmpeg"""
+        """Crea un clip individual usando ffmpeg (con subtítulos quemados si procede).
+
+        Cada salida se guarda en {job_id}/renders/{clave}.mp4; las que ya existen
+        no se vuelven a codificar. Preview, póster, sprite y pista de miniaturas
+        acompañan al render principal con su misma clave. `video_path` descarga la
+        fuente solo si hace falta.
+        """
         
         clip_filename = f"clip_{clip_index:02d}.mp4"
-        clip_object = f"{job_id}/clips/{clip_filename}"
+        # Un SRT vacío no aporta nada que quemar: se genera solo la versión limpia
+        burn = self.caption_mode != "none" and bool(srt_content and srt_content.strip())
+        want_clean = not burn or self.caption_mode == "both"
+        
+        clean_object = None
+        captioned_object = None
+        if want_clean:
+            clean_object = render_object(job_id, render_key(source_id, segment.start_time, segment.end_time))
+        if burn:
+            overlay = {
+                "subtitles": hashlib.sha256(srt_content.encode("utf-8")).hexdigest(),
+                "style": CAPTION_STYLE,
+            }
+            captioned_object = render_object(job_id, render_key(source_id, segment.start_time, segment.end_time, overlay))
+        
+        # En modo "burned" la salida principal es la versión con subtítulos
+        main_object = clean_object or captioned_object
+        # Preview del vídeo sin subtítulos quemados: el dashboard los superpone con la pista VTT
+        assets = preview_objects(main_object)
+        
+        sizes = {}
+        for object_name in (clean_object, captioned_object):
+            if object_name:
+                size = _object_size(client, self.bucket, object_name)
+                if size is not None:
+                    sizes[object_name] = size
+        renders_saved = len(sizes)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_clip:
-            try:
-
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-i", video_path,
-                    "-ss", str(segment.start_time),
-                    "-t", str(segment.duration),
-                    "-c:v", "libx264",
-                    "-c:a", "aac",
-                    "-preset", "fast",
-                    "-crf", "23",
-                    temp_clip.name
-                ]
+        render_clean = clean_object is not None and clean_object not in sizes
+        render_captioned = captioned_object is not None and captioned_object not in sizes
+        render_previews = any(
+            _object_size(client, self.bucket, assets[name]) is None for name in ("preview", "poster", "sprite")
+        )
+        if render_clean or render_captioned or render_previews:
+            with tempfile.TemporaryDirectory(prefix="clip_") as workdir:
+                clean_path = os.path.join(workdir, "clean.mp4") if render_clean else None
+                captioned_path = os.path.join(workdir, "captioned.mp4") if render_captioned else None
+                srt_path = os.path.join(workdir, "captions.srt") if render_captioned else None
+                if render_captioned:
+                    Path(srt_path).write_text(srt_content, encoding="utf-8")
+                preview_paths = None
+                if render_previews:
+                    preview_paths = {
+                        name: os.path.join(workdir, name + PREVIEW_ASSETS[name][0])
+                        for name in ("preview", "poster", "sprite")
+                    }
+
+                cmd = self._build_ffmpeg_command(
+                    segment, video_path(), clean_path, captioned_path, srt_path, source_offset, preview_paths
+                )
                 
-                LOG.info(f"Creating clip {clip_index}: {segment.start_time:.1f}s-{segment.end_time:.1f}s")
+                LOG.info(f"Creating clip {clip_index}: {segment.start_time:.1f}s-{segment.end_time:.1f}s (captions: {self.caption_mode if burn else 'none'})")
                 proc = subprocess.run(cmd, capture_output=True, text=True)
                 if proc.returncode != 0:
                     LOG.error("FFmpeg failed for clip %s: returncode=%s stdout=%s stderr=%s", clip_index, proc.returncode, proc.stdout, proc.stderr)
                     raise RuntimeError(f"Failed to generate clip {clip_index}: returncode={proc.returncode}; stderr={proc.stderr}")
 
-                # Subir clip a MinIO
-                client.fput_object(self.bucket, clip_object, temp_clip.name)
-                
-                # Crear metadata del clip
-                clip_metadata = {
-                    "clip_index": clip_index,
-                    "filename": clip_filename,
-                    "object_name": clip_object,
-                    "start_time": segment.start_time,
-                    "end_time": segment.end_time,
-                    "duration": segment.duration,
-                    "rms_score": segment.rms_score,
-                    "peak_amplitude": segment.peak_amplitude,
-                    "composite_score": getattr(segment, 'composite_score', 0.0),
-                    "file_size_mb": os.path.getsize(temp_clip.name) / (1024*1024)
-                }
-                
-                LOG.info(f"Clip {clip_index} generated: {clip_metadata['file_size_mb']:.1f}MB")
-                return clip_metadata
-                
-            except subprocess.CalledProcessError as e:
-                LOG.error(f"FFmpeg failed for clip {clip_index}: {e.stderr.decode()}")
-                raise Exception(f"Failed to generate clip {clip_index}")
-            
-            finally:
-                if os.path.exists(temp_clip.name):
-                    os.unlink(temp_clip.name)
+                for object_name, local_path in ((clean_object, clean_path), (captioned_object, captioned_path)):
+                    if local_path:
+                        # CRC en la metadata del objeto: el bundle ZIP lo necesita para servir rangos
+                        client.fput_object(
+                            self.bucket, object_name, local_path, content_type="video/mp4",
+                            metadata=crc_metadata(file_crc32(local_path))
+                        )
+                        sizes[object_name] = os.path.getsize(local_path)
+                if preview_paths:
+                    for name, local_path in preview_paths.items():
+                        client.fput_object(self.bucket, assets[name], local_path, content_type=PREVIEW_ASSETS[name][1])
+                    vtt = thumbnails_vtt(segment.duration).encode("utf-8")
+                    client.put_object(
+                        self.bucket, assets["thumbnails"], io.BytesIO(vtt), length=len(vtt),
+                        content_type=PREVIEW_ASSETS["thumbnails"][1]
+                    )
+        else:
+            LOG.info(f"Clip {clip_index} served from render cache: {segment.start_time:.1f}s-{segment.end_time:.1f}s")
+        
+        clip_metadata = {
+            "clip_index": clip_index,
+            "filename": clip_filename,
+            "object_name": main_object,
+            "start_time": segment.start_time,
+            "end_time": segment.end_time,
+            "duration": segment.duration,
+            "rms_score": segment.rms_score,
+            "peak_amplitude": segment.peak_amplitude,
+            "visual_score": getattr(segment, 'visual_score', 0.0),
+            "composite_score": getattr(segment, 'composite_score', 0.0),
+            "file_size_mb": sizes[main_object] / (1024*1024),
+            "captions_burned": burn and clean_object is None,
+            "renders_saved": renders_saved,
+            "assets": assets
+        }
+        
+        if burn and clean_object:
+            clip_metadata["captioned_object"] = captioned_object
+            clip_metadata["captioned_size_mb"] = sizes[captioned_object] / (1024*1024)
+        
+        LOG.info(f"Clip {clip_index} ready: {clip_metadata['file_size_mb']:.1f}MB ({renders_saved} renders from cache)")
+        return clip_metadata
     
-    def save_clips_metadata(self, job_id: str, clips_metadata: List[Dict]):
-        """Guarda metadata de clips en MinIO"""
+    def load_clips_metadata(self, job_id: str) -> Optional[Dict]:
+        """clips_metadata.json del job, o None si todavía no hay clips"""
+        client = get_minio_client()
+        try:
+            data = client.get_object(self.bucket, f"{job_id}/clips_metadata.json")
+        except Exception:
+            return None
+        try:
+            return loads(data.read())
+        finally:
+            data.close()
+            data.release_conn()
+    
+    def save_clips_metadata(
+        self,
+        job_id: str,
+        clips_metadata: List[Dict],
+        status: str = "completed",
+        clips_expected: int = None
+    ):
+        """Guarda metadata de clips en MinIO.
+
+        Se escribe con un único PUT, así que los lectores ven siempre la versión
+        anterior o la nueva completa. `status` indica si faltan clips por publicar
+        ("in_progress") o si el conjunto es definitivo ("completed" / "failed").
+        """
         client = get_minio_client()
         metadata_object = f"{job_id}/clips_metadata.json"
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
-            json.dump({
-                "job_id": job_id,
-                "clips_count": len(clips_metadata),
-                "clips": clips_metadata,
-                "generated_at": str(datetime.utcnow())
-            }, temp_file, indent=2, default=str)
-            temp_file_path = temp_file.name
+        payload = dumps({
+            "job_id": job_id,
+            "clips_count": len(clips_metadata),
+            "clips_expected": clips_expected if clips_expected is not None else len(clips_metadata),
+            "clips": clips_metadata,
+            "renders_saved": sum(clip.get("renders_saved", 0) for clip in clips_metadata),
+            "status": status,
+            "completed": status != "in_progress",
+            "generated_at": str(datetime.utcnow())
+        }, indent=True)
         
-        try:
-            client.fput_object(self.bucket, metadata_object, temp_file_path)
-            LOG.info(f"Clips metadata saved: {metadata_object}")
-        finally:
-            os.unlink(temp_file_path)
+        client.put_object(
+            self.bucket,
+            metadata_object,
+            io.BytesIO(payload),
+            length=len(payload),
+            content_type="application/json",
+            metadata=crc_metadata(zlib.crc32(payload))
+        )
+        LOG.info(f"Clips metadata saved ({status}, {len(clips_metadata)} clips): {metadata_object}")
+        return metadata_object
 
 # Importar datetime al inicio del archivo
 from datetime import datetime
\ No newline at end of file
@@ -0,0 +1,90 @@
+import math
+from typing import Dict, List, Tuple
+
+# Rendición de preview: lo justo para revisar el clip en el dashboard
+PREVIEW_HEIGHT = 360
+PREVIEW_CRF = 32
+PREVIEW_MAXRATE = "600k"
+PREVIEW_AUDIO_BITRATE = "64k"
+POSTER_HEIGHT = 360
+# Posición del póster dentro del clip (fracción de la duración)
+POSTER_POSITION = 0.5
+# Sprite para scrubbing: una miniatura cada SPRITE_INTERVAL segundos
+SPRITE_INTERVAL = 2.0
+SPRITE_TILE_WIDTH = 160
+SPRITE_TILE_HEIGHT = 90
+SPRITE_COLUMNS = 10
+
+# Nombre en la API → (sufijo del objeto, content type)
+PREVIEW_ASSETS = {
+    "preview": (".preview.mp4", "video/mp4"),
+    "poster": (".poster.jpg", "image/jpeg"),
+    "sprite": (".sprite.jpg", "image/jpeg"),
+    "thumbnails": (".thumbnails.vtt", "text/vtt"),
+}
+
+
+def preview_objects(render_object: str) -> Dict[str, str]:
+    """Objetos de preview junto al render principal: comparten su clave de caché"""
+    base = render_object[:-len(".mp4")] if render_object.endswith(".mp4") else render_object
+    return {name: base + suffix for name, (suffix, _) in PREVIEW_ASSETS.items()}
+
+
+def sprite_layout(duration: float) -> Tuple[int, int, int]:
+    """(miniaturas, columnas, filas) del sprite de un clip"""
+    tiles = max(1, math.ceil(duration / SPRITE_INTERVAL))
+    columns = min(SPRITE_COLUMNS, tiles)
+    # Una fila de margen por si fps emite un frame más por redondeo
+    rows = math.ceil((tiles + 1) / columns)
+    return tiles, columns, rows
+
+
+def preview_branches(duration: float, paths: Dict[str, str]) -> List[Tuple[str, List[str]]]:
+    """Ramas (filtro, argumentos de salida) del filtergraph para preview, póster y sprite.
+
+    Se cuelgan del mismo split que el render principal, así que no añaden decodificaciones.
+    """
+    _, columns, rows = sprite_layout(duration)
+    tile = f"{SPRITE_TILE_WIDTH}:{SPRITE_TILE_HEIGHT}"
+    return [
+        (
+            f"scale=-2:{PREVIEW_HEIGHT}",
+            ["-map", "0:a?", "-c:v", "libx264", "-preset", "veryfast", "-crf", str(PREVIEW_CRF),
+             "-maxrate", PREVIEW_MAXRATE, "-bufsize", PREVIEW_MAXRATE,
+             "-c:a", "aac", "-b:a", PREVIEW_AUDIO_BITRATE, "-movflags", "+faststart", paths["preview"]],
+        ),
+        (
+            f"trim=start={duration * POSTER_POSITION:.3f},setpts=PTS-STARTPTS,scale=-2:{POSTER_HEIGHT}",
+            ["-frames:v", "1", "-q:v", "4", paths["poster"]],
+        ),
+        (
+            f"fps=1/{SPRITE_INTERVAL},scale={tile}:force_original_aspect_ratio=decrease,"
+            f"pad={tile}:(ow-iw)/2:(oh-ih)/2,tile={columns}x{rows}",
+            ["-frames:v", "1", "-q:v", "5", paths["sprite"]],
+        ),
+    ]
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def thumbnails_vtt(duration: float, sprite_url: str = "sprite") -> str:
+    """Pista WebVTT de miniaturas: cada cue apunta a su celda del sprite con #xywh"""
+    tiles, columns, _ = sprite_layout(duration)
+    lines = ["WEBVTT", ""]
+    for i in range(tiles):
+        start = i * SPRITE_INTERVAL
+        end = min(duration, start + SPRITE_INTERVAL)
+        x = (i % columns) * SPRITE_TILE_WIDTH
+        y = (i // columns) * SPRITE_TILE_HEIGHT
+        lines += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}",
+            f"{sprite_url}#xywh={x},{y},{SPRITE_TILE_WIDTH},{SPRITE_TILE_HEIGHT}",
+            "",
+        ]
+    return "\n".join(lines)
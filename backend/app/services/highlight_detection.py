@@ -0,0 +1,66 @@
+import numpy as np
+from collections import deque
+from typing import List, Tuple
+
+# Los frames por encima de este percentil suman al intervalo y los de debajo restan
+DEFAULT_BASELINE_PERCENTILE = 75.0
+
+
+def best_interval_per_end(gain: np.ndarray, min_len: int, max_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Para cada fin j, el inicio i que maximiza sum(gain[i:j]) con min_len <= j - i <= max_len.
+
+    Con prefijos P, sum(gain[i:j]) = P[j] - P[i], así que basta el mínimo de P en la
+    ventana de inicios válidos, que se mantiene con una deque monótona: O(n) en total.
+    Devuelve (starts, sums) indexados por j (starts = -1 si no hay inicio válido).
+    """
+    n = len(gain)
+    prefix = np.concatenate(([0.0], np.cumsum(gain, dtype=np.float64)))
+    starts = np.full(n + 1, -1, dtype=np.int64)
+    sums = np.full(n + 1, -np.inf)
+
+    window = deque()
+    for j in range(min_len, n + 1):
+        candidate = j - min_len
+        while window and prefix[window[-1]] >= prefix[candidate]:
+            window.pop()
+        window.append(candidate)
+        while window[0] < j - max_len:
+            window.popleft()
+        starts[j] = window[0]
+        sums[j] = prefix[j] - prefix[window[0]]
+    return starts, sums
+
+
+def find_highlight_intervals(
+    scores: np.ndarray,
+    min_len: int,
+    max_len: int,
+    top_n: int,
+    baseline_percentile: float = DEFAULT_BASELINE_PERCENTILE
+) -> List[Tuple[int, int, float]]:
+    """Intervalos de frames [start, end) de longitud variable con mayor score acumulado.
+
+    Se resta al score de cada frame una línea base (un percentil del propio audio) para
+    que alargar un clip con relleno tranquilo penalice, se busca el mejor inicio para
+    cada fin en una pasada y se eligen los mejores intervalos sin solape entre sí.
+    """
+    if top_n <= 0 or len(scores) < min_len or min_len <= 0:
+        return []
+    max_len = max(min_len, max_len)
+
+    gain = scores - np.percentile(scores, baseline_percentile)
+    starts, sums = best_interval_per_end(gain, min_len, max_len)
+
+    # Ocupación por frame: un candidato se acepta si no pisa ningún intervalo aceptado
+    taken = np.zeros(len(scores), dtype=bool)
+    selected = []
+    for end in np.argsort(-sums, kind="stable"):
+        # Un intervalo sin ganancia sobre la línea base no es un highlight
+        if len(selected) >= top_n or not sums[end] > 0:
+            break
+        start = int(starts[end])
+        if taken[start:end].any():
+            continue
+        taken[start:end] = True
+        selected.append((start, int(end), float(sums[end])))
+    return selected
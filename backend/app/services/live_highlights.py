@@ -0,0 +1,188 @@
+import heapq
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.audio_features import DEFAULT_FRAME_SECONDS
+from app.services.segment_selection import DEFAULT_MAX_OVERLAP, temporal_iou
+
+# Duración de la ventana deslizante: es también la duración de los clips en directo
+LIVE_WINDOW_SECONDS = 30.0
+# Un candidato se confirma cuando lleva este tiempo sin que aparezca una ventana mejor
+LIVE_SETTLE_SECONDS = 10.0
+# Sin estadística suficiente no se emite nada (el principio del stream suele ser intro)
+LIVE_WARMUP_SECONDS = 120.0
+# Horizonte de la media/varianza exponencial del score: la línea base sigue al stream
+LIVE_BASELINE_SECONDS = 900.0
+# Desviaciones típicas sobre la línea base para que una ventana sea candidata
+LIVE_THRESHOLD_SIGMA = 3.0
+DEFAULT_LIVE_TOP_N = 10
+
+
+@dataclass
+class LiveHighlight:
+    start_time: float
+    end_time: float
+    score: float
+
+    def to_dict(self) -> Dict:
+        return {"start_time": self.start_time, "end_time": self.end_time, "score": self.score}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LiveHighlight":
+        return cls(data["start_time"], data["end_time"], data["score"])
+
+
+class LiveHighlightTracker:
+    """Detección incremental de highlights sobre un stream que no termina.
+
+    Recibe los scores por frame en orden y mantiene la media de la última ventana
+    con una suma corrida. Cada ventana se compara con una línea base exponencial
+    (media y varianza), así que el umbral se adapta al stream sin guardar su
+    historia. Una ventana por encima del umbral es candidata; el mejor candidato
+    se confirma cuando pasan settle_seconds sin que lo supere otra ventana que se
+    solape con él, y se emite si entra en el top-N actual (NMS contra los
+    highlights del top-N).
+
+    Todo el estado es de tamaño fijo (ventana, top-N y cuatro escalares), así que
+    un stream de días ocupa lo mismo que uno de minutos, y se serializa con
+    to_dict/from_dict entre pasos de ingesta.
+    """
+
+    def __init__(
+        self,
+        top_n: int = DEFAULT_LIVE_TOP_N,
+        window_seconds: float = LIVE_WINDOW_SECONDS,
+        frame_seconds: float = DEFAULT_FRAME_SECONDS,
+        settle_seconds: float = LIVE_SETTLE_SECONDS,
+        warmup_seconds: float = LIVE_WARMUP_SECONDS,
+        baseline_seconds: float = LIVE_BASELINE_SECONDS,
+        threshold_sigma: float = LIVE_THRESHOLD_SIGMA,
+        max_overlap: float = DEFAULT_MAX_OVERLAP
+    ):
+        self.top_n = top_n
+        self.window_seconds = window_seconds
+        self.frame_seconds = frame_seconds
+        self.settle_seconds = settle_seconds
+        self.warmup_seconds = warmup_seconds
+        self.threshold_sigma = threshold_sigma
+        self.max_overlap = max_overlap
+        self.alpha = min(1.0, frame_seconds / baseline_seconds)
+
+        self.window_frames = max(1, int(round(window_seconds / frame_seconds)))
+        self.frames: deque = deque(maxlen=self.window_frames)
+        self.window_sum = 0.0
+        self.mean = 0.0
+        self.var = 0.0
+        self.samples = 0
+        self.clock = 0.0
+        self.pending: Optional[LiveHighlight] = None
+        # Min-heap por score: la raíz es el highlight que sale si entra uno mejor
+        self.top: List[tuple] = []
+        self.emitted = 0
+
+    def push(self, start_time: float, scores: np.ndarray) -> List[LiveHighlight]:
+        """Añade los scores por frame que empiezan en `start_time`; devuelve los highlights confirmados"""
+        confirmed = []
+        # Un hueco en el stream (segmentos perdidos) invalida la ventana en curso
+        if start_time > self.clock + self.frame_seconds:
+            self.frames.clear()
+            self.window_sum = 0.0
+        for offset, score in enumerate(np.asarray(scores, dtype=np.float64)):
+            self.clock = start_time + (offset + 1) * self.frame_seconds
+            if len(self.frames) == self.window_frames:
+                self.window_sum -= self.frames[0]
+            self.frames.append(float(score))
+            self.window_sum += float(score)
+            if len(self.frames) == self.window_frames:
+                self._update(self.window_sum / self.window_frames, confirmed)
+            if self.pending and self.clock - self.pending.end_time >= self.settle_seconds:
+                self._confirm(confirmed)
+        return confirmed
+
+    def flush(self) -> List[LiveHighlight]:
+        """Fin del stream: confirma el candidato pendiente sin esperar"""
+        confirmed: List[LiveHighlight] = []
+        if self.pending:
+            self._confirm(confirmed)
+        return confirmed
+
+    def _update(self, window_score: float, confirmed: List[LiveHighlight]):
+        std = math.sqrt(self.var)
+        warm = self.samples * self.frame_seconds >= self.warmup_seconds
+        if warm and std > 0 and window_score >= self.mean + self.threshold_sigma * std:
+            candidate = LiveHighlight(self.clock - self.window_seconds, self.clock, window_score)
+            if self.pending and temporal_iou(candidate, self.pending) <= 0:
+                self._confirm(confirmed)
+            if self.pending is None or candidate.score > self.pending.score:
+                self.pending = candidate
+        # EMA de media y varianza (Welford exponencial); al principio, media acumulada
+        # para que la línea base no arranque sesgada hacia cero
+        self.samples += 1
+        alpha = max(self.alpha, 1.0 / self.samples)
+        delta = window_score - self.mean
+        self.mean += alpha * delta
+        self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+
+    def _confirm(self, confirmed: List[LiveHighlight]):
+        candidate, self.pending = self.pending, None
+        if any(temporal_iou(candidate, kept) > self.max_overlap for _, _, kept in self.top):
+            return
+        entry = (candidate.score, self.emitted, candidate)
+        if len(self.top) < self.top_n:
+            heapq.heappush(self.top, entry)
+        elif candidate.score > self.top[0][0]:
+            heapq.heapreplace(self.top, entry)
+        else:
+            return
+        self.emitted += 1
+        confirmed.append(candidate)
+
+    def top_highlights(self) -> List[LiveHighlight]:
+        return [highlight for _, _, highlight in sorted(self.top, key=lambda entry: -entry[0])]
+
+    def to_dict(self) -> Dict:
+        return {
+            "top_n": self.top_n,
+            "window_seconds": self.window_seconds,
+            "frame_seconds": self.frame_seconds,
+            "settle_seconds": self.settle_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "threshold_sigma": self.threshold_sigma,
+            "max_overlap": self.max_overlap,
+            "alpha": self.alpha,
+            "frames": list(self.frames),
+            "window_sum": self.window_sum,
+            "mean": self.mean,
+            "var": self.var,
+            "samples": self.samples,
+            "clock": self.clock,
+            "pending": self.pending.to_dict() if self.pending else None,
+            "top": [[score, order, highlight.to_dict()] for score, order, highlight in self.top],
+            "emitted": self.emitted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LiveHighlightTracker":
+        tracker = cls(
+            top_n=data["top_n"],
+            window_seconds=data["window_seconds"],
+            frame_seconds=data["frame_seconds"],
+            settle_seconds=data["settle_seconds"],
+            warmup_seconds=data["warmup_seconds"],
+            threshold_sigma=data["threshold_sigma"],
+            max_overlap=data["max_overlap"],
+        )
+        tracker.alpha = data["alpha"]
+        tracker.frames.extend(data["frames"])
+        tracker.window_sum = data["window_sum"]
+        tracker.mean = data["mean"]
+        tracker.var = data["var"]
+        tracker.samples = data["samples"]
+        tracker.clock = data["clock"]
+        tracker.pending = LiveHighlight.from_dict(data["pending"]) if data["pending"] else None
+        tracker.top = [(score, order, LiveHighlight.from_dict(h)) for score, order, h in data["top"]]
+        heapq.heapify(tracker.top)
+        tracker.emitted = data["emitted"]
+        return tracker
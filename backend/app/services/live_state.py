@@ -0,0 +1,22 @@
+from app.services.redis_client import get_redis_client
+from app.utils.json_codec import dumps, loads
+
+# El estado de un directo que nadie avanza caduca solo
+LIVE_STATE_TTL_SECONDS = 24 * 3600
+
+
+def live_state_key(job_id: str) -> str:
+    return f"live:{job_id}"
+
+
+def live_active_key(job_id: str) -> str:
+    return f"live:{job_id}:active"
+
+
+def load_live_state(job_id: str) -> dict | None:
+    raw = get_redis_client().get(live_state_key(job_id))
+    return loads(raw) if raw else None
+
+
+def save_live_state(job_id: str, state: dict):
+    get_redis_client().set(live_state_key(job_id), dumps(state), ex=LIVE_STATE_TTL_SECONDS)
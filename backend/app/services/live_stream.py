@@ -0,0 +1,129 @@
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import urljoin
+import numpy as np
+import requests
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Formato de la variante que se sigue: vídeo y audio muxeados en el mismo segmento
+LIVE_FORMAT = "best"
+# Audio de análisis en directo: mono a la misma frecuencia que el pipeline de VOD
+LIVE_SAMPLE_RATE = 22050
+PLAYLIST_TIMEOUT_SECONDS = 10
+SEGMENT_TIMEOUT_SECONDS = 30
+
+
+@dataclass
+class LiveSegment:
+    sequence: int
+    duration: float
+    url: str
+
+
+@dataclass
+class MediaPlaylist:
+    target_duration: float
+    segments: List[LiveSegment]
+    ended: bool
+
+
+def resolve_live_playlist(source_url: str, fmt: str = LIVE_FORMAT) -> str:
+    """URL del manifiesto HLS del directo (las de Twitch/YouTube caducan: se vuelve a resolver)"""
+    if source_url.split("?")[0].endswith(".m3u8"):
+        return source_url
+    proc = subprocess.run(
+        ["yt-dlp", "-f", fmt, "-g", source_url],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60
+    )
+    urls = [line for line in proc.stdout.splitlines() if line.strip()]
+    if proc.returncode != 0 or not urls:
+        raise RuntimeError(f"yt-dlp could not resolve a live manifest for {source_url}: {proc.stderr[-2000:]}")
+    if not urls[0].split("?")[0].endswith(".m3u8"):
+        raise RuntimeError(f"Live source {source_url} is not served as HLS")
+    return urls[0]
+
+
+def parse_playlist(text: str, base_url: str) -> MediaPlaylist | str:
+    """Parsea un m3u8. Si es un master playlist devuelve la URL de la variante de más bitrate"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ValueError("Not an HLS playlist")
+    # Los segmentos se concatenan byte a byte: solo MPEG-TS, no fMP4 con segmento de init
+    if any(line.startswith("#EXT-X-MAP") for line in lines):
+        raise ValueError("Fragmented MP4 HLS streams are not supported")
+
+    variants = []
+    for i, line in enumerate(lines):
+        if line.startswith("#EXT-X-STREAM-INF") and i + 1 < len(lines):
+            bandwidth = 0
+            for attribute in line.split(":", 1)[1].split(","):
+                if attribute.startswith("BANDWIDTH="):
+                    bandwidth = int(attribute.split("=", 1)[1])
+            variants.append((bandwidth, urljoin(base_url, lines[i + 1])))
+    if variants:
+        return max(variants)[1]
+
+    sequence = 0
+    target_duration = 0.0
+    duration = None
+    segments = []
+    for line in lines:
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif not line.startswith("#") and duration is not None:
+            segments.append(LiveSegment(sequence, duration, urljoin(base_url, line)))
+            sequence += 1
+            duration = None
+    return MediaPlaylist(target_duration, segments, "#EXT-X-ENDLIST" in lines)
+
+
+def fetch_media_playlist(playlist_url: str) -> tuple[str, MediaPlaylist]:
+    """Descarga el manifiesto; si es un master sigue a la variante. Devuelve (url efectiva, playlist)"""
+    for _ in range(2):
+        response = requests.get(playlist_url, timeout=PLAYLIST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        parsed = parse_playlist(response.text, response.url)
+        if isinstance(parsed, MediaPlaylist):
+            return playlist_url, parsed
+        playlist_url = parsed
+    raise ValueError("Nested HLS master playlists are not supported")
+
+
+def download_segment(segment: LiveSegment, output_path: Path) -> Path:
+    with requests.get(segment.url, stream=True, timeout=SEGMENT_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        with open(output_path, "wb") as f:
+            for chunk in response.iter_content(1024 * 1024):
+                f.write(chunk)
+    return output_path
+
+
+def decode_segment_audio(segment_path: Path, sr: int = LIVE_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """Audio mono float32 de un segmento; None si el segmento no trae audio"""
+    proc = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", str(segment_path), "-vn", "-ac", "1", "-ar", str(sr),
+         "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if proc.returncode != 0:
+        LOG.warning("ffmpeg could not decode live segment %s: %s", segment_path, proc.stderr.decode()[-500:])
+        return None
+    return np.frombuffer(proc.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def concat_segments(segment_paths: List[Path], output_path: Path) -> Path:
+    """Une segmentos MPEG-TS consecutivos en un MP4 sin recodificar"""
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", "concat:" + "|".join(str(p) for p in segment_paths),
+           "-c", "copy", "-movflags", "+faststart", str(output_path)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat of live segments failed: {proc.stderr[-2000:]}")
+    return output_path
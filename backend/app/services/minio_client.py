@@ -1,7 +1,9 @@
 import os
-from minio import Minio
 
 def get_minio_client():
+    # Import diferido: la API solo necesita el SDK síncrono en algunos endpoints
+    from minio import Minio
+
     endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
     access_key = os.environ.get("MINIO_KEY", "minioadmin")
     secret_key = os.environ.get("MINIO_SECRET", "minioadmin")
@@ -0,0 +1,74 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Procesos para extraer features; 1 = serie, 0 = uno por CPU
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 1))
+# spawn por defecto: el worker de Celery puede tener hilos vivos al crear el pool
+ANALYSIS_MP_START = os.environ.get("ANALYSIS_MP_START", "spawn")
+# Bloques por proceso: más de uno para repartir bien si unos bloques tardan más
+BLOCKS_PER_WORKER = 4
+
+_executor = None
+_executor_workers = 0
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Procesos efectivos; 1 si el proceso actual no puede tener hijos (prefork de Celery)"""
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers > 1 and multiprocessing.current_process().daemon:
+        LOG.warning("Daemonic process (Celery prefork pool): running analysis serially")
+        return 1
+    return max(1, workers)
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Pool reutilizado entre tareas para no pagar el arranque de los procesos en cada análisis"""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(ANALYSIS_MP_START))
+        _executor_workers = workers
+    return _executor
+
+
+def split_range(total: int, parts: int) -> List[Tuple[int, int]]:
+    """Divide [0, total) en como mucho `parts` rangos contiguos"""
+    parts = max(1, min(parts, total))
+    bounds = [total * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+
+def map_blocks(
+    job: Callable,
+    path: Path,
+    blocks: List[Tuple[int, int]],
+    workers: int,
+    args: tuple = (),
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> list:
+    """Ejecuta job(path, *args, first, last) por bloque en el pool y devuelve los resultados en orden de bloque.
+
+    Los procesos abren el memmap del fichero por su cuenta: solo viajan rutas e índices
+    de ida y resultados pequeños de vuelta. El orden de salida no depende del orden
+    en que terminen los bloques, así que el resultado es determinista.
+    """
+    executor = _get_executor(workers)
+    futures = [executor.submit(job, str(path), *args, first, last) for first, last in blocks]
+    total = blocks[-1][1] if blocks else 0
+    done = 0
+    results = []
+    for (first, last), future in zip(blocks, futures):
+        results.append(future.result())
+        done += last - first
+        if progress_callback:
+            progress_callback(done, total)
+    return results
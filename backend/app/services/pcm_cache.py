@@ -0,0 +1,110 @@
+import os
+import shutil
+import uuid
+import numpy as np
+from pathlib import Path
+from app.services.wav_io import WavInfo, WAV_HEADER_PROBE_BYTES, parse_wav_header, int16_to_mono_float
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Caché local de WAVs compartida por los workers del mismo host (volumen en docker-compose)
+PCM_CACHE_DIR = Path(os.environ.get("PCM_CACHE_DIR", "/tmp/streamsculptor/pcm"))
+PCM_CACHE_MAX_BYTES = int(float(os.environ.get("PCM_CACHE_MAX_GB", 20)) * 1024 ** 3)
+
+
+def cache_path(bucket: str, object_name: str) -> Path:
+    return PCM_CACHE_DIR / bucket / object_name
+
+
+def _prune_cache(keep: Path):
+    """Borra los WAV menos usados hasta quedar bajo PCM_CACHE_MAX_BYTES"""
+    files = [p for p in PCM_CACHE_DIR.rglob("*.wav") if p.is_file()]
+    total = sum(p.stat().st_size for p in files)
+    for path in sorted(files, key=lambda p: p.stat().st_atime):
+        if total <= PCM_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        size = path.stat().st_size
+        # Un memmap abierto sobre el fichero sigue siendo válido tras el unlink
+        path.unlink(missing_ok=True)
+        total -= size
+        LOG.info(f"Evicted {path} from PCM cache")
+
+
+def adopt_into_cache(local_path: Path, bucket: str, object_name: str) -> Path:
+    """Mueve a la caché un WAV recién generado (p. ej. por la descarga) en lugar de borrarlo.
+
+    El workdir de la descarga puede estar en otro volumen que PCM_CACHE_DIR (os.replace
+    fallaría con EXDEV): se mueve a un temporal dentro de la caché (rename o copia) y
+    de ahí al destino con un rename atómico.
+    """
+    target = cache_path(bucket, object_name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(f"{target.name}.{uuid.uuid4().hex}.part")
+    try:
+        shutil.move(str(local_path), str(partial))
+        os.replace(partial, target)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    _prune_cache(keep=target)
+    return target
+
+
+def ensure_cached(client, bucket: str, object_name: str) -> Path:
+    """Ruta local del WAV, descargándolo una sola vez si no está en la caché"""
+    target = cache_path(bucket, object_name)
+    size = client.stat_object(bucket, object_name).size
+    if target.exists() and target.stat().st_size == size:
+        os.utime(target)
+        return target
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(f"{target.name}.{uuid.uuid4().hex}.part")
+    LOG.info(f"Caching {bucket}/{object_name} in {target}")
+    try:
+        client.fget_object(bucket, object_name, str(partial))
+        # Rename atómico: otro worker que lo descargue a la vez deja un fichero idéntico
+        os.replace(partial, target)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    _prune_cache(keep=target)
+    return target
+
+
+class PCMView:
+    """WAV PCM int16 mapeado en memoria.
+
+    `frames` es una vista (num_frames, channels) sobre el fichero: cualquier rango o
+    ventana es otra vista sobre las mismas páginas, así que no se copia nada y varios
+    análisis del mismo job comparten la page cache del sistema. La conversión a float
+    se hace por bloque, solo sobre lo que cada kernel va a leer.
+    """
+
+    def __init__(self, path: Path):
+        size = path.stat().st_size
+        with open(path, "rb") as f:
+            self.info: WavInfo = parse_wav_header(f.read(WAV_HEADER_PROBE_BYTES), size)
+        self.path = path
+        self.frames = np.memmap(
+            path, dtype="<i2", mode="r", offset=self.info.data_offset,
+            shape=(self.info.num_frames, self.info.channels)
+        )
+
+    @property
+    def sample_rate(self) -> int:
+        return self.info.sample_rate
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def mono_float(self, start: int, end: int) -> np.ndarray:
+        """Bloque [start, end) en float32 mono"""
+        return int16_to_mono_float(self.frames[max(0, start):end])
+
+
+def open_pcm(client, bucket: str, object_name: str) -> PCMView:
+    return PCMView(ensure_cached(client, bucket, object_name))
@@ -0,0 +1,67 @@
+import json
+import time
+import logging
+from app.services.redis_client import get_redis_client
+
+LOG = logging.getLogger(__name__)
+
+# Los snapshots de progreso se conservan un día para clientes que se conectan tarde
+PROGRESS_TTL_SECONDS = 24 * 3600
+TERMINAL_STAGES = ("completed", "failed")
+
+
+def progress_channel(job_id: str) -> str:
+    return f"progress:{job_id}"
+
+
+def progress_snapshot_key(job_id: str) -> str:
+    return f"progress:{job_id}:snapshot"
+
+
+def publish_progress(job_id: str, stage: str, key: str | None = None, **fields) -> dict:
+    """Publica un evento de progreso del job por Redis pub/sub.
+
+    Además guarda el último evento de cada `key` (por defecto la etapa) en un hash,
+    para que los suscriptores que llegan tarde puedan reconstruir el estado.
+    Nunca lanza: un fallo de Redis no debe romper el pipeline.
+    """
+    event = {"job_id": job_id, "stage": stage, "ts": time.time(), **fields}
+    try:
+        payload = json.dumps(event, default=str)
+        client = get_redis_client()
+        pipe = client.pipeline()
+        pipe.publish(progress_channel(job_id), payload)
+        pipe.hset(progress_snapshot_key(job_id), key or stage, payload)
+        pipe.expire(progress_snapshot_key(job_id), PROGRESS_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        LOG.warning(f"Failed to publish progress for job {job_id} ({stage}): {e}")
+    return event
+
+
+def reset_progress(job_id: str):
+    """Olvida los eventos de una ejecución anterior del job (al encolar una nueva).
+
+    Sin esto, un suscriptor recibiría el "completed" viejo del snapshot y el stream
+    se cerraría antes de empezar. Nunca lanza.
+    """
+    try:
+        get_redis_client().delete(progress_snapshot_key(job_id))
+    except Exception as e:
+        LOG.warning(f"Failed to reset progress for job {job_id}: {e}")
+
+
+class ProgressReporter:
+    """Publicador de progreso con limitación de frecuencia por etapa"""
+
+    def __init__(self, job_id: str, min_interval: float = 0.5):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_sent = {}
+
+    def __call__(self, stage: str, force: bool = False, **fields):
+        now = time.monotonic()
+        if not force and now - self._last_sent.get(stage, 0.0) < self.min_interval:
+            return None
+        self._last_sent[stage] = now
+        return publish_progress(self.job_id, stage, **fields)
@@ -0,0 +1,8 @@
+import os
+import redis
+
+def get_redis_url() -> str:
+    return os.environ.get("REDIS_URL", "redis://redis:6379/0")
+
+def get_redis_client():
+    return redis.Redis.from_url(get_redis_url(), decode_responses=True)
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import heapq
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from app.services.redis_client import get_redis_client
+from app.services.progress import reset_progress
+from app.tasks.signatures import JOB_COMPLETED, JOB_FAILED
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Capacidad global de jobs en ejecución y reparto entre carriles
+MAX_RUNNING_JOBS = int(os.environ.get("SCHED_MAX_RUNNING_JOBS", 8))
+MAX_RUNNING_PER_USER = int(os.environ.get("SCHED_MAX_RUNNING_PER_USER", 2))
+# Slots que los jobs normales nunca ocupan: los jobs cortos siempre encuentran hueco
+PRIORITY_RESERVED_SLOTS = int(os.environ.get("SCHED_PRIORITY_RESERVED_SLOTS", 2))
+# Jobs estimados por debajo de este coste van al carril prioritario
+SHORT_JOB_SECONDS = float(os.environ.get("SCHED_SHORT_JOB_SECONDS", 300))
+# Un job sin release en este tiempo se da por perdido (worker caído)
+JOB_MAX_RUNTIME = float(os.environ.get("SCHED_JOB_MAX_RUNTIME", 6 * 3600))
+# Pesos por usuario para el reparto justo, p. ej. SCHED_USER_WEIGHTS='{"42": 2}'
+USER_WEIGHTS = json.loads(os.environ.get("SCHED_USER_WEIGHTS", "{}"))
+
+# Modelo de coste (segundos de procesamiento) usado para ordenar y estimar esperas
+PIPELINE_SECONDS_PER_VOD_SECOND = float(os.environ.get("SCHED_SECONDS_PER_VOD_SECOND", 0.25))
+DEFAULT_VOD_SECONDS = 3600.0
+RENDER_SECONDS_PER_CLIP = 20.0
+
+LANE_PRIORITY = "priority"
+LANE_NORMAL = "normal"
+LANES = (LANE_PRIORITY, LANE_NORMAL)
+
+KEY_PREFIX = "sched"
+
+
+def estimate_pipeline_seconds(expected_duration: float | None = None, fraction: float = 1.0) -> float:
+    """Coste estimado de procesar un VOD (fraction < 1 para pipelines parciales)"""
+    return (expected_duration or DEFAULT_VOD_SECONDS) * PIPELINE_SECONDS_PER_VOD_SECOND * fraction
+
+
+def estimate_render_seconds(max_clips: int) -> float:
+    return max_clips * RENDER_SECONDS_PER_CLIP
+
+
+def _user_key(user_id) -> str:
+    return "anonymous" if user_id is None else str(user_id)
+
+
+class JobScheduler:
+    """Planificador delante del dispatch de Celery.
+
+    - Weighted fair queuing por usuario: cada job recibe una etiqueta virtual de fin
+      (inicio + coste / peso) y cada carril se sirve en orden de etiqueta, así que un
+      usuario con veinte VODs largos no adelanta al resto.
+    - Límite de jobs en ejecución por usuario.
+    - Carril prioritario para jobs cortos y re-renders, con slots reservados.
+
+    Todo el estado vive en Redis para que API y workers compartan la misma cola.
+    """
+
+    def __init__(self, client=None):
+        self.redis = client or get_redis_client()
+
+    # Claves
+    def _jobs_key(self):
+        return f"{KEY_PREFIX}:jobs"
+
+    def _running_key(self):
+        return f"{KEY_PREFIX}:running"
+
+    def _queue_key(self, lane: str):
+        return f"{KEY_PREFIX}:queue:{lane}"
+
+    def _user_finish_key(self, lane: str):
+        return f"{KEY_PREFIX}:user_finish:{lane}"
+
+    def _vtime_key(self):
+        return f"{KEY_PREFIX}:vtime"
+
+    @contextmanager
+    def _locked(self):
+        with self.redis.lock(f"{KEY_PREFIX}:lock", timeout=30, blocking_timeout=10):
+            yield
+
+    def submit(
+        self,
+        task_name: str,
+        args: list,
+        kwargs: dict | None = None,
+        user_id=None,
+        job_id: str | None = None,
+        estimated_seconds: float | None = None,
+        lane: str | None = None,
+        publish_outcome: bool = False
+    ) -> dict:
+        """Encola un job y despacha si hay capacidad. Devuelve el id de tarea y su posición.
+
+        Con job_id es una nueva ejecución del job: se borra el progreso de la anterior.
+        publish_outcome enlaza callbacks que publican "completed" / "failed" al terminar,
+        para tareas que no publican su propio final (los pipelines y el directo sí lo hacen).
+        """
+        if job_id:
+            reset_progress(job_id)
+        ticket = str(uuid.uuid4())
+        cost = max(1.0, estimated_seconds or estimate_pipeline_seconds())
+        lane = lane or (LANE_PRIORITY if cost <= SHORT_JOB_SECONDS else LANE_NORMAL)
+        user = _user_key(user_id)
+        weight = float(USER_WEIGHTS.get(user, 1.0))
+
+        with self._locked():
+            vtime = float(self.redis.get(self._vtime_key()) or 0.0)
+            last_finish = float(self.redis.hget(self._user_finish_key(lane), user) or 0.0)
+            start_tag = max(vtime, last_finish)
+            finish_tag = start_tag + cost / weight
+            job = {
+                "ticket": ticket,
+                "job_id": job_id,
+                "user": user,
+                "lane": lane,
+                "cost": cost,
+                "task_name": task_name,
+                "args": args,
+                "kwargs": kwargs or {},
+                "publish_outcome": publish_outcome,
+                "submitted_at": time.time(),
+                "start_tag": start_tag,
+                "finish_tag": finish_tag,
+            }
+            pipe = self.redis.pipeline()
+            pipe.hset(self._jobs_key(), ticket, json.dumps(job))
+            pipe.zadd(self._queue_key(lane), {ticket: finish_tag})
+            pipe.hset(self._user_finish_key(lane), user, finish_tag)
+            pipe.execute()
+            LOG.info(f"Scheduled {task_name} for user {user} in {lane} lane (ticket {ticket}, cost {cost:.0f}s)")
+            self._dispatch_locked()
+
+        return self.status(ticket)
+
+    def release(self, ticket: str):
+        """Libera el slot de un job terminado (o fallido) y despacha los siguientes"""
+        with self._locked():
+            pipe = self.redis.pipeline()
+            pipe.hdel(self._running_key(), ticket)
+            pipe.hdel(self._jobs_key(), ticket)
+            pipe.execute()
+            self._dispatch_locked()
+
+    def dispatch(self):
+        with self._locked():
+            self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        from app.celery_app import celery
+
+        running = {t: json.loads(v) for t, v in self.redis.hgetall(self._running_key()).items()}
+        now = time.time()
+        for ticket, job in list(running.items()):
+            if now - job["started_at"] > JOB_MAX_RUNTIME:
+                LOG.warning(f"Dropping stale scheduled job {ticket} (running for {now - job['started_at']:.0f}s)")
+                self.redis.hdel(self._running_key(), ticket)
+                self.redis.hdel(self._jobs_key(), ticket)
+                del running[ticket]
+
+        per_user = Counter(job["user"] for job in running.values())
+        normal_running = sum(1 for job in running.values() if job["lane"] == LANE_NORMAL)
+        total_running = len(running)
+
+        for lane in LANES:
+            for ticket in self.redis.zrange(self._queue_key(lane), 0, -1):
+                if total_running >= MAX_RUNNING_JOBS:
+                    return
+                if lane == LANE_NORMAL and normal_running >= MAX_RUNNING_JOBS - PRIORITY_RESERVED_SLOTS:
+                    break
+                raw = self.redis.hget(self._jobs_key(), ticket)
+                if raw is None:
+                    self.redis.zrem(self._queue_key(lane), ticket)
+                    continue
+                job = json.loads(raw)
+                if per_user[job["user"]] >= MAX_RUNNING_PER_USER:
+                    continue
+
+                job["started_at"] = now
+                pipe = self.redis.pipeline()
+                pipe.zrem(self._queue_key(lane), ticket)
+                pipe.hset(self._running_key(), ticket, json.dumps(job))
+                vtime = float(self.redis.get(self._vtime_key()) or 0.0)
+                pipe.set(self._vtime_key(), max(vtime, job["start_tag"]))
+                pipe.execute()
+
+                release = celery.signature("app.tasks.scheduling.release_scheduled_job", args=(ticket,), immutable=True)
+                link, link_error = [release], [release]
+                if job.get("publish_outcome") and job["job_id"]:
+                    link.append(celery.signature(JOB_COMPLETED, args=(job["job_id"],), immutable=True))
+                    link_error.append(celery.signature(JOB_FAILED, args=(job["job_id"],)))
+                celery.send_task(
+                    job["task_name"],
+                    args=job["args"],
+                    kwargs=job["kwargs"],
+                    task_id=ticket,
+                    link=link,
+                    link_error=link_error,
+                )
+                per_user[job["user"]] += 1
+                total_running += 1
+                if lane == LANE_NORMAL:
+                    normal_running += 1
+                LOG.info(f"Dispatched {job['task_name']} (ticket {ticket}) for user {job['user']}")
+
+    def status(self, ticket: str) -> dict:
+        """Estado en la cola: running, queued (con posición y hora estimada de inicio) o unknown"""
+        raw = self.redis.hget(self._running_key(), ticket)
+        if raw is not None:
+            job = json.loads(raw)
+            return {"task_id": ticket, "state": "running", "lane": job["lane"], "started_at": job["started_at"]}
+
+        estimates = self.queue_estimates()
+        if ticket in estimates:
+            return {"task_id": ticket, "state": "queued", **estimates[ticket]}
+        return {"task_id": ticket, "state": "unknown"}
+
+    def queue_estimates(self) -> dict:
+        """Posición y hora estimada de inicio de cada job en cola.
+
+        Simula los slots libres con el coste estimado de cada job, en el orden en el
+        que se despacharían (carril prioritario y luego etiquetas virtuales). Ignora
+        el límite por usuario, así que es una estimación optimista para usuarios con
+        varios jobs en marcha.
+        """
+        now = time.time()
+        running = [json.loads(v) for v in self.redis.hgetall(self._running_key()).values()]
+        slots = [max(0.0, job["cost"] - (now - job["started_at"])) for job in running]
+        slots += [0.0] * max(0, MAX_RUNNING_JOBS - len(slots))
+        heapq.heapify(slots)
+
+        estimates = {}
+        position = 0
+        for lane in LANES:
+            for ticket in self.redis.zrange(self._queue_key(lane), 0, -1):
+                raw = self.redis.hget(self._jobs_key(), ticket)
+                if raw is None:
+                    continue
+                job = json.loads(raw)
+                position += 1
+                start_in = heapq.heappop(slots) if slots else 0.0
+                heapq.heappush(slots, start_in + job["cost"])
+                estimates[ticket] = {
+                    "lane": lane,
+                    "position": position,
+                    "estimated_start_in": round(start_in, 1),
+                    "estimated_start_at": now + start_in,
+                }
+        return estimates
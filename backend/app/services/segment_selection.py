@@ -0,0 +1,104 @@
+import heapq
+import numpy as np
+from typing import List, Callable, Any
+
+# Solape temporal (IoU) máximo entre dos clips seleccionados y separación mínima en segundos
+DEFAULT_MAX_OVERLAP = 0.1
+DEFAULT_MIN_GAP = 0.0
+
+
+def temporal_iou(a, b) -> float:
+    """Intersección sobre unión de dos intervalos con start_time/end_time"""
+    intersection = min(a.end_time, b.end_time) - max(a.start_time, b.start_time)
+    if intersection <= 0:
+        return 0.0
+    union = max(a.end_time, b.end_time) - min(a.start_time, b.start_time)
+    return intersection / union
+
+
+def temporal_gap(a, b) -> float:
+    """Segundos entre dos intervalos (negativo si se solapan)"""
+    return max(a.start_time, b.start_time) - min(a.end_time, b.end_time)
+
+
+def compatible(candidate, kept, max_overlap: float = DEFAULT_MAX_OVERLAP, min_gap: float = DEFAULT_MIN_GAP) -> bool:
+    """El solape lo limita max_overlap; min_gap solo separa intervalos que no se solapan"""
+    if temporal_iou(candidate, kept) > max_overlap:
+        return False
+    if min_gap <= 0:
+        return True
+    gap = temporal_gap(candidate, kept)
+    return gap < 0 or gap >= min_gap
+
+
+def select_top_segments(
+    segments: List[Any],
+    top_n: int,
+    score: Callable[[Any], float] = lambda s: s.composite_score,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP
+) -> List[Any]:
+    """Top-K por score con supresión de no-máximos temporal.
+
+    Se hace heapify (O(n)) y se extraen candidatos solo hasta aceptar top_n, sin
+    ordenar la lista completa. Un candidato se descarta si su IoU con algún clip ya
+    aceptado supera max_overlap o si, sin solaparse con él, queda a menos de min_gap
+    segundos. Con max_overlap >= 1 y min_gap <= 0 equivale a heapq.nlargest.
+    """
+    if top_n <= 0 or not segments:
+        return []
+    if max_overlap >= 1.0 and min_gap <= 0:
+        return heapq.nlargest(top_n, segments, key=score)
+
+    # El índice desempata sin comparar los segmentos entre sí
+    heap = [(-score(segment), index, segment) for index, segment in enumerate(segments)]
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and len(selected) < top_n:
+        _, _, candidate = heapq.heappop(heap)
+        if all(compatible(candidate, kept, max_overlap, min_gap) for kept in selected):
+            selected.append(candidate)
+    return selected
+
+
+def select_top_indices(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    scores: np.ndarray,
+    top_n: int,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP
+) -> np.ndarray:
+    """Versión columnar de select_top_segments: devuelve los índices elegidos.
+
+    argpartition aísla un lote de mejores candidatos sin ordenar todo; solo si la
+    supresión vacía el lote antes de llegar a top_n se amplía y se repite.
+    """
+    n = len(scores)
+    if top_n <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    suppress = max_overlap < 1.0 or min_gap > 0
+    pool = min(n, max(top_n * 8, 64) if suppress else top_n)
+
+    while True:
+        candidates = np.argpartition(-scores, pool - 1)[:pool] if pool < n else np.arange(n)
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        selected = []
+        for index in order:
+            if len(selected) >= top_n:
+                break
+            if suppress and selected:
+                kept = np.asarray(selected)
+                intersection = np.minimum(ends[kept], ends[index]) - np.maximum(starts[kept], starts[index])
+                union = np.maximum(ends[kept], ends[index]) - np.minimum(starts[kept], starts[index])
+                iou = np.where(intersection > 0, intersection / union, 0.0)
+                if np.any(iou > max_overlap):
+                    continue
+                # Igual que compatible(): min_gap solo entre ventanas que no se solapan
+                if min_gap > 0 and np.any((intersection <= 0) & (-intersection < min_gap)):
+                    continue
+            selected.append(int(index))
+        if len(selected) >= top_n or pool >= n:
+            return np.asarray(selected, dtype=np.int64)
+        pool = min(n, pool * 4)
@@ -0,0 +1,152 @@
+import io
+import numpy as np
+from typing import Dict, Iterable, Iterator, List
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Una fila por ventana analizada; los tiempos en float64 para no perder precisión en VODs largos
+SEGMENT_DTYPE = np.dtype([
+    ("start_time", np.float64),
+    ("end_time", np.float64),
+    ("duration", np.float32),
+    ("rms_score", np.float32),
+    ("peak_amplitude", np.float32),
+    ("spectral_centroid", np.float32),
+    ("zero_crossing_rate", np.float32),
+    ("visual_score", np.float32),
+    ("composite_score", np.float32),
+])
+SEGMENT_FIELDS = SEGMENT_DTYPE.names
+
+
+class SegmentRow:
+    """Vista ligera de una fila: se comporta como AudioSegment sin copiar los datos"""
+    __slots__ = ("_rows", "_index")
+
+    def __init__(self, rows: np.ndarray, index: int):
+        object.__setattr__(self, "_rows", rows)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name):
+        if name in SEGMENT_FIELDS:
+            return float(self._rows[name][self._index])
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name not in SEGMENT_FIELDS:
+            raise AttributeError(name)
+        self._rows[name][self._index] = value
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: float(self._rows[name][self._index]) for name in SEGMENT_FIELDS}
+
+    def __repr__(self):
+        return f"SegmentRow({self.start_time:.2f}-{self.end_time:.2f}, score={self.composite_score:.4f})"
+
+
+class SegmentTable:
+    """Segmentos de audio en columnas (array estructurado de numpy).
+
+    Sustituye a la lista de AudioSegment en el análisis: filtrar, puntuar y ordenar
+    son operaciones vectorizadas y se guarda en MinIO como .npy binario. Iterar o
+    indexar devuelve SegmentRow, así que el código que usa atributos sigue valiendo.
+    """
+
+    def __init__(self, rows: np.ndarray = None):
+        self.rows = rows if rows is not None else np.zeros(0, dtype=SEGMENT_DTYPE)
+
+    @classmethod
+    def empty(cls, size: int) -> "SegmentTable":
+        return cls(np.zeros(size, dtype=SEGMENT_DTYPE))
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict]) -> "SegmentTable":
+        items = list(items)
+        table = cls.empty(len(items))
+        for name in SEGMENT_FIELDS:
+            table.rows[name] = [item.get(name, 0.0) for item in items]
+        return table
+
+    @classmethod
+    def from_segments(cls, segments: Iterable) -> "SegmentTable":
+        """Desde objetos con atributos (AudioSegment, SegmentRow)"""
+        segments = list(segments)
+        table = cls.empty(len(segments))
+        for name in SEGMENT_FIELDS:
+            table.rows[name] = [getattr(segment, name, 0.0) for segment in segments]
+        return table
+
+    @classmethod
+    def concatenate(cls, tables: List["SegmentTable"]) -> "SegmentTable":
+        if not tables:
+            return cls()
+        return cls(np.concatenate([t.rows for t in tables]))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SegmentTable(self.rows[index])
+        if index < 0:
+            index += len(self.rows)
+        if not 0 <= index < len(self.rows):
+            raise IndexError(index)
+        return SegmentRow(self.rows, index)
+
+    def __iter__(self) -> Iterator[SegmentRow]:
+        return (SegmentRow(self.rows, i) for i in range(len(self.rows)))
+
+    def column(self, name: str) -> np.ndarray:
+        return self.rows[name]
+
+    def filter(self, mask: np.ndarray) -> "SegmentTable":
+        return SegmentTable(self.rows[mask])
+
+    def take(self, indices) -> "SegmentTable":
+        return SegmentTable(self.rows[np.asarray(indices, dtype=np.int64)])
+
+    def sorted_by(self, name: str, descending: bool = True) -> "SegmentTable":
+        order = np.argsort(self.rows[name], kind="stable")
+        return self.take(order[::-1] if descending else order)
+
+    def to_dicts(self) -> List[Dict[str, float]]:
+        """Solo para el borde HTTP / JSON"""
+        columns = {name: self.rows[name].tolist() for name in SEGMENT_FIELDS}
+        return [
+            {name: columns[name][i] for name in SEGMENT_FIELDS}
+            for i in range(len(self.rows))
+        ]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.save(buffer, self.rows, allow_pickle=False)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "SegmentTable":
+        rows = np.load(io.BytesIO(payload), allow_pickle=False)
+        if rows.dtype != SEGMENT_DTYPE:
+            # Columnas añadidas después de guardar la tabla quedan a 0
+            upgraded = np.zeros(len(rows), dtype=SEGMENT_DTYPE)
+            for name in rows.dtype.names:
+                if name in SEGMENT_FIELDS:
+                    upgraded[name] = rows[name]
+            rows = upgraded
+        return cls(rows)
+
+
+def save_segment_table(client, bucket: str, object_name: str, table: SegmentTable) -> str:
+    payload = table.to_bytes()
+    client.put_object(bucket, object_name, io.BytesIO(payload), length=len(payload), content_type="application/octet-stream")
+    return object_name
+
+
+def load_segment_table(client, bucket: str, object_name: str) -> SegmentTable:
+    data = client.get_object(bucket, object_name)
+    try:
+        return SegmentTable.from_bytes(data.read())
+    finally:
+        data.close()
+        data.release_conn()
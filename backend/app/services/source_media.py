@@ -0,0 +1,203 @@
+import io
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.services.redis_client import get_redis_client
+from app.utils.json_codec import dumps, loads
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Modos de ingesta: VOD completo, o solo audio y después las secciones que acaban en clips
+INGEST_MODES = ("full", "audio_first")
+# Margen alrededor de cada clip: permite reajustar bordes sin volver a descargar
+SECTION_PADDING_SECONDS = 5.0
+# Rangos más cerca que esto se descargan como una sola sección
+SECTION_MERGE_GAP_SECONDS = 10.0
+SECTION_FORMAT = "bestvideo+bestaudio/best"
+# Lock del sections.json de un job: prefetch, renders y pasos del directo lo actualizan a la vez
+SECTIONS_LOCK_SECONDS = 60
+
+
+def source_object(job_id: str) -> str:
+    return f"{job_id}/source.json"
+
+
+def sections_object(job_id: str) -> str:
+    return f"{job_id}/sections.json"
+
+
+def _put_json(client, bucket: str, object_name: str, payload: dict):
+    data = dumps(payload)
+    client.put_object(bucket, object_name, io.BytesIO(data), length=len(data), content_type="application/json")
+
+
+def _get_json(client, bucket: str, object_name: str) -> Optional[dict]:
+    try:
+        data = client.get_object(bucket, object_name)
+    except Exception:
+        return None
+    try:
+        return loads(data.read())
+    finally:
+        data.close()
+        data.release_conn()
+
+
+def save_source_info(client, bucket: str, job_id: str, source_url: str, ingest_mode: str) -> str:
+    """Guarda de dónde viene el VOD: hace falta para descargar secciones o el vídeo más tarde"""
+    object_name = source_object(job_id)
+    _put_json(client, bucket, object_name, {"source_url": source_url, "ingest_mode": ingest_mode})
+    return object_name
+
+
+def load_source_info(client, bucket: str, job_id: str) -> Optional[dict]:
+    return _get_json(client, bucket, source_object(job_id))
+
+
+def has_full_video(client, bucket: str, job_id: str) -> bool:
+    try:
+        client.stat_object(bucket, f"{job_id}/input.mp4")
+        return True
+    except Exception:
+        return False
+
+
+def load_sections(client, bucket: str, job_id: str) -> List[Dict]:
+    """Secciones de vídeo ya descargadas: [{start, end, object_name}] ordenadas por inicio"""
+    index = _get_json(client, bucket, sections_object(job_id))
+    return index["sections"] if index else []
+
+
+def find_section(sections: List[Dict], start: float, end: float) -> Optional[Dict]:
+    for section in sections:
+        if section["start"] <= start and end <= section["end"]:
+            return section
+    return None
+
+
+def plan_sections(
+    ranges: Iterable[Tuple[float, float]],
+    padding: float = SECTION_PADDING_SECONDS,
+    merge_gap: float = SECTION_MERGE_GAP_SECONDS
+) -> List[Tuple[float, float]]:
+    """Rangos con margen, fusionando los que se solapan o quedan muy cerca"""
+    padded = sorted((max(0.0, start - padding), end + padding) for start, end in ranges)
+    merged: List[Tuple[float, float]] = []
+    for start, end in padded:
+        if merged and start - merged[-1][1] <= merge_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def download_section(source_url: str, start: float, end: float, output_path: Path, fmt: str = SECTION_FORMAT) -> Path:
+    """Descarga solo [start, end) del vídeo con yt-dlp.
+
+    --force-keyframes-at-cuts hace que la sección empiece exactamente en `start`,
+    así el offset de los clips dentro de la sección es start_time - start.
+    """
+    cmd = [
+        "yt-dlp", "-f", fmt,
+        "--download-sections", f"*{start:.3f}-{end:.3f}",
+        "--force-keyframes-at-cuts",
+        "--merge-output-format", "mp4",
+        "-o", str(output_path), source_url,
+    ]
+    LOG.info("Running: %s", " ".join(cmd))
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"yt-dlp section download failed ({start:.1f}-{end:.1f}s): {proc.stdout[-2000:]}")
+    # yt-dlp puede añadir la extensión real del contenedor
+    matches = [output_path] if output_path.exists() else sorted(output_path.parent.glob(output_path.name + "*"))
+    if not matches or matches[0].stat().st_size == 0:
+        raise RuntimeError(f"yt-dlp produced no file for section {start:.1f}-{end:.1f}s")
+    return matches[0]
+
+
+def ensure_video_sections(
+    client,
+    bucket: str,
+    job_id: str,
+    ranges: Iterable[Tuple[float, float]],
+    source_url: Optional[str] = None
+) -> List[Dict]:
+    """Descarga las secciones que faltan para cubrir `ranges` y devuelve el índice actualizado.
+
+    Las ya descargadas (por la etapa de prefetch o un render anterior) no se repiten,
+    así que un re-render con los mismos clips no toca la fuente.
+    """
+    sections = load_sections(client, bucket, job_id)
+    missing = [(start, end) for start, end in ranges if find_section(sections, start, end) is None]
+    if not missing:
+        return sections
+
+    if source_url is None:
+        info = load_source_info(client, bucket, job_id)
+        if not info:
+            raise RuntimeError(f"No source info for job {job_id}: cannot download video sections")
+        source_url = info["source_url"]
+
+    stored = []
+    with tempfile.TemporaryDirectory(prefix="sections_") as workdir:
+        for start, end in plan_sections(missing):
+            local = download_section(source_url, start, end, Path(workdir) / f"section_{int(start * 1000)}.mp4")
+            stored.append(_store_section(client, bucket, job_id, start, end, local))
+            local.unlink()
+
+    return _merge_sections(client, bucket, job_id, stored)
+
+
+def add_video_section(client, bucket: str, job_id: str, start: float, end: float, local_path: Path) -> Dict:
+    """Registra una sección ya disponible en local (p. ej. segmentos de un directo) y la devuelve"""
+    section = _store_section(client, bucket, job_id, start, end, local_path)
+    _merge_sections(client, bucket, job_id, [section])
+    return section
+
+
+def remove_video_sections(client, bucket: str, job_id: str, object_names: Iterable[str]) -> List[Dict]:
+    """Quita secciones del índice y borra sus objetos (p. ej. las de un directo ya recortadas)"""
+    object_names = set(object_names)
+    with _sections_lock(job_id):
+        sections = [s for s in load_sections(client, bucket, job_id) if s["object_name"] not in object_names]
+        _save_sections(client, bucket, job_id, sections)
+    for object_name in object_names:
+        try:
+            client.remove_object(bucket, object_name)
+        except Exception as e:
+            LOG.warning(f"Could not remove video section {object_name}: {e}")
+    return sections
+
+
+def _sections_lock(job_id: str):
+    return get_redis_client().lock(f"sections:{job_id}:lock", timeout=SECTIONS_LOCK_SECONDS, blocking_timeout=SECTIONS_LOCK_SECONDS)
+
+
+def _merge_sections(client, bucket: str, job_id: str, stored: List[Dict]) -> List[Dict]:
+    """Añade secciones al índice releyéndolo bajo el lock, sin perder las de otros workers.
+
+    Las descargas van fuera del lock; solo la lectura y escritura del índice lo toman.
+    """
+    with _sections_lock(job_id):
+        sections = load_sections(client, bucket, job_id)
+        known = {section["object_name"] for section in sections}
+        sections += [section for section in stored if section["object_name"] not in known]
+        return _save_sections(client, bucket, job_id, sections)
+
+
+def _store_section(client, bucket: str, job_id: str, start: float, end: float, local_path: Path) -> Dict:
+    object_name = f"{job_id}/sections/section_{int(start * 1000):010d}_{int(end * 1000):010d}.mp4"
+    client.fput_object(bucket, object_name, str(local_path), content_type="video/mp4")
+    LOG.info(f"Video section {start:.1f}-{end:.1f}s stored as {object_name}")
+    return {
+        "start": start, "end": end, "object_name": object_name,
+        "size_bytes": local_path.stat().st_size,
+    }
+
+
+def _save_sections(client, bucket: str, job_id: str, sections: List[Dict]) -> List[Dict]:
+    sections.sort(key=lambda section: section["start"])
+    _put_json(client, bucket, sections_object(job_id), {"job_id": job_id, "sections": sections})
+    return sections
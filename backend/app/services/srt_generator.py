@@ -1,168 +1,194 @@
-import tempfile
-import os
-from typing import List, Dict
+import io
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterable
 from app.services.minio_client import get_minio_client
+from app.services.transcript_index import TranscriptIndex, load_transcript_index as load_compact_transcript_index
+from app.services.clip_bundle import crc_metadata
 import json
 import logging
 
 LOG = logging.getLogger(__name__)
 
+SUBTITLE_FORMATS = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+}
+UPLOAD_WORKERS = 8
+
 class SRTGenerator:
-    """Generador de subtítulos SRT para clips"""
-    
+    """Generador de subtítulos SRT/WebVTT para clips"""
+
     def __init__(self):
         self.bucket = "vods"
-    
+
     def generate_srt_for_clip(
-        self, 
-        job_id: str, 
-        clip_start_time: float, 
-        clip_end_time: float, 
-        clip_index: int
+        self,
+        job_id: str,
+        clip_start_time: float,
+        clip_end_time: float,
+        clip_index: int,
+        transcript_index: TranscriptIndex = None
     ) -> str:
-        """Genera archivo SRT para un clip específico"""
-        
-        # Obtener transcripción completa
-        transcript = self._get_transcript(job_id)
-        if not transcript:
-            raise Exception(f"No transcript found for job {job_id}")
-        
-        # Filtrar segmentos que caen dentro del clip
-        clip_segments = self._filter_segments_for_clip(
-            transcript["segments"], 
-            clip_start_time, 
-            clip_end_time
-        )
-        
-        # Generar contenido SRT
-        srt_content = self._create_srt_content(clip_segments, clip_start_time)
-        
-        # Guardar SRT en MinIO
-        srt_object = f"{job_id}/clips/clip_{clip_index:02d}.srt"
-        self._save_srt_to_minio(srt_object, srt_content)
-        
-        return srt_object
-    
+        """Genera archivo SRT para un clip específico.
+
+        Se puede pasar el índice de la transcripción ya cargado para no descargarla en cada clip.
+        """
+        clip = {"clip_index": clip_index, "start_time": clip_start_time, "end_time": clip_end_time}
+        objects = self.generate_subtitles_for_clips(job_id, [clip], transcript_index, formats=("srt",))
+        return objects[clip_index]["srt"]
+
     def generate_srt_for_all_clips(self, job_id: str) -> Dict[int, str]:
-        """Genera SRT para todos los clips de un job"""
-        
+        """Genera SRT (y WebVTT) para todos los clips de un job"""
+
         # Obtener metadata de clips
         clips_metadata = self._get_clips_metadata(job_id)
-        srt_files = {}
-        
-        for clip in clips_metadata["clips"]:
-            try:
-                srt_object = self.generate_srt_for_clip(
-                    job_id=job_id,
-                    clip_start_time=clip["start_time"],
-                    clip_end_time=clip["end_time"],
-                    clip_index=clip["clip_index"]
-                )
-                srt_files[clip["clip_index"]] = srt_object
-                LOG.info(f"SRT generated for clip {clip['clip_index']}: {srt_object}")
-                
-            except Exception as e:
-                LOG.error(f"Failed to generate SRT for clip {clip['clip_index']}: {e}")
-                
-        return srt_files
-    
+        objects = self.generate_subtitles_for_clips(job_id, clips_metadata["clips"])
+        return {clip_index: formats["srt"] for clip_index, formats in objects.items()}
+
+    def generate_subtitles_for_clips(
+        self,
+        job_id: str,
+        clips: List[Dict],
+        transcript_index: TranscriptIndex = None,
+        formats: Iterable[str] = ("srt", "vtt")
+    ) -> Dict[int, Dict[str, str]]:
+        """Genera los subtítulos de todos los clips en una pasada y los sube en paralelo.
+
+        La transcripción se carga una vez por job y cada clip localiza sus segmentos
+        por bisección, así que el coste es O((segmentos + clips) log segmentos).
+        Devuelve {clip_index: {formato: objeto}}.
+        """
+        if transcript_index is None:
+            transcript_index = self.load_transcript_index(job_id)
+        if transcript_index is None:
+            raise Exception(f"No transcript found for job {job_id}")
+
+        uploads = []
+        for clip in clips:
+            cues = self.build_cues(transcript_index, clip["start_time"], clip["end_time"])
+            for fmt in formats:
+                content = self._create_srt_content(cues) if fmt == "srt" else self._create_vtt_content(cues)
+                uploads.append((clip["clip_index"], fmt, self.subtitle_object(job_id, clip["clip_index"], fmt), content))
+
+        objects = {}
+        client = get_minio_client()
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            futures = {
+                pool.submit(self._upload_text, client, object_name, content, SUBTITLE_FORMATS[fmt]): (clip_index, fmt, object_name)
+                for clip_index, fmt, object_name, content in uploads
+            }
+            for future, (clip_index, fmt, object_name) in futures.items():
+                try:
+                    future.result()
+                    objects.setdefault(clip_index, {})[fmt] = object_name
+                except Exception as e:
+                    LOG.error(f"Failed to upload {fmt.upper()} for clip {clip_index}: {e}")
+
+        LOG.info(f"Subtitles generated for {len(objects)} clips of job {job_id}")
+        return objects
+
+    def render_srt(self, transcript_index: TranscriptIndex, clip_start: float, clip_end: float) -> str:
+        """SRT en memoria de un intervalo, p. ej. para quemarlo en el clip"""
+        return self._create_srt_content(self.build_cues(transcript_index, clip_start, clip_end))
+
+    def subtitle_object(self, job_id: str, clip_index: int, fmt: str = "srt") -> str:
+        return f"{job_id}/clips/clip_{clip_index:02d}.{fmt}"
+
+    def load_transcript(self, job_id: str) -> Dict:
+        """Carga la transcripción completa desde MinIO"""
+        return self._get_transcript(job_id)
+
+    def load_transcript_index(self, job_id: str) -> TranscriptIndex:
+        """Índice de intervalos del job: el artefacto compacto si existe, si no desde el JSON"""
+        index = load_compact_transcript_index(get_minio_client(), self.bucket, job_id)
+        if index is not None:
+            return index
+        transcript = self._get_transcript(job_id)
+        if not transcript:
+            return None
+        return TranscriptIndex.from_transcript(transcript)
+
     def _get_transcript(self, job_id: str) -> Dict:
         """Obtiene la transcripción completa desde MinIO"""
         client = get_minio_client()
         transcript_object = f"{job_id}/transcript.json"
-        
+
         try:
             data = client.get_object(self.bucket, transcript_object)
             return json.loads(data.read().decode('utf-8'))
         except Exception as e:
             LOG.error(f"Failed to get transcript for {job_id}: {e}")
             return None
-    
+
     def _get_clips_metadata(self, job_id: str) -> Dict:
         """Obtiene metadata de clips desde MinIO"""
         client = get_minio_client()
         metadata_object = f"{job_id}/clips_metadata.json"
-        
+
         try:
             data = client.get_object(self.bucket, metadata_object)
             return json.loads(data.read().decode('utf-8'))
         except Exception as e:
             LOG.error(f"Failed to get clips metadata for {job_id}: {e}")
             return {"clips": []}
-    
-    def _filter_segments_for_clip(
-        self, 
-        segments: List[Dict], 
-        clip_start: float, 
-        clip_end: float
-    ) -> List[Dict]:
-        """Filtra segmentos de transcripción que caen dentro del tiempo del clip"""
-        
-        clip_segments = []
-        
-        for segment in segments:
-            seg_start = segment.get("start", 0)
-            seg_end = segment.get("end", seg_start + 1)
-            
-            # Verificar si el segmento se solapa con el clip
-            if seg_end >= clip_start and seg_start <= clip_end:
-                # Ajustar tiempos relativos al clip
-                adjusted_segment = segment.copy()
-                adjusted_segment["start"] = max(0, seg_start - clip_start)
-                adjusted_segment["end"] = min(clip_end - clip_start, seg_end - clip_start)
-                
-                # Solo incluir si tiene duración positiva
-                if adjusted_segment["end"] > adjusted_segment["start"]:
-                    clip_segments.append(adjusted_segment)
-        
-        return clip_segments
-    
-    def _create_srt_content(self, segments: List[Dict], clip_start_time: float) -> str:
+
+    def build_cues(self, transcript_index: TranscriptIndex, clip_start: float, clip_end: float) -> List[Dict]:
+        """Segmentos de transcripción que solapan con el clip, con tiempos relativos al clip"""
+
+        cues = []
+        for seg_start, seg_end, text in transcript_index.overlapping(clip_start, clip_end):
+            text = text.strip()
+            start = max(0, seg_start - clip_start)
+            end = min(clip_end - clip_start, seg_end - clip_start)
+
+            # Solo incluir si tiene texto y duración positiva
+            if text and end > start:
+                cues.append({"start": start, "end": end, "text": text})
+
+        return cues
+
+    def _create_srt_content(self, cues: List[Dict]) -> str:
         """Crea contenido SRT formateado"""
-        
+
         srt_lines = []
-        
-        for i, segment in enumerate(segments, 1):
-            start_time = segment["start"]
-            end_time = segment["end"]
-            text = segment.get("text", "").strip()
-            
-            if not text:
-                continue
-            
-            # Formatear tiempos en formato SRT (HH:MM:SS,mmm)
-            start_formatted = self._format_srt_time(start_time)
-            end_formatted = self._format_srt_time(end_time)
-            
-            # Agregar línea SRT
+        for i, cue in enumerate(cues, 1):
             srt_lines.extend([
                 str(i),
-                f"{start_formatted} --> {end_formatted}",
-                text,
+                f"{self._format_time(cue['start'], ',')} --> {self._format_time(cue['end'], ',')}",
+                cue["text"],
                 ""  # Línea vacía entre subtítulos
             ])
-        
+
         return "\n".join(srt_lines)
-    
-    def _format_srt_time(self, seconds: float) -> str:
-        """Formatea tiempo en formato SRT: HH:MM:SS,mmm"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        milliseconds = int((seconds % 1) * 1000)
-        
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
-    
-    def _save_srt_to_minio(self, srt_object: str, srt_content: str):
-        """Guarda contenido SRT en MinIO"""
-        client = get_minio_client()
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.srt', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(srt_content)
-            temp_file_path = temp_file.name
-        
-        try:
-            client.fput_object(self.bucket, srt_object, temp_file_path)
-            LOG.info(f"SRT saved to MinIO: {srt_object}")
-        finally:
-            os.unlink(temp_file_path)
\ No newline at end of file
+
+    def _create_vtt_content(self, cues: List[Dict]) -> str:
+        """Crea contenido WebVTT formateado"""
+
+        vtt_lines = ["WEBVTT", ""]
+        for cue in cues:
+            vtt_lines.extend([
+                f"{self._format_time(cue['start'], '.')} --> {self._format_time(cue['end'], '.')}",
+                cue["text"],
+                ""
+            ])
+
+        return "\n".join(vtt_lines)
+
+    def _format_time(self, seconds: float, ms_separator: str) -> str:
+        """Formatea tiempo como HH:MM:SS,mmm (SRT) o HH:MM:SS.mmm (WebVTT)"""
+        total_ms = int(round(seconds * 1000))
+        hours, rest = divmod(total_ms, 3600 * 1000)
+        minutes, rest = divmod(rest, 60 * 1000)
+        secs, milliseconds = divmod(rest, 1000)
+
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}{ms_separator}{milliseconds:03d}"
+
+    def _upload_text(self, client, object_name: str, content: str, content_type: str):
+        """Sube contenido de texto a MinIO directamente desde memoria"""
+        payload = content.encode("utf-8")
+        client.put_object(
+            self.bucket, object_name, io.BytesIO(payload), length=len(payload), content_type=content_type,
+            metadata=crc_metadata(zlib.crc32(payload))
+        )
+        LOG.info(f"Subtitles saved to MinIO: {object_name}")
@@ -0,0 +1,204 @@
+import io
+import struct
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from app.services.minio_client import get_minio_client
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Artefacto compacto: cabecera fija + columnas (inicio, fin, reach, offsets de texto) + texto UTF-8.
+# Sin tokens ni probabilidades de Whisper; el texto de una ventana se lee con un único GET por rango
+TRANSCRIPT_INDEX_MAGIC = b"SSTI"
+TRANSCRIPT_INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sHHQQ")  # magic, versión, reservado, segmentos, bytes de texto
+# Índices (columnas de tiempos) que se mantienen en memoria por proceso
+TRANSCRIPT_INDEX_CACHE_SIZE = 64
+DEFAULT_PAGE_SEGMENTS = 50
+MAX_PAGE_SEGMENTS = 500
+
+
+def transcript_index_object(job_id: str) -> str:
+    return f"{job_id}/transcript_index.bin"
+
+
+class TranscriptIndex:
+    """Índice de intervalos sobre los segmentos de una transcripción.
+
+    Los segmentos se ordenan por inicio y se guarda el máximo acumulado de los
+    finales (`reach`), que es monótono. Así los segmentos que solapan con
+    [start, end] quedan en un rango contiguo que se localiza por bisección:
+    O(log n + k) por consulta en lugar de recorrer toda la transcripción.
+    """
+
+    def __init__(self, segments: List[Dict]):
+        rows = []
+        for segment in segments:
+            seg_start = float(segment.get("start", 0))
+            seg_end = float(segment.get("end", seg_start + 1))
+            rows.append((seg_start, seg_end, segment.get("text", "")))
+        rows.sort(key=lambda row: row[0])
+
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.texts = [row[2] for row in rows]
+        self.reach = []
+        running_max = float("-inf")
+        for seg_end in self.ends:
+            running_max = max(running_max, seg_end)
+            self.reach.append(running_max)
+
+    @classmethod
+    def from_transcript(cls, transcript: Dict) -> "TranscriptIndex":
+        return cls(transcript.get("segments", []))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlapping(self, start: float, end: float) -> List[Tuple[float, float, str]]:
+        """Segmentos (inicio, fin, texto) con fin >= start e inicio <= end"""
+        lo = bisect_left(self.reach, start)
+        hi = bisect_right(self.starts, end)
+        return [
+            (self.starts[i], self.ends[i], self.texts[i])
+            for i in range(lo, hi)
+            if self.ends[i] >= start
+        ]
+
+    def to_bytes(self) -> bytes:
+        texts = [text.encode("utf-8") for text in self.texts]
+        offsets = np.zeros(len(texts) + 1, dtype="<u8")
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        header = _HEADER.pack(TRANSCRIPT_INDEX_MAGIC, TRANSCRIPT_INDEX_VERSION, 0, len(texts), int(offsets[-1]))
+        columns = b"".join(
+            np.asarray(column, dtype="<f8").tobytes() for column in (self.starts, self.ends, self.reach)
+        )
+        return header + columns + offsets.tobytes() + b"".join(texts)
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "TranscriptIndex":
+        columns = _parse_columns(payload)
+        text = payload[_text_offset(len(columns[0])):]
+        index = cls([])
+        index.starts, index.ends, index.reach = (column.tolist() for column in columns[:3])
+        offsets = columns[3].tolist()
+        index.texts = [text[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+        return index
+
+
+def _columns_size(count: int) -> int:
+    return 3 * 8 * count + 8 * (count + 1)
+
+
+def _text_offset(count: int) -> int:
+    return _HEADER.size + _columns_size(count)
+
+
+def _parse_header(payload: bytes) -> int:
+    magic, version, _, count, _ = _HEADER.unpack_from(payload)
+    if magic != TRANSCRIPT_INDEX_MAGIC or version != TRANSCRIPT_INDEX_VERSION:
+        raise ValueError("Not a transcript index (or unsupported version)")
+    return count
+
+
+def _parse_columns(payload: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(starts, ends, reach, offsets) desde la cabecera y las columnas (sin el texto)"""
+    count = _parse_header(payload)
+    base = _HEADER.size
+    starts, ends, reach = (
+        np.frombuffer(payload, dtype="<f8", count=count, offset=base + 8 * count * i) for i in range(3)
+    )
+    offsets = np.frombuffer(payload, dtype="<u8", count=count + 1, offset=base + 24 * count)
+    return starts, ends, reach, offsets
+
+
+def save_transcript_index(client, bucket: str, job_id: str, transcription: Dict) -> str:
+    object_name = transcript_index_object(job_id)
+    payload = TranscriptIndex.from_transcript(transcription).to_bytes()
+    client.put_object(bucket, object_name, io.BytesIO(payload), length=len(payload), content_type="application/octet-stream")
+    LOG.info(f"Transcript index saved to MinIO: {object_name} ({len(payload)} bytes)")
+    return object_name
+
+
+def _read_range(client, bucket: str, object_name: str, offset: int, length: int) -> bytes:
+    if length <= 0:
+        return b""
+    data = client.get_object(bucket, object_name, offset=offset, length=length)
+    try:
+        return data.read()
+    finally:
+        data.close()
+        data.release_conn()
+
+
+@lru_cache(maxsize=TRANSCRIPT_INDEX_CACHE_SIZE)
+def _cached_columns(bucket: str, object_name: str, etag: str):
+    """Columnas de tiempos de un índice; el etag en la clave invalida versiones anteriores"""
+    client = get_minio_client()
+    count = _parse_header(_read_range(client, bucket, object_name, 0, _HEADER.size))
+    payload = _read_range(client, bucket, object_name, 0, _text_offset(count))
+    return tuple(column.tolist() for column in _parse_columns(payload))
+
+
+def query_transcript(
+    job_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    cursor: int = 0,
+    limit: int = DEFAULT_PAGE_SEGMENTS,
+    bucket: str = "vods"
+) -> Dict:
+    """Segmentos que solapan con [start, end], paginados por índice de segmento.
+
+    La ventana se localiza por bisección sobre las columnas cacheadas y el texto de
+    la página se lee con un GET por rango, así que el coste no depende de la
+    duración del VOD. `next_cursor` es None en la última página.
+    """
+    client = get_minio_client()
+    object_name = transcript_index_object(job_id)
+    etag = client.stat_object(bucket, object_name).etag
+    starts, ends, reach, offsets = _cached_columns(bucket, object_name, etag)
+    count = len(starts)
+
+    lo = 0 if start is None else bisect_left(reach, start)
+    hi = count if end is None else bisect_right(starts, end)
+    first = max(lo, cursor)
+    last = min(hi, first + max(1, min(limit, MAX_PAGE_SEGMENTS)))
+
+    segments = []
+    if first < last:
+        base = _text_offset(count)
+        text = _read_range(client, bucket, object_name, base + offsets[first], offsets[last] - offsets[first])
+        for i in range(first, last):
+            if start is not None and ends[i] < start:
+                continue
+            segments.append({
+                "index": i,
+                "start": starts[i],
+                "end": ends[i],
+                "text": text[offsets[i] - offsets[first]:offsets[i + 1] - offsets[first]].decode("utf-8"),
+            })
+
+    return {
+        "job_id": job_id,
+        "start": start,
+        "end": end,
+        "total_segments": count,
+        "segments": segments,
+        "next_cursor": last if last < hi else None,
+    }
+
+
+def load_transcript_index(client, bucket: str, job_id: str) -> Optional[TranscriptIndex]:
+    """Índice completo desde el artefacto compacto (None si el job es anterior a él)"""
+    try:
+        data = client.get_object(bucket, transcript_index_object(job_id))
+    except Exception:
+        return None
+    try:
+        return TranscriptIndex.from_bytes(data.read())
+    finally:
+        data.close()
+        data.release_conn()
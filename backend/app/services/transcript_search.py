@@ -0,0 +1,162 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.services.transcript_index import TranscriptIndex
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Índice de búsqueda compartido por la API y el worker que indexa (volumen en docker-compose)
+SEARCH_DB_PATH = Path(os.environ.get("SEARCH_DB_PATH", "/tmp/streamsculptor/search/transcripts.db"))
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Ventana de clip sugerida alrededor de un acierto
+CLIP_LEAD_SECONDS = 8.0
+CLIP_MIN_SECONDS = 30.0
+CLIP_TAIL_SECONDS = 4.0
+
+# segments guarda los datos; segments_fts es un índice FTS5 de contenido externo sobre él,
+# mantenido por triggers. Borrar un job es un DELETE por índice sobre segments.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    language TEXT,
+    segments INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_job ON segments(job_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+@contextmanager
+def _connect(db_path: Path = None):
+    db_path = db_path or SEARCH_DB_PATH
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # WAL: las búsquedas de la API no se bloquean mientras un worker indexa
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+def index_transcript(job_id: str, index: TranscriptIndex, language: Optional[str] = None, db_path: Path = None) -> int:
+    """(Re)indexa los segmentos de un job en una transacción; devuelve cuántos se indexaron"""
+    rows = [
+        (job_id, start, end, text.strip())
+        for start, end, text in zip(index.starts, index.ends, index.texts)
+        if text.strip()
+    ]
+    with _connect(db_path) as conn:
+        with conn:
+            conn.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+            conn.executemany("INSERT INTO segments(job_id, start, end, text) VALUES (?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs(job_id, language, segments, duration, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, language, len(rows), max(index.ends, default=0.0), time.time())
+            )
+    LOG.info(f"Indexed {len(rows)} transcript segments for job {job_id}")
+    return len(rows)
+
+
+def remove_job(job_id: str, db_path: Path = None):
+    with _connect(db_path) as conn:
+        with conn:
+            conn.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+
+def fts_query(q: str) -> str:
+    """Consulta del usuario → sintaxis FTS5 segura.
+
+    Las frases entre comillas se buscan literalmente y el resto de palabras deben
+    aparecer todas (AND); un * final en una palabra busca por prefijo.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', q):
+        if phrase:
+            terms.append('"' + phrase.replace('"', '""') + '"')
+            continue
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def suggested_clip_window(start: float, end: float, duration: Optional[float] = None) -> Dict[str, float]:
+    clip_start = max(0.0, start - CLIP_LEAD_SECONDS)
+    clip_end = max(end + CLIP_TAIL_SECONDS, clip_start + CLIP_MIN_SECONDS)
+    if duration:
+        clip_end = min(clip_end, duration)
+    return {"start": clip_start, "end": clip_end}
+
+
+def search(
+    q: str,
+    job_id: Optional[str] = None,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    offset: int = 0,
+    db_path: Path = None
+) -> Dict:
+    """Segmentos que casan con `q` ordenados por relevancia (bm25), con ventana de clip sugerida"""
+    query = fts_query(q)
+    if not query:
+        return {"query": q, "hits": [], "next_offset": None}
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    sql = """
+        SELECT s.job_id, s.start, s.end, s.text,
+               snippet(segments_fts, 0, '[', ']', '…', 16), bm25(segments_fts), j.duration
+        FROM segments_fts
+        JOIN segments s ON s.id = segments_fts.rowid
+        LEFT JOIN jobs j ON j.job_id = s.job_id
+        WHERE segments_fts MATCH ?
+    """
+    params: List = [query]
+    if job_id:
+        sql += " AND s.job_id = ?"
+        params.append(job_id)
+    # Una fila de más para saber si hay otra página
+    sql += " ORDER BY bm25(segments_fts) LIMIT ? OFFSET ?"
+    params += [limit + 1, offset]
+
+    with _connect(db_path) as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    hits = [
+        {
+            "job_id": hit_job,
+            "start": start,
+            "end": end,
+            "text": text,
+            "snippet": snippet,
+            "score": -rank,
+            "clip_window": suggested_clip_window(start, end, duration),
+        }
+        for hit_job, start, end, text, snippet, rank, duration in rows[:limit]
+    ]
+    return {"query": q, "hits": hits, "next_offset": offset + limit if len(rows) > limit else None}
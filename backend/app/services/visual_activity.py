@@ -0,0 +1,121 @@
+import io
+import numpy as np
+from typing import IO, List, Optional
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Vídeo reducido que se decodifica para medir actividad: barato y suficiente para cortes/movimiento
+VISUAL_FPS = 2
+VISUAL_WIDTH = 64
+VISUAL_HEIGHT = 36
+# Diferencia (0-255) a partir de la que un píxel cuenta como cambiado
+PIXEL_CHANGE_THRESHOLD = 25
+# Frames leídos del pipe por bloque
+READ_BLOCK_FRAMES = VISUAL_FPS * 60
+
+# Peso de la actividad visual en composite_score. La serie entra como percentil dentro
+# del VOD (ver activity_percentiles), así que el término va de 0 a VISUAL_WEIGHT. Los
+# términos de audio ponderados suelen moverse entre ~0.03 y ~0.14: con 0.03 el segundo
+# más movido del VOD suma como un tercio de ese rango, lo justo para desempatar momentos
+# de audio parecido sin que un corte de escena supere a un grito claro
+VISUAL_WEIGHT = 0.03
+# Percentil visual medio a partir del que un momento silencioso no se descarta
+VISUAL_ACTIVITY_THRESHOLD = 0.9
+
+
+def visual_activity_object(job_id: str) -> str:
+    return f"{job_id}/visual_activity.npy"
+
+
+def ffmpeg_visual_output_args() -> List[str]:
+    """Salida extra de ffmpeg: luminancia reducida en raw por stdout.
+
+    Se añade al mismo comando que extrae el audio, así que el VOD se decodifica una vez.
+    El mapeo es opcional para que un vídeo sin pista de imagen no haga fallar la extracción.
+    """
+    return [
+        "-map", "0:v:0?",
+        "-vf", f"fps={VISUAL_FPS},scale={VISUAL_WIDTH}:{VISUAL_HEIGHT}:flags=area,format=gray",
+        "-f", "rawvideo", "pipe:1",
+    ]
+
+
+def read_visual_activity(stream: IO[bytes]) -> np.ndarray:
+    """Consume el pipe de frames y devuelve la actividad por segundo en [0, 1].
+
+    Por frame: media de la diferencia absoluta con el anterior (movimiento) y fracción
+    de píxeles cambiados (cortes de escena); se promedian y cada segundo se queda con
+    el máximo de sus frames para no diluir los cortes.
+    """
+    frame_bytes = VISUAL_WIDTH * VISUAL_HEIGHT
+    previous = None
+    activity = []
+    while True:
+        chunk = stream.read(frame_bytes * READ_BLOCK_FRAMES)
+        if not chunk:
+            break
+        usable = len(chunk) // frame_bytes * frame_bytes
+        frames = np.frombuffer(chunk[:usable], dtype=np.uint8).reshape(-1, frame_bytes).astype(np.int16)
+        if previous is not None:
+            frames = np.vstack([previous, frames])
+        elif len(frames):
+            activity.append(np.zeros(1, dtype=np.float32))
+        if len(frames) > 1:
+            diff = np.abs(np.diff(frames, axis=0))
+            motion = diff.mean(axis=1) / 255.0
+            changed = (diff > PIXEL_CHANGE_THRESHOLD).mean(axis=1)
+            activity.append(((motion + changed) / 2).astype(np.float32))
+        previous = frames[-1:] if len(frames) else previous
+
+    per_frame = np.concatenate(activity) if activity else np.zeros(0, dtype=np.float32)
+    seconds = int(np.ceil(len(per_frame) / VISUAL_FPS))
+    padded = np.zeros(seconds * VISUAL_FPS, dtype=np.float32)
+    padded[:len(per_frame)] = per_frame
+    return padded.reshape(seconds, VISUAL_FPS).max(axis=1) if seconds else padded
+
+
+def save_visual_activity(client, bucket: str, job_id: str, series: np.ndarray) -> str:
+    buffer = io.BytesIO()
+    np.save(buffer, series.astype(np.float32))
+    payload = buffer.getvalue()
+    object_name = visual_activity_object(job_id)
+    client.put_object(bucket, object_name, io.BytesIO(payload), length=len(payload), content_type="application/octet-stream")
+    return object_name
+
+
+def load_visual_activity(client, bucket: str, job_id: str) -> Optional[np.ndarray]:
+    """Serie de actividad visual del job, o None si no existe (jobs antiguos o sin vídeo)"""
+    try:
+        data = client.get_object(bucket, visual_activity_object(job_id))
+    except Exception:
+        return None
+    try:
+        return np.load(io.BytesIO(data.read()))
+    finally:
+        data.close()
+        data.release_conn()
+
+
+def interval_activity(series: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Actividad media de cada intervalo [start, end) en segundos, con sumas prefijo"""
+    if series is None or len(series) == 0:
+        return np.zeros(len(starts), dtype=np.float32)
+    prefix = np.concatenate(([0.0], np.cumsum(series, dtype=np.float64)))
+    first = np.clip(np.floor(starts).astype(np.int64), 0, len(series))
+    last = np.clip(np.ceil(ends).astype(np.int64), 0, len(series))
+    lengths = np.maximum(last - first, 1)
+    return ((prefix[last] - prefix[first]) / lengths).astype(np.float32)
+
+
+def activity_percentiles(series: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Sustituye cada segundo por su percentil dentro del VOD, en [0, 1).
+
+    La actividad bruta depende del contenido (un juego frenético nunca baja de 0.3,
+    una webcam fija casi nunca sube), así que se compara con el propio VOD. Una serie
+    constante queda a 0 y aplicarlo dos veces no cambia el resultado.
+    """
+    if series is None or len(series) == 0:
+        return series
+    ordered = np.sort(series)
+    return (np.searchsorted(ordered, series, side="left") / len(series)).astype(np.float32)
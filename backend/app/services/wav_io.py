@@ -0,0 +1,117 @@
+import io
+import struct
+import wave
+import numpy as np
+from dataclasses import dataclass
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Cabecera RIFF + chunks fmt/LIST: 64 KB cubre cualquier WAV que genera ffmpeg
+WAV_HEADER_PROBE_BYTES = 64 * 1024
+
+
+@dataclass
+class WavInfo:
+    sample_rate: int
+    channels: int
+    sample_width: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def frame_size(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def num_frames(self) -> int:
+        return self.data_size // self.frame_size
+
+    @property
+    def duration(self) -> float:
+        return self.num_frames / self.sample_rate
+
+
+def parse_wav_header(header: bytes, total_size: int | None = None) -> WavInfo:
+    """Localiza los chunks fmt y data de un WAV PCM a partir de sus primeros bytes"""
+    if header[:4] not in (b"RIFF", b"RF64") or header[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(header):
+        chunk_id, chunk_size = struct.unpack("<4sI", header[pos:pos + 8])
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack("<HHI", header[body:body + 8])
+            bits_per_sample = struct.unpack("<H", header[body + 14:body + 16])[0]
+            # 0xFFFE = WAVE_FORMAT_EXTENSIBLE, que ffmpeg usa para más de 2 canales
+            if audio_format not in (1, 0xFFFE) or bits_per_sample != 16:
+                raise ValueError(f"Unsupported WAV encoding: format={audio_format} bits={bits_per_sample}")
+            fmt = (sample_rate, channels, bits_per_sample // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk found before fmt chunk")
+            data_size = chunk_size
+            # ffmpeg deja 0xFFFFFFFF (o un tamaño truncado) en audios de más de 4 GB
+            if total_size is not None and (data_size == 0xFFFFFFFF or body + data_size > total_size):
+                data_size = total_size - body
+            sample_rate, channels, sample_width = fmt
+            return WavInfo(sample_rate, channels, sample_width, body, data_size)
+        pos = body + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV data chunk not found in header")
+
+
+def read_wav_info_from_minio(client, bucket: str, object_name: str) -> WavInfo:
+    """Lee solo la cabecera del WAV almacenado en MinIO"""
+    total_size = client.stat_object(bucket, object_name).size
+    data = client.get_object(bucket, object_name, offset=0, length=min(WAV_HEADER_PROBE_BYTES, total_size))
+    try:
+        return parse_wav_header(data.read(), total_size)
+    finally:
+        data.close()
+        data.release_conn()
+
+
+def read_wav_frames_from_minio(
+    client, bucket: str, object_name: str, info: WavInfo, start_frame: int, end_frame: int
+) -> bytes:
+    """Descarga con una petición por rango los frames PCM [start_frame, end_frame)"""
+    start_frame = max(0, start_frame)
+    end_frame = min(info.num_frames, end_frame)
+    if end_frame <= start_frame:
+        return b""
+    data = client.get_object(
+        bucket,
+        object_name,
+        offset=info.data_offset + start_frame * info.frame_size,
+        length=(end_frame - start_frame) * info.frame_size,
+    )
+    try:
+        return data.read()
+    finally:
+        data.close()
+        data.release_conn()
+
+
+def pcm16_to_mono_float(pcm: bytes, channels: int) -> np.ndarray:
+    """Convierte PCM int16 intercalado a float32 mono en [-1, 1), igual que librosa.load(mono=True)"""
+    return int16_to_mono_float(np.frombuffer(pcm, dtype="<i2").reshape(-1, channels))
+
+
+def int16_to_mono_float(frames: np.ndarray) -> np.ndarray:
+    """Frames int16 (n, canales) o (n,) a float32 mono; acepta vistas de un memmap sin copiarlas antes"""
+    if frames.ndim == 1 or frames.shape[1] == 1:
+        return frames.reshape(-1).astype(np.float32) / np.float32(32768.0)
+    return frames.mean(axis=1, dtype=np.float32) / np.float32(32768.0)
+
+
+def pcm16_to_wav_bytes(pcm: bytes, info: WavInfo) -> bytes:
+    """Empaqueta PCM crudo en un WAV con el mismo formato que el original"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(info.channels)
+        wav.setsampwidth(info.sample_width)
+        wav.setframerate(info.sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
@@ -12,8 +12,12 @@ def transcribe_audio(file_path: str):
     response.raise_for_status()
     return response.json()
 
-def transcribe_audio_from_minio(bucket: str, object_name: str):
-    """Transcribe audio directamente desde MinIO sin descarga local."""
+def transcribe_audio_from_minio(bucket: str, object_name: str, job_id: str | None = None):
+    """Transcribe audio directamente desde MinIO sin descarga local.
+
+    Si se indica `job_id`, el servicio Whisper publica el porcentaje de avance
+    en el canal de progreso del job.
+    """
     try:
         LOG.info(f"Requesting transcription for {bucket}/{object_name}")
         
@@ -21,6 +25,8 @@ def transcribe_audio_from_minio(bucket: str, object_name: str):
             "bucket": bucket,
             "object_name": object_name
         }
+        if job_id:
+            payload["progress_job_id"] = job_id
         
         response = requests.post(
             f"{WHISPER_URL}/transcribe-from-minio", 
@@ -1,159 +1,376 @@
 from app.celery_app import celery
-from app.services.audio_analyzer import AudioAnalyzer
+from app.services.audio_analyzer import AudioAnalyzer, DEFAULT_REFINE_STEP
 from app.services.clip_generator import ClipGenerator
 from app.services.srt_generator import SRTGenerator
 from app.services.minio_client import get_minio_client
-from app.utils.sanitize_for_json import sanitize_for_json
+from app.services.progress import ProgressReporter
+from app.services.redis_client import get_redis_client
+from app.services.segment_selection import DEFAULT_MAX_OVERLAP, DEFAULT_MIN_GAP
+from app.services.visual_activity import load_visual_activity, VISUAL_ACTIVITY_THRESHOLD
+from app.services.segment_table import SegmentTable
+from app.services.analysis_store import save_analysis_result, load_analysis_result
+from app.services.source_media import ensure_video_sections
+from app.tasks.signatures import ANALYZE_AUDIO_SEGMENTS, GENERATE_CLIPS, GENERATE_WINDOW_CLIP
 import logging
-import json
-import tempfile
 import time
 
 LOG = logging.getLogger(__name__)
 
-@celery.task(bind=True)
+# Número de segmentos candidatos que se guardan en el análisis
+ANALYSIS_TOP_N = 20
+# Clips añadidos sueltos (búsqueda, directo): lock del metadata y vida del contador de índices
+CLIPS_LOCK_SECONDS = 60
+CLIP_INDEX_TTL_SECONDS = 7 * 24 * 3600
+# Origen de los clips del análisis; los añadidos sueltos llevan "search" o "live"
+ANALYSIS_ORIGIN = "analysis"
+
+# "fixed": ventanas de window_size sobre una rejilla de step_size
+# "variable": highlights de min_duration a max_duration con bordes a resolución de frame
+# "coarse_to_fine": ventanas de window_size buscadas en grueso y refinadas con paso refine_step
+ANALYSIS_MODES = ("fixed", "variable", "coarse_to_fine")
+
+def candidate_mask(segments: SegmentTable, energy_threshold: float):
+    """Supera el umbral de energía o, aunque sea silencioso, tiene mucha actividad visual"""
+    rows = segments.rows
+    return (rows["rms_score"] >= energy_threshold) | (rows["visual_score"] >= VISUAL_ACTIVITY_THRESHOLD)
+
+@celery.task(name=ANALYZE_AUDIO_SEGMENTS, bind=True)
 def analyze_audio_segments(
     self, 
     job_id: str, 
     window_size: float = 30.0, 
     step_size: float = 10.0,
-    energy_threshold: float = 0.01
+    energy_threshold: float = 0.01,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP,
+    mode: str = "fixed",
+    min_duration: float = 15.0,
+    max_duration: float = 60.0,
+    refine_step: float = DEFAULT_REFINE_STEP,
+    workers: int | None = None
 ):
-    """Analiza audio y encuentra segmentos con alta energía"""
+    """Analiza audio y encuentra segmentos con alta energía.
+
+    max_overlap / min_gap controlan la supresión de ventanas solapadas entre los candidatos.
+    En modo "variable" la duración de cada segmento se ajusta al contenido (ver ANALYSIS_MODES).
+    workers: procesos para extraer features (None = ANALYSIS_WORKERS).
+    """
     try:
         start_time = time.time()
         
         LOG.info(f"Starting audio analysis for job {job_id}")
+        report = ProgressReporter(job_id)
         
-        # Inicializar analizador
-        analyzer = AudioAnalyzer(window_size=window_size, step_size=step_size)
+        # Inicializar analizador (con la actividad visual del job si la descarga la calculó)
+        bucket = "vods"
+        visual_activity = load_visual_activity(get_minio_client(), bucket, job_id)
+        analyzer = AudioAnalyzer(
+            window_size=window_size, step_size=step_size, visual_activity=visual_activity, workers=workers
+        )
         
         # Analizar audio desde MinIO
-        bucket = "vods"
         audio_object = f"{job_id}/audio.wav"
-        segments = analyzer.analyze_audio_from_minio(bucket, audio_object)
-        
-        # Filtrar por umbral de energía
-        filtered_segments = [s for s in segments if s.rms_score >= energy_threshold]
+        progress_callback = lambda done, total: report(
+            "analyzing", force=done == total, windows_done=done, windows_total=total
+        )
         
-        # Rankear por energía
-        top_segments = analyzer.rank_segments_by_energy(filtered_segments, top_n=20)
+        if mode == "variable":
+            features = analyzer.analyze_frames_from_minio(bucket, audio_object, progress_callback=progress_callback)
+            segments = analyzer.segments_from_frame_features(
+                features, min_duration, max_duration, top_n=ANALYSIS_TOP_N
+            )
+            # Los intervalos ya salen sin solape y ordenados por score acumulado
+            filtered_segments = segments.filter(candidate_mask(segments, energy_threshold))
+            top_segments = filtered_segments
+            total_segments = len(features)
+            search_stats = None
+        elif mode == "coarse_to_fine":
+            segments, search_stats = analyzer.analyze_coarse_to_fine_from_minio(
+                bucket, audio_object, top_n=ANALYSIS_TOP_N, refine_step=refine_step,
+                max_overlap=max_overlap, min_gap=min_gap, progress_callback=progress_callback
+            )
+            filtered_segments = segments.filter(candidate_mask(segments, energy_threshold))
+            top_segments = filtered_segments
+            total_segments = search_stats["coarse_frames"]
+        else:
+            segments = analyzer.analyze_audio_from_minio(bucket, audio_object, progress_callback=progress_callback)
+            analyzer.attach_visual_scores(segments)
+            
+            # Filtrar por umbral de energía (o actividad visual)
+            filtered_segments = segments.filter(candidate_mask(segments, energy_threshold))
+            
+            # Rankear por energía
+            top_segments = analyzer.rank_segments_by_energy(
+                filtered_segments, top_n=ANALYSIS_TOP_N, max_overlap=max_overlap, min_gap=min_gap
+            )
+            total_segments = len(segments)
+            search_stats = None
         
         # Guardar análisis en MinIO
         analysis_result = {
             "job_id": job_id,
-            "total_segments": len(segments),
+            "total_segments": total_segments,
             "filtered_segments": len(filtered_segments),
             "top_segments": len(top_segments),
-            "segments": [
-                {
-                    "start_time": s.start_time,
-                    "end_time": s.end_time,
-                    "duration": s.duration,
-                    "rms_score": s.rms_score,
-                    "peak_amplitude": s.peak_amplitude,
-                    "spectral_centroid": s.spectral_centroid,
-                    "zero_crossing_rate": s.zero_crossing_rate,
-                    "composite_score": getattr(s, 'composite_score', 0.0)
-                }
-                for s in top_segments
-            ],
             "analysis_duration": time.time() - start_time,
             "parameters": {
+                "mode": mode,
                 "window_size": window_size,
                 "step_size": step_size,
-                "energy_threshold": energy_threshold
+                "energy_threshold": energy_threshold,
+                "max_overlap": max_overlap,
+                "min_gap": min_gap,
+                "min_duration": min_duration,
+                "max_duration": max_duration,
+                "refine_step": refine_step,
+                "visual_activity": visual_activity is not None
             }
         }
+        if search_stats:
+            analysis_result["search"] = search_stats
         
-        # Guardar en MinIO
-        client = get_minio_client()
-        analysis_object = f"{job_id}/audio_analysis.json"
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
-            json.dump(analysis_result, temp_file, indent=2, default=str)
-            temp_file_path = temp_file.name
-        
-        try:
-            client.fput_object(bucket, analysis_object, temp_file_path)
-        finally:
-            import os
-            os.unlink(temp_file_path)
+        # Guardar en MinIO (los segmentos no viajan en el resultado de la tarea)
+        save_analysis_result(job_id, analysis_result, top_segments, bucket)
         
         LOG.info(f"Audio analysis completed for {job_id}: {len(top_segments)} segments")
-        return  sanitize_for_json(analysis_result)
+        return analysis_result
         
     except Exception as e:
         LOG.exception(f"Audio analysis failed for job {job_id}: {e}")
         raise
 
+def attach_subtitles(srt_generator: SRTGenerator, job_id: str, clip: dict, transcript_index) -> dict:
+    """Sube SRT/VTT del clip y anota sus objetos en la metadata del clip"""
+    if transcript_index is None:
+        return clip
+    subtitles = srt_generator.generate_subtitles_for_clips(job_id, [clip], transcript_index)
+    formats = subtitles.get(clip["clip_index"], {})
+    if "srt" in formats:
+        clip["has_srt"] = True
+        clip["srt_object"] = formats["srt"]
+    if "vtt" in formats:
+        clip["vtt_object"] = formats["vtt"]
+    return clip
+
 @celery.task(bind=True)
-def generate_clips_task(self, job_id: str, max_clips: int = 10):
-    """Genera clips de video basados en el análisis de audio"""
+def fetch_clip_sections(self, job_id: str, max_clips: int = 10):
+    """Descarga (cola io) solo las secciones de vídeo de los clips que se van a renderizar.
+
+    Para jobs audio_first: el render las encontraría igualmente, pero así la
+    descarga no ocupa un slot de encoding.
+    """
+    bucket = "vods"
+    _, analysis_segments = load_analysis_result(job_id, bucket)
+    top = analysis_segments.sorted_by("composite_score")[:max_clips]
+    ranges = list(zip(top.column("start_time").tolist(), top.column("end_time").tolist()))
+    sections = ensure_video_sections(get_minio_client(), bucket, job_id, ranges)
+    total_bytes = sum(section.get("size_bytes", 0) for section in sections)
+    LOG.info(f"Video sections ready for {job_id}: {len(sections)} sections, {total_bytes / (1024 * 1024):.1f}MB")
+    return {"job_id": job_id, "sections": len(sections), "sections_size_mb": total_bytes / (1024 * 1024)}
+
+@celery.task(name=GENERATE_CLIPS, bind=True)
+def generate_clips_task(self, job_id: str, max_clips: int = 10, caption_mode: str = "none"):
+    """Genera clips de video basados en el análisis de audio.
+
+    caption_mode: "none", "burned" (subtítulos quemados) o "both" (limpio + quemado
+    desde una única decodificación).
+    """
     try:
         start_time = time.time()
         
         LOG.info(f"Starting clip generation for job {job_id}")
         
         # Obtener análisis de audio
-        client = get_minio_client()
         bucket = "vods"
-        analysis_object = f"{job_id}/audio_analysis.json"
         
         try:
-            data = client.get_object(bucket, analysis_object)
-            analysis_result = json.loads(data.read().decode('utf-8'))
+            _, analysis_segments = load_analysis_result(job_id, bucket)
         except Exception as e:
             raise Exception(f"Audio analysis not found for job {job_id}. Run analysis first.")
         
-        # Convertir datos a objetos AudioSegment
-        from app.services.audio_analyzer import AudioSegment
-        segments = []
-        for seg_data in analysis_result["segments"][:max_clips]:
-            segment = AudioSegment(
-                start_time=seg_data["start_time"],
-                end_time=seg_data["end_time"],
-                duration=seg_data["duration"],
-                rms_score=seg_data["rms_score"],
-                peak_amplitude=seg_data["peak_amplitude"],
-                spectral_centroid=seg_data["spectral_centroid"],
-                zero_crossing_rate=seg_data["zero_crossing_rate"]
-            )
-            segment.composite_score = seg_data["composite_score"]
-            segments.append(segment)
+        # Renderizar en orden de score para que el mejor clip esté disponible primero
+        segments = list(analysis_segments.sorted_by("composite_score")[:max_clips])
         
-        # Generar clips
-        clip_generator = ClipGenerator()
-        clips_metadata = clip_generator.generate_clips_from_segments(job_id, segments, max_clips)
+        # Cada clip (MP4 + SRT) se publica en la metadata en cuanto está listo
+        report = ProgressReporter(job_id)
+        clip_generator = ClipGenerator(caption_mode=caption_mode)
+        srt_generator = SRTGenerator()
+        transcript_index = srt_generator.load_transcript_index(job_id)
+        published_clips = []
+        # Un re-render reutiliza los índices del análisis anterior; solo se reservan los que falten,
+        # sin pisar los de clips sueltos ni sus subtítulos (clip_NN.srt)
+        existing = clip_generator.load_clips_metadata(job_id) or {}
+        previous_clips = [clip for clip in existing.get("clips", []) if _is_analysis_clip(clip)]
+        clip_indices = _analysis_clip_indices(job_id, existing, previous_clips, len(segments))
+        _save_analysis_clips(clip_generator, job_id, [], "in_progress", len(segments))
         
-        # Guardar metadata de clips
-        clip_generator.save_clips_metadata(job_id, clips_metadata)
+        def publish_clip(clip):
+            clip["origin"] = ANALYSIS_ORIGIN
+            attach_subtitles(srt_generator, job_id, clip, transcript_index)
+            published_clips.append(clip)
+            _save_analysis_clips(clip_generator, job_id, published_clips, "in_progress", len(segments))
+            report("clip_ready", force=True, key=f"clip:{clip['clip_index']}", clips_total=len(segments), clip=clip)
         
-        # Generar subtítulos SRT
-        srt_generator = SRTGenerator()
-        srt_files = srt_generator.generate_srt_for_all_clips(job_id)
+        try:
+            clips_metadata = clip_generator.generate_clips_from_segments(
+                job_id,
+                segments,
+                max_clips,
+                on_clip_ready=publish_clip,
+                clip_indices=clip_indices,
+                # El SRT se genera antes del render para quemarlo en la misma pasada
+                subtitles_for_segment=(
+                    (lambda seg: srt_generator.render_srt(transcript_index, seg.start_time, seg.end_time))
+                    if transcript_index is not None else None
+                )
+            )
+        except Exception:
+            # Los clips ya publicados siguen siendo válidos; se marca el conjunto como cerrado
+            _save_analysis_clips(clip_generator, job_id, published_clips, "failed", len(segments))
+            raise
         
-        # Actualizar metadata con info SRT
-        for clip in clips_metadata:
-            clip_idx = clip["clip_index"]
-            if clip_idx in srt_files:
-                clip["has_srt"] = True
-                clip["srt_object"] = srt_files[clip_idx]
+        metadata_object = _save_analysis_clips(clip_generator, job_id, clips_metadata, "completed", len(clips_metadata))
+        _remove_replaced_clip_objects(clip_generator, job_id, previous_clips)
         
-        # Resultado final
+        # Resultado final: los clips se consultan en clips_metadata.json, no en el backend de Celery
         result = {
             "job_id": job_id,
             "clips_generated": len(clips_metadata),
-            "clips": clips_metadata,
-            "srt_files": srt_files,
+            "metadata_object": metadata_object,
             "total_size_mb": sum(clip["file_size_mb"] for clip in clips_metadata),
+            "renders_saved": sum(clip.get("renders_saved", 0) for clip in clips_metadata),
             "generation_time": time.time() - start_time
         }
         
         LOG.info(f"Clip generation completed for {job_id}: {len(clips_metadata)} clips")
-        return sanitize_for_json(result)
+        return result
         
     except Exception as e:
         LOG.exception(f"Clip generation failed for job {job_id}: {e}")
         raise
 
+
+def _clips_lock(job_id: str):
+    """Lock del clips_metadata.json de un job: varios renders sueltos pueden añadir clips a la vez"""
+    return get_redis_client().lock(f"clips_metadata:{job_id}:lock", timeout=CLIPS_LOCK_SECONDS, blocking_timeout=CLIPS_LOCK_SECONDS)
+
+def _reserve_clip_index(job_id: str, existing: dict, count: int = 1) -> int:
+    """Primer índice de `count` índices libres consecutivos, reservados en Redis para
+    que dos renders concurrentes no los compartan"""
+    redis_client = get_redis_client()
+    key = f"clips_metadata:{job_id}:next_index"
+    with _clips_lock(job_id):
+        clip_index = max(
+            max((clip["clip_index"] for clip in existing.get("clips", [])), default=-1) + 1,
+            int(redis_client.get(key) or 0)
+        )
+        redis_client.set(key, clip_index + count, ex=CLIP_INDEX_TTL_SECONDS)
+    return clip_index
+
+def _is_analysis_clip(clip: dict) -> bool:
+    return clip.get("origin", ANALYSIS_ORIGIN) == ANALYSIS_ORIGIN
+
+def _analysis_clip_indices(job_id: str, existing: dict, previous_clips: list, count: int) -> list:
+    """Índices para `count` clips del análisis: primero los del render anterior, luego nuevos reservados"""
+    indices = sorted(clip["clip_index"] for clip in previous_clips)[:count]
+    missing = count - len(indices)
+    if missing:
+        first_index = _reserve_clip_index(job_id, existing, missing)
+        indices += range(first_index, first_index + missing)
+    return indices
+
+def _clip_objects(clip: dict) -> set:
+    """Objetos de MinIO que referencia un clip: renders, subtítulos y previews"""
+    objects = {clip.get(key) for key in ("object_name", "captioned_object", "srt_object", "vtt_object")}
+    objects.update((clip.get("assets") or {}).values())
+    objects.discard(None)
+    return objects
+
+def _remove_replaced_clip_objects(clip_generator: ClipGenerator, job_id: str, previous_clips: list):
+    """Borra los objetos de los clips de un análisis anterior que ya no referencia ningún clip.
+
+    Los renders se comparten por clave de contenido y los subtítulos por índice, así
+    que solo se borra lo que no aparece en la metadata vigente.
+    """
+    with _clips_lock(job_id):
+        current = clip_generator.load_clips_metadata(job_id) or {}
+        referenced = set().union(*(_clip_objects(clip) for clip in current.get("clips", [])))
+    stale = set().union(*(_clip_objects(clip) for clip in previous_clips)) - referenced
+    if not stale:
+        return
+    client = get_minio_client()
+    for object_name in sorted(stale):
+        try:
+            client.remove_object(clip_generator.bucket, object_name)
+        except Exception as e:
+            LOG.warning(f"Could not remove replaced clip object {object_name}: {e}")
+    LOG.info(f"Removed {len(stale)} objects of replaced analysis clips for {job_id}")
+
+def _save_analysis_clips(clip_generator: ClipGenerator, job_id: str, clips: list, status: str, clips_expected: int) -> str:
+    """Reescribe los clips de generate_clips_task en clips_metadata.json.
+
+    Se relee bajo el lock y se conservan los clips añadidos sueltos (búsqueda,
+    directo); los de un render anterior del análisis se sustituyen.
+    """
+    with _clips_lock(job_id):
+        existing = clip_generator.load_clips_metadata(job_id) or {}
+        kept = [clip for clip in existing.get("clips", []) if not _is_analysis_clip(clip)]
+        return clip_generator.save_clips_metadata(
+            job_id, sorted(kept + clips, key=lambda c: c["clip_index"]),
+            status=status, clips_expected=len(kept) + clips_expected
+        )
+
+@celery.task(name=GENERATE_WINDOW_CLIP, bind=True)
+def generate_window_clip_task(
+    self,
+    job_id: str,
+    start_time: float,
+    end_time: float,
+    caption_mode: str = "none",
+    origin: str = "search"
+):
+    """Renderiza un clip para una ventana arbitraria (un resultado de /search o un highlight en directo).
+
+    El clip se añade a los ya publicados del job con el siguiente índice libre, así
+    que aparece en el dashboard y en el bundle como cualquier otro.
+    """
+    if end_time <= start_time:
+        raise ValueError("end_time must be greater than start_time")
+    started = time.time()
+    segment = SegmentTable.from_dicts([{
+        "start_time": start_time, "end_time": end_time, "duration": end_time - start_time
+    }])[0]
+
+    clip_generator = ClipGenerator(caption_mode=caption_mode)
+    srt_generator = SRTGenerator()
+    transcript_index = srt_generator.load_transcript_index(job_id)
+    clip_index = _reserve_clip_index(job_id, clip_generator.load_clips_metadata(job_id) or {})
+
+    [clip] = clip_generator.generate_clips_from_segments(
+        job_id, [segment], 1,
+        subtitles_for_segment=(
+            (lambda seg: srt_generator.render_srt(transcript_index, seg.start_time, seg.end_time))
+            if transcript_index is not None else None
+        ),
+        first_index=clip_index
+    )
+    clip["origin"] = origin
+    attach_subtitles(srt_generator, job_id, clip, transcript_index)
+
+    # Se relee bajo el lock: otro render puede haber publicado mientras este codificaba
+    with _clips_lock(job_id):
+        existing = clip_generator.load_clips_metadata(job_id) or {}
+        clips = sorted(existing.get("clips", []) + [clip], key=lambda c: c["clip_index"])
+        metadata_object = clip_generator.save_clips_metadata(
+            job_id, clips, status=existing.get("status", "completed"),
+            clips_expected=max(existing.get("clips_expected", 0) + 1, len(clips))
+        )
+    ProgressReporter(job_id)("clip_ready", force=True, key=f"clip:{clip_index}", clips_total=len(clips), clip=clip)
+    LOG.info(f"Window clip {clip_index} ({origin}) generated for {job_id}: {start_time:.1f}-{end_time:.1f}s")
+    return {
+        "job_id": job_id,
+        "clip_index": clip_index,
+        "metadata_object": metadata_object,
+        "renders_saved": clip.get("renders_saved", 0),
+        "generation_time": time.time() - started
+    }
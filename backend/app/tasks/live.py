@@ -0,0 +1,290 @@
+from collections import deque
+from pathlib import Path
+from app.celery_app import celery
+from app.services.audio_features import compute_frame_features
+from app.services.live_highlights import LiveHighlightTracker, DEFAULT_LIVE_TOP_N
+from app.services.live_state import (
+    LIVE_STATE_TTL_SECONDS, live_active_key, load_live_state, save_live_state
+)
+from app.services.live_stream import (
+    LIVE_SAMPLE_RATE, resolve_live_playlist, fetch_media_playlist, download_segment,
+    decode_segment_audio, concat_segments
+)
+from app.services.minio_client import get_minio_client
+from app.services.progress import publish_progress
+from app.services.redis_client import get_redis_client
+from app.services.clip_generator import ClipGenerator
+from app.services.source_media import SECTION_PADDING_SECONDS, add_video_section, remove_video_sections, save_source_info
+from app.tasks.analyze_audio import generate_window_clip_task
+from app.tasks.signatures import START_LIVE_INGEST
+import logging
+import tempfile
+import time
+
+LOG = logging.getLogger(__name__)
+
+# Segmentos del directo que se conservan en MinIO para montar clips: lo justo para
+# cubrir ventana + confirmación + márgenes, así el almacenamiento no crece con el stream
+LIVE_RETENTION_SECONDS = 300.0
+# Segmentos nuevos procesados como máximo por paso (al arrancar o tras un retraso)
+LIVE_MAX_SEGMENTS_PER_STEP = 30
+# Un paso que no termina en este tiempo libera el lock (worker caído)
+LIVE_LOCK_SECONDS = 300
+# Fallos seguidos del manifiesto antes de dar el directo por terminado
+LIVE_MAX_PLAYLIST_FAILURES = 10
+# Pasos seguidos que fallan (descarga, subida, decodificación) antes de dar el directo por fallido
+LIVE_MAX_STEP_FAILURES = 10
+LIVE_RETRY_SECONDS = 5
+# Una sección de clip se borra cuando sale de la retención y su clip ya está renderizado;
+# si el render no llega en este tiempo se da por perdido y se borra igualmente
+LIVE_SECTION_MAX_AGE_SECONDS = 3600.0
+
+
+def _segment_object(job_id: str, sequence: int) -> str:
+    return f"{job_id}/live/segments/{sequence:012d}.ts"
+
+
+@celery.task(name=START_LIVE_INGEST, bind=True)
+def start_live_ingest(
+    self,
+    job_id: str,
+    source_url: str,
+    user_id: int = None,
+    top_n: int = DEFAULT_LIVE_TOP_N,
+    caption_mode: str = "none"
+):
+    """Arranca el modo directo: resuelve el manifiesto HLS y encadena pasos de ingesta.
+
+    Cada paso es una tarea corta que procesa los segmentos nuevos y se vuelve a
+    programar; el estado vive en Redis, así que un worker reiniciado no corta el directo.
+    """
+    try:
+        playlist_url = resolve_live_playlist(source_url)
+    except Exception as e:
+        LOG.exception(f"Could not resolve live playlist for {job_id}: {e}")
+        publish_progress(job_id, "failed", error=str(e))
+        raise
+    save_source_info(get_minio_client(), "vods", job_id, source_url, "live")
+    state = {
+        "job_id": job_id,
+        "source_url": source_url,
+        "user_id": user_id,
+        "caption_mode": caption_mode,
+        "playlist_url": playlist_url,
+        "last_sequence": None,
+        "stream_time": 0.0,
+        "segments": [],
+        "clips_requested": 0,
+        "playlist_failures": 0,
+        "status": "live",
+        "started_at": time.time(),
+        "tracker": LiveHighlightTracker(top_n=top_n).to_dict(),
+    }
+    save_live_state(job_id, state)
+    get_redis_client().set(live_active_key(job_id), 1, ex=LIVE_STATE_TTL_SECONDS)
+    publish_progress(job_id, "live", status="live", stream_time=0.0)
+    live_ingest_step.delay(job_id)
+    return {"job_id": job_id, "status": "live", "playlist_url": playlist_url}
+
+
+@celery.task(bind=True)
+def live_ingest_step(self, job_id: str):
+    """Procesa los segmentos HLS nuevos en orden y emite clips de los highlights confirmados"""
+    redis_client = get_redis_client()
+    lock = redis_client.lock(f"live:{job_id}:lock", timeout=LIVE_LOCK_SECONDS, blocking_timeout=0)
+    if not lock.acquire():
+        return {"job_id": job_id, "status": "busy"}
+    try:
+        state = load_live_state(job_id)
+        if state is None or state["status"] != "live":
+            return {"job_id": job_id, "status": "stopped"}
+        tracker = LiveHighlightTracker.from_dict(state["tracker"])
+        client = get_minio_client()
+
+        if not redis_client.get(live_active_key(job_id)):
+            return _finish_live(job_id, state, tracker, client, "stopped")
+
+        try:
+            state["playlist_url"], playlist = fetch_media_playlist(state["playlist_url"])
+            state["playlist_failures"] = 0
+        except Exception as e:
+            state["playlist_failures"] += 1
+            LOG.warning(f"Live playlist fetch failed for {job_id} ({state['playlist_failures']}): {e}")
+            if state["playlist_failures"] >= LIVE_MAX_PLAYLIST_FAILURES:
+                return _finish_live(job_id, state, tracker, client, "ended")
+            # Las URLs firmadas del manifiesto caducan: se resuelve de nuevo desde la fuente
+            try:
+                state["playlist_url"] = resolve_live_playlist(state["source_url"])
+            except Exception as resolve_error:
+                LOG.warning(f"Live playlist re-resolve failed for {job_id}: {resolve_error}")
+            state["tracker"] = tracker.to_dict()
+            save_live_state(job_id, state)
+            live_ingest_step.apply_async((job_id,), countdown=LIVE_RETRY_SECONDS)
+            return {"job_id": job_id, "status": "retrying"}
+
+        try:
+            new_segments, confirmed = _ingest_new_segments(job_id, state, tracker, playlist, client)
+        except Exception as e:
+            # Un segmento que no baja o no se decodifica no debe cortar el directo: se descarta
+            # el paso (el estado guardado sigue en el último paso completo) y se reintenta
+            LOG.exception(f"Live ingest step failed for {job_id}: {e}")
+            saved = load_live_state(job_id) or state
+            saved["step_failures"] = saved.get("step_failures", 0) + 1
+            if saved["step_failures"] >= LIVE_MAX_STEP_FAILURES:
+                return _finish_live(job_id, saved, LiveHighlightTracker.from_dict(saved["tracker"]), client, "failed")
+            save_live_state(job_id, saved)
+            live_ingest_step.apply_async((job_id,), countdown=LIVE_RETRY_SECONDS)
+            return {"job_id": job_id, "status": "retrying"}
+        state["step_failures"] = 0
+        state["tracker"] = tracker.to_dict()
+
+        if playlist.ended:
+            return _finish_live(job_id, state, tracker, client, "ended")
+
+        save_live_state(job_id, state)
+        publish_progress(
+            job_id, "live", status="live", stream_time=state["stream_time"],
+            clips_requested=state["clips_requested"],
+            highlights=[h.to_dict() for h in tracker.top_highlights()]
+        )
+        # Con retraso acumulado se sigue enseguida; si no, a mitad de la duración de segmento
+        behind = new_segments == LIVE_MAX_SEGMENTS_PER_STEP
+        live_ingest_step.apply_async((job_id,), countdown=0 if behind else max(1.0, playlist.target_duration / 2))
+        return {"job_id": job_id, "status": "live", "segments": new_segments, "clips": confirmed}
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def _ingest_new_segments(job_id: str, state: dict, tracker: LiveHighlightTracker, playlist, client) -> tuple:
+    """Sube, analiza y recorta los segmentos nuevos del manifiesto; emite los highlights confirmados.
+
+    Devuelve (segmentos procesados, highlights confirmados).
+    """
+    last = state["last_sequence"]
+    new_segments = [s for s in playlist.segments if last is None or s.sequence > last]
+    if last is None:
+        # Se empieza por el borde del directo, no por lo que aún quede en la ventana del manifiesto
+        new_segments = new_segments[-3:]
+    elif new_segments and new_segments[0].sequence > last + 1:
+        skipped = new_segments[0].sequence - last - 1
+        LOG.warning(f"Live job {job_id} fell behind: {skipped} segments left the playlist")
+        state["stream_time"] += skipped * playlist.target_duration
+    new_segments = new_segments[:LIVE_MAX_SEGMENTS_PER_STEP]
+
+    retained = deque(state["segments"])
+    confirmed = []
+    with tempfile.TemporaryDirectory(prefix="live_") as workdir:
+        for segment in new_segments:
+            local = download_segment(segment, Path(workdir) / f"{segment.sequence}.ts")
+            object_name = _segment_object(job_id, segment.sequence)
+            client.fput_object("vods", object_name, str(local), content_type="video/mp2t")
+            start = state["stream_time"]
+            retained.append([segment.sequence, start, segment.duration, object_name])
+
+            y = decode_segment_audio(local, LIVE_SAMPLE_RATE)
+            if y is not None and len(y):
+                features = compute_frame_features(y, LIVE_SAMPLE_RATE, tracker.frame_seconds)
+                confirmed += tracker.push(start, features.scores())
+            state["stream_time"] = start + segment.duration
+            state["last_sequence"] = segment.sequence
+            local.unlink()
+
+        for highlight in confirmed:
+            _emit_live_clip(job_id, state, retained, highlight, client, workdir)
+
+    _expire_segments(client, retained, state["stream_time"])
+    _expire_sections(job_id, state, client, state["stream_time"])
+    state["segments"] = list(retained)
+    return len(new_segments), len(confirmed)
+
+
+def _emit_live_clip(job_id: str, state: dict, retained: deque, highlight, client, workdir: str):
+    """Monta la sección de vídeo del highlight con los segmentos retenidos y encola su render"""
+    lo = highlight.start_time - SECTION_PADDING_SECONDS
+    hi = highlight.end_time + SECTION_PADDING_SECONDS
+    covering = [s for s in retained if s[1] + s[2] > lo and s[1] < hi]
+    if not covering or covering[0][1] > highlight.start_time:
+        LOG.warning(f"Live highlight {highlight.start_time:.1f}s of {job_id} is no longer retained, skipping")
+        return
+    paths = []
+    for sequence, _, _, object_name in covering:
+        path = Path(workdir) / f"section_{sequence}.ts"
+        client.fget_object("vods", object_name, str(path))
+        paths.append(path)
+    section_path = concat_segments(paths, Path(workdir) / "section.mp4")
+    section_end = covering[-1][1] + covering[-1][2]
+    section = add_video_section(client, "vods", job_id, covering[0][1], section_end, section_path)
+    for path in paths + [section_path]:
+        path.unlink()
+
+    generate_window_clip_task.delay(
+        job_id, highlight.start_time, min(highlight.end_time, section_end),
+        state["caption_mode"], "live"
+    )
+    # [fin, objeto, inicio del clip que la usa]: para recortarla cuando el clip esté listo
+    state.setdefault("sections", []).append([section_end, section["object_name"], highlight.start_time])
+    state["clips_requested"] += 1
+    LOG.info(f"Live highlight for {job_id}: {highlight.start_time:.1f}-{highlight.end_time:.1f}s (score {highlight.score:.3f})")
+
+
+def _expire_segments(client, retained: deque, stream_time: float):
+    while retained and retained[0][1] + retained[0][2] < stream_time - LIVE_RETENTION_SECONDS:
+        _, _, _, object_name = retained.popleft()
+        try:
+            client.remove_object("vods", object_name)
+        except Exception as e:
+            LOG.warning(f"Could not remove expired live segment {object_name}: {e}")
+
+
+def _expire_sections(job_id: str, state: dict, client, stream_time: float):
+    """Borra las secciones de clip fuera de la retención cuyo clip ya se ha renderizado.
+
+    Así sections.json y los MP4 de secciones no crecen con la duración del directo.
+    """
+    sections = state.setdefault("sections", [])
+    old = [s for s in sections if s[0] < stream_time - LIVE_RETENTION_SECONDS]
+    if not old:
+        return
+    metadata = ClipGenerator().load_clips_metadata(job_id) or {}
+    rendered = {round(clip["start_time"], 3) for clip in metadata.get("clips", []) if clip.get("origin") == "live"}
+    expired = [s for s in old if round(s[2], 3) in rendered or s[0] < stream_time - LIVE_SECTION_MAX_AGE_SECONDS]
+    if not expired:
+        return
+    state["sections"] = [s for s in sections if s not in expired]
+    # Dos highlights pueden compartir sección: solo se borra cuando ninguno pendiente la usa
+    in_use = {object_name for _, object_name, _ in state["sections"]}
+    remove_video_sections(
+        client, "vods", job_id, {object_name for _, object_name, _ in expired if object_name not in in_use}
+    )
+
+
+def _finish_live(job_id: str, state: dict, tracker: LiveHighlightTracker, client, status: str) -> dict:
+    """Confirma el último candidato, borra los segmentos retenidos y marca el directo como terminado"""
+    retained = deque(state["segments"])
+    with tempfile.TemporaryDirectory(prefix="live_") as workdir:
+        for highlight in tracker.flush():
+            try:
+                _emit_live_clip(job_id, state, retained, highlight, client, workdir)
+            except Exception as e:
+                LOG.warning(f"Could not emit final live highlight for {job_id}: {e}")
+    _expire_segments(client, retained, float("inf"))
+    # Las secciones de clips aún sin renderizar se quedan (como mucho las de los últimos highlights)
+    _expire_sections(job_id, state, client, state["stream_time"] + LIVE_RETENTION_SECONDS)
+    state.update(segments=[], status=status, tracker=tracker.to_dict(), finished_at=time.time())
+    save_live_state(job_id, state)
+    get_redis_client().delete(live_active_key(job_id))
+    publish_progress(
+        job_id, "live", status=status, stream_time=state["stream_time"],
+        clips_requested=state["clips_requested"],
+        highlights=[h.to_dict() for h in tracker.top_highlights()]
+    )
+    # Cierra los streams SSE del job (los clips ya encolados siguen publicando clip_ready)
+    publish_progress(
+        job_id, "failed" if status == "failed" else "completed",
+        status=status, clips_requested=state["clips_requested"]
+    )
+    LOG.info(f"Live job {job_id} {status} after {state['stream_time']:.0f}s, {state['clips_requested']} clips requested")
+    return {"job_id": job_id, "status": status, "stream_time": state["stream_time"]}
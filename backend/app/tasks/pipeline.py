@@ -0,0 +1,86 @@
+from celery import chain
+from app.celery_app import celery
+from app.services.progress import publish_progress
+from app.tasks.process_vod import download_and_extract_audio, transcribe_vod_audio
+from app.tasks.analyze_audio import analyze_audio_segments, generate_clips_task, fetch_clip_sections
+from app.tasks.sharded import analyze_audio_sharded, transcribe_vod_audio_sharded
+from app.tasks.signatures import DEFAULT_SHARD_SECONDS, JOB_COMPLETED, JOB_FAILED
+import logging
+
+LOG = logging.getLogger(__name__)
+
+def build_clips_pipeline(
+    job_id: str,
+    source_url: str,
+    user_id: int | None = None,
+    max_clips: int = 10,
+    sharded: bool = False,
+    shard_seconds: float = DEFAULT_SHARD_SECONDS,
+    shard_transcription: bool = False,
+    caption_mode: str = "none",
+    ingest_mode: str = "full"
+):
+    """Canvas descarga → transcripción → análisis → clips.
+
+    Cada etapa es una tarea independiente, así que se enruta a la cola de su
+    clase de recurso (io / asr / analysis / encode) en lugar de ocupar un único
+    worker durante todo el pipeline. En modo audio_first se descarga solo el audio
+    y, tras el análisis, las secciones de vídeo de los clips elegidos.
+    """
+    if sharded and shard_transcription:
+        transcribe = transcribe_vod_audio_sharded.si(job_id, shard_seconds)
+    else:
+        transcribe = transcribe_vod_audio.si(job_id)
+
+    if sharded:
+        analyze = analyze_audio_sharded.si(job_id, shard_seconds=shard_seconds)
+    else:
+        analyze = analyze_audio_segments.si(job_id)
+
+    steps = [
+        download_and_extract_audio.si(job_id, source_url, user_id, ingest_mode),
+        transcribe,
+        analyze,
+    ]
+    if ingest_mode == "audio_first":
+        steps.append(fetch_clip_sections.si(job_id, max_clips))
+    steps += [
+        generate_clips_task.si(job_id, max_clips, caption_mode),
+        finish_clips_pipeline.s(job_id),
+    ]
+    workflow = chain(*steps)
+    workflow.link_error(clips_pipeline_failed.s(job_id))
+    return workflow
+
+@celery.task(bind=True)
+def finish_clips_pipeline(self, clips_result: dict, job_id: str):
+    """Último eslabón del pipeline: publica el fin y devuelve el resumen"""
+    LOG.info(f"Complete VOD processing finished for {job_id}")
+    publish_progress(job_id, "completed", clips_generated=clips_result.get('clips_generated', 0))
+    return {
+        "job_id": job_id,
+        "status": "completed",
+        "clips": clips_result,
+        "summary": {
+            "clips_generated": clips_result.get('clips_generated', 0),
+            "total_size_mb": clips_result.get('total_size_mb', 0),
+            "processing_time": clips_result.get('generation_time', 0)
+        }
+    }
+
+@celery.task
+def clips_pipeline_failed(request, exc, traceback, job_id: str):
+    """Errback del pipeline: cualquier etapa que falle cierra el job"""
+    LOG.error(f"Complete VOD processing with clips failed for job {job_id}: {exc}")
+    publish_progress(job_id, "failed", error=str(exc))
+
+@celery.task(name=JOB_COMPLETED)
+def job_completed(job_id: str):
+    """Link de los jobs de una sola etapa (descarga, transcripción, análisis, renders): cierra su stream de progreso"""
+    publish_progress(job_id, "completed")
+
+@celery.task(name=JOB_FAILED)
+def job_failed(request, exc, traceback, job_id: str):
+    """Errback de los jobs de una sola etapa"""
+    LOG.error(f"Job {job_id} failed in {request.task}: {exc}")
+    publish_progress(job_id, "failed", error=str(exc))
@@ -1,130 +1,280 @@
 import os 
 import time
 import subprocess
+import tempfile
+from collections import deque
 from pathlib import Path
 from app.celery_app import celery
 from app.services.minio_client import get_minio_client
+from app.services.progress import ProgressReporter, publish_progress
+from app.services.pcm_cache import adopt_into_cache
+from app.services.source_media import INGEST_MODES, save_source_info, load_source_info, has_full_video
+from app.services.visual_activity import ffmpeg_visual_output_args, read_visual_activity, save_visual_activity
 from app.services.whisper_client import transcribe_audio_from_minio
-from app.utils.sanitize_for_json import sanitize_for_json
+from app.services.transcript_index import save_transcript_index, load_transcript_index
+from app.services.transcript_search import index_transcript
+from app.tasks.signatures import (
+    DOWNLOAD_AND_EXTRACT_AUDIO, DOWNLOAD_FULL_VIDEO, TRANSCRIBE_VOD_AUDIO, PROCESS_VOD_COMPLETE, PROCESS_VOD_WITH_CLIPS
+)
 import logging
 
 LOG = logging.getLogger(__name__)
 
-@celery.task(bind=True)
-def download_and_extract_audio(self, job_id: str, source_url: str, user_id: int | None = None):
-    workdir = Path("/tmp/streamsculptor") / job_id
-    workdir.mkdir(parents=True, exist_ok=True)
+# yt-dlp imprime una línea por actualización con este prefijo (ver --progress-template)
+YTDLP_PROGRESS_PREFIX = "[progress]"
+YTDLP_PROGRESS_TEMPLATE = (
+    "download:" + YTDLP_PROGRESS_PREFIX +
+    "%(info.format_id)s %(progress.downloaded_bytes)s %(progress.total_bytes,progress.total_bytes_estimate)s"
+)
 
-    video_path = workdir / "input.mp4"
-    audio_path = workdir / "audio.wav"
+# Serie de actividad visual calculada en la misma decodificación que extrae el audio
+VISUAL_ANALYSIS_ENABLED = os.environ.get("VISUAL_ANALYSIS", "1") != "0"
 
-    # 1) Download with yt-dlp (retries + verification)
+def _parse_int(value: str) -> int | None:
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+def _run_ffmpeg_extract(video_path: Path, audio_path: Path, visual: bool = True):
+    """Extrae el WAV y, si está activado, la actividad visual por segundo en una sola pasada.
+
+    Devuelve (returncode, stderr, serie de actividad o None).
+    """
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", str(video_path),
+           "-map", "0:a:0", "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2", str(audio_path)]
+    if not (visual and VISUAL_ANALYSIS_ENABLED):
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return proc.returncode, proc.stderr, None
+
+    cmd += ffmpeg_visual_output_args()
+    LOG.info("Running: %s", " ".join(cmd))
+    # stderr a fichero: el pipe de frames se consume mientras ffmpeg escribe
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            activity = read_visual_activity(proc.stdout)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode("utf-8", errors="replace")
+    return proc.returncode, stderr, activity
+
+def _run_yt_dlp(cmd: list, report: ProgressReporter) -> tuple[int, str]:
+    """Ejecuta yt-dlp publicando bytes descargados; devuelve (returncode, cola de la salida)"""
+    tail = deque(maxlen=50)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in proc.stdout:
+        line = line.strip()
+        if not line.startswith(YTDLP_PROGRESS_PREFIX):
+            tail.append(line)
+            continue
+        parts = line[len(YTDLP_PROGRESS_PREFIX):].split()
+        if len(parts) != 3:
+            continue
+        format_id, downloaded, total = parts[0], _parse_int(parts[1]), _parse_int(parts[2])
+        report(
+            "downloading",
+            format_id=format_id,
+            downloaded_bytes=downloaded,
+            total_bytes=total,
+            percent=round(100 * downloaded / total, 1) if downloaded is not None and total else None,
+        )
+    proc.wait()
+    return proc.returncode, "\n".join(tail)
+
+def _download_media(source_url: str, target_path: Path, fmt: str, report: ProgressReporter) -> Path:
+    """Descarga con yt-dlp (reintentos + verificación) y devuelve la ruta real del fichero"""
     max_dl_attempts = 3
     for attempt in range(1, max_dl_attempts + 1):
-        cmd_dl = ["yt-dlp", "-f", "bestvideo+bestaudio", "-o", str(video_path), source_url]
+        cmd_dl = [
+            "yt-dlp", "-f", fmt,
+            "--newline", "--progress-template", YTDLP_PROGRESS_TEMPLATE,
+            "-o", str(target_path), source_url,
+        ]
         LOG.info("Running: %s (attempt %d/%d)", " ".join(cmd_dl), attempt, max_dl_attempts)
-        proc_dl = subprocess.run(cmd_dl, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        dl_returncode, dl_output = _run_yt_dlp(cmd_dl, report)
         # yt-dlp may append the real container/extension (e.g., input.mp4.webm). Check for that.
-        if proc_dl.returncode == 0:
-            if video_path.exists() and video_path.stat().st_size > 0:
-                LOG.info("Download succeeded: %s (%d bytes)", video_path, video_path.stat().st_size)
+        if dl_returncode == 0:
+            if target_path.exists() and target_path.stat().st_size > 0:
+                LOG.info("Download succeeded: %s (%d bytes)", target_path, target_path.stat().st_size)
                 break
             # Try to find a file with the expected prefix
-            matches = list(workdir.glob(video_path.name + '*'))
+            matches = list(target_path.parent.glob(target_path.name + '*'))
             if matches:
                 actual = matches[0]
-                LOG.info("Found downloaded file with different suffix: %s -> renaming to %s", actual, video_path)
+                LOG.info("Found downloaded file with different suffix: %s -> renaming to %s", actual, target_path)
                 try:
-                    actual.rename(video_path)
+                    actual.rename(target_path)
                 except Exception:
-                    LOG.warning("Failed to rename %s to %s, will use original name %s", actual, video_path, actual)
-                    video_path = actual
+                    LOG.warning("Failed to rename %s to %s, will use original name %s", actual, target_path, actual)
+                    target_path = actual
                 else:
-                    LOG.info("Renamed downloaded file to expected path: %s", video_path)
-                if video_path.exists() and video_path.stat().st_size > 0:
+                    LOG.info("Renamed downloaded file to expected path: %s", target_path)
+                if target_path.exists() and target_path.stat().st_size > 0:
                     break
-        LOG.warning("yt-dlp attempt %d failed or produced no usable file: returncode=%s stdout=%s stderr=%s", attempt, proc_dl.returncode, proc_dl.stdout, proc_dl.stderr)
+        LOG.warning("yt-dlp attempt %d failed or produced no usable file: returncode=%s output=%s", attempt, dl_returncode, dl_output)
         if attempt < max_dl_attempts:
             time.sleep(2 ** attempt)
     else:
-        LOG.error("yt-dlp failed after %d attempts: stdout=%s stderr=%s", max_dl_attempts, proc_dl.stdout, proc_dl.stderr)
-        raise RuntimeError(f"yt-dlp failed after {max_dl_attempts} attempts: {proc_dl.stderr}")
+        LOG.error("yt-dlp failed after %d attempts: output=%s", max_dl_attempts, dl_output)
+        raise RuntimeError(f"yt-dlp failed after {max_dl_attempts} attempts: {dl_output}")
 
     # Verify downloaded file exists and is not empty
-    if not video_path.exists() or video_path.stat().st_size == 0:
-        LOG.error("Input video missing or empty after download: %s", video_path)
-        raise RuntimeError("Input video missing or empty after download")
+    if not target_path.exists() or target_path.stat().st_size == 0:
+        LOG.error("Downloaded file missing or empty: %s", target_path)
+        raise RuntimeError("Downloaded file missing or empty")
+    return target_path
 
-    # 2) Extract audio with ffmpeg (WAV) with a small retry
+@celery.task(name=DOWNLOAD_AND_EXTRACT_AUDIO, bind=True)
+def download_and_extract_audio(self, job_id: str, source_url: str, user_id: int | None = None, ingest_mode: str = "full"):
+    """Descarga el VOD y extrae el WAV.
+
+    ingest_mode="audio_first" descarga solo la pista de audio: el vídeo de los clips
+    se baja después por secciones (ver fetch_clip_sections) y el VOD completo solo
+    si alguien lo pide. Sin vídeo no hay serie de actividad visual.
+    """
+    if ingest_mode not in INGEST_MODES:
+        raise ValueError(f"Invalid ingest_mode '{ingest_mode}', expected one of {INGEST_MODES}")
+    audio_only = ingest_mode == "audio_first"
+
+    workdir = Path("/tmp/streamsculptor") / job_id
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    video_path = workdir / ("source_audio" if audio_only else "input.mp4")
+    audio_path = workdir / "audio.wav"
+    report = ProgressReporter(job_id)
+
+    # 1) Download with yt-dlp
+    video_path = _download_media(source_url, video_path, "bestaudio" if audio_only else "bestvideo+bestaudio", report)
+
+    report("downloaded", force=True, total_bytes=video_path.stat().st_size, percent=100.0)
+
+    # 2) Extract audio with ffmpeg (WAV) with a small retry; same decode yields the visual activity series
+    report("extracting_audio", force=True)
     max_ff_attempts = 2
     for attempt in range(1, max_ff_attempts + 1):
-        cmd_ff = ["ffmpeg", "-y", "-i", str(video_path), "-vn", "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2", str(audio_path)]
-        LOG.info("Running: %s (attempt %d/%d)", " ".join(cmd_ff), attempt, max_ff_attempts)
+        LOG.info("Extracting audio (attempt %d/%d)", attempt, max_ff_attempts)
         LOG.info("Input video size before ffmpeg: %d bytes", video_path.stat().st_size)
-        proc_ff = subprocess.run(cmd_ff, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if proc_ff.returncode == 0 and audio_path.exists() and audio_path.stat().st_size > 0:
-            LOG.info("ffmpeg succeeded: %s (%d bytes)", audio_path, audio_path.stat().st_size)
+        extract_started = time.time()
+        ff_returncode, ff_stderr, visual_activity = _run_ffmpeg_extract(video_path, audio_path, visual=not audio_only)
+        if ff_returncode == 0 and audio_path.exists() and audio_path.stat().st_size > 0:
+            LOG.info("ffmpeg succeeded: %s (%d bytes) in %.1fs", audio_path, audio_path.stat().st_size, time.time() - extract_started)
             break
-        LOG.warning("ffmpeg attempt %d failed: returncode=%s stdout=%s stderr=%s", attempt, proc_ff.returncode, proc_ff.stdout, proc_ff.stderr)
+        LOG.warning("ffmpeg attempt %d failed: returncode=%s stderr=%s", attempt, ff_returncode, ff_stderr)
         if attempt < max_ff_attempts:
             time.sleep(2 ** attempt)
     else:
-        LOG.error("ffmpeg failed after %d attempts: stdout=%s stderr=%s", max_ff_attempts, proc_ff.stdout, proc_ff.stderr)
-        raise RuntimeError(f"ffmpeg failed after {max_ff_attempts} attempts: {proc_ff.stderr}")
+        LOG.error("ffmpeg failed after %d attempts: stderr=%s", max_ff_attempts, ff_stderr)
+        raise RuntimeError(f"ffmpeg failed after {max_ff_attempts} attempts: {ff_stderr}")
 
     # 3) Upload to MinIO
+    report("uploading", force=True)
     client = get_minio_client()
     bucket = "vods"
     if not client.bucket_exists(bucket):
         client.make_bucket(bucket)
 
-    video_obj = f"{job_id}/input.mp4"
+    video_obj = None if audio_only else f"{job_id}/input.mp4"
     audio_obj = f"{job_id}/audio.wav"
 
-    client.fput_object(bucket, video_obj, str(video_path))
+    if video_obj:
+        client.fput_object(bucket, video_obj, str(video_path))
     client.fput_object(bucket, audio_obj, str(audio_path))
+    save_source_info(client, bucket, job_id, source_url, ingest_mode)
+    visual_obj = None
+    if visual_activity is not None and len(visual_activity):
+        visual_obj = save_visual_activity(client, bucket, job_id, visual_activity)
 
-    # 4) Cleanup local files
+    # 4) Cleanup local files; the WAV stays in the local PCM cache for analysis
     video_path.unlink(missing_ok=True)
-    audio_path.unlink(missing_ok=True)
+    adopt_into_cache(audio_path, bucket, audio_obj)
     workdir.rmdir()
 
     # 5) Return metadata
-    return {"job_id": job_id, "video_obj": video_obj, "audio_obj": audio_obj}
+    return {
+        "job_id": job_id, "video_obj": video_obj, "audio_obj": audio_obj,
+        "visual_obj": visual_obj, "ingest_mode": ingest_mode
+    }
+
+@celery.task(name=DOWNLOAD_FULL_VIDEO, bind=True)
+def download_full_video(self, job_id: str):
+    """Descarga diferida del VOD completo para jobs ingeridos en modo audio_first"""
+    client = get_minio_client()
+    bucket = "vods"
+    video_obj = f"{job_id}/input.mp4"
+    if has_full_video(client, bucket, job_id):
+        return {"job_id": job_id, "video_obj": video_obj}
+
+    info = load_source_info(client, bucket, job_id)
+    if not info:
+        raise RuntimeError(f"No source info for job {job_id}: cannot fetch the full video")
+
+    workdir = Path("/tmp/streamsculptor") / f"{job_id}-video"
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        video_path = _download_media(info["source_url"], workdir / "input.mp4", "bestvideo+bestaudio", ProgressReporter(job_id))
+        client.fput_object(bucket, video_obj, str(video_path))
+        LOG.info(f"Full video fetched for job {job_id}: {video_path.stat().st_size} bytes")
+        video_path.unlink(missing_ok=True)
+    finally:
+        for leftover in workdir.glob("*"):
+            leftover.unlink(missing_ok=True)
+        workdir.rmdir()
+    return {"job_id": job_id, "video_obj": video_obj}
+
+def save_transcript(job_id: str, transcription: dict, bucket: str = "vods") -> str:
+    """Guarda la transcripción en MinIO como JSON (más su índice compacto) y devuelve el objeto"""
+    import json
+    import tempfile
+    
+    client = get_minio_client()
+    transcript_obj = f"{job_id}/transcript.json"
+    
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
+        json.dump(transcription, temp_file, indent=2)
+        temp_file_path = temp_file.name
+    
+    try:
+        client.fput_object(bucket, transcript_obj, temp_file_path)
+        LOG.info(f"Transcription saved to MinIO: {transcript_obj}")
+    finally:
+        os.unlink(temp_file_path)
+    # Consultas por ventana de tiempo sin descargar el JSON completo (ver /transcript)
+    save_transcript_index(client, bucket, job_id, transcription)
+    return transcript_obj
 
 @celery.task(bind=True)
-def transcribe_vod_audio(self, job_id: str):
+def index_job_transcript(self, job_id: str, language: str | None = None):
+    """Añade (o reemplaza) la transcripción del job en el índice de búsqueda"""
+    index = load_transcript_index(get_minio_client(), "vods", job_id)
+    if index is None:
+        raise RuntimeError(f"No transcript index for job {job_id}")
+    return {"job_id": job_id, "segments_indexed": index_transcript(job_id, index, language)}
+
+@celery.task(name=TRANSCRIBE_VOD_AUDIO, bind=True)
+def transcribe_vod_audio(self, job_id: str, bucket: str = "vods"):
     """Tarea para transcribir el audio de un VOD desde MinIO"""
     try:
-        bucket = "vods"
         audio_obj = f"{job_id}/audio.wav"
         
         LOG.info(f"Starting transcription for job {job_id}")
+        publish_progress(job_id, "transcribing", percent=0.0)
         
-        # Llamar al servicio Whisper
-        transcription = transcribe_audio_from_minio(bucket, audio_obj)
+        # Llamar al servicio Whisper (publica el porcentaje en el canal del job)
+        transcription = transcribe_audio_from_minio(bucket, audio_obj, job_id=job_id)
         
         # Guardar la transcripción en MinIO como JSON
-        client = get_minio_client()
-        transcript_obj = f"{job_id}/transcript.json"
-        
-        import json
-        import tempfile
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
-            json.dump(transcription, temp_file, indent=2)
-            temp_file_path = temp_file.name
-        
-        try:
-            client.fput_object(bucket, transcript_obj, temp_file_path)
-            LOG.info(f"Transcription saved to MinIO: {transcript_obj}")
-        finally:
-            os.unlink(temp_file_path)
+        transcript_obj = save_transcript(job_id, transcription, bucket)
         
+        publish_progress(job_id, "transcribing", percent=100.0, segments_count=len(transcription["segments"]))
+        # Indexado para /search fuera de la cola de ASR
+        index_job_transcript.delay(job_id, transcription.get("language"))
         return {
             "job_id": job_id,
             "transcript_obj": transcript_obj,
-            "text": transcription["text"],
+            "language": transcription.get("language"),
             "segments_count": len(transcription["segments"])
         }
         
@@ -132,107 +282,41 @@ def transcribe_vod_audio(self, job_id: str):
         LOG.exception(f"Transcription failed for job {job_id}: {e}")
         raise
 
-@celery.task(bind=True)
-def process_vod_complete(self, job_id: str, source_url: str, user_id: int | None = None):
-    """Tarea completa: descarga, extrae audio y transcribe"""
-    try:
-        # 1. Descargar y extraer audio
-        LOG.info(f"Starting complete VOD processing for job {job_id}")
-        
-        download_result = download_and_extract_audio.apply(args=[job_id, source_url, user_id])
-        if download_result.failed():
-            raise Exception("Download and audio extraction failed")
-        
-        # 2. Transcribir audio
-        transcript_result = transcribe_vod_audio.apply(args=[job_id])
-        if transcript_result.failed():
-            raise Exception("Transcription failed")
-        
-        # 3. Retornar resultado completo
-        return {
-            "job_id": job_id,
-            "status": "completed",
-            "download": download_result.result,
-            "transcription": transcript_result.result
-        }
-        
-    except Exception as e:
-        LOG.exception(f"Complete VOD processing failed for job {job_id}: {e}")
-        raise
+@celery.task(name=PROCESS_VOD_COMPLETE, bind=True)
+def process_vod_complete(self, job_id: str, source_url: str, user_id: int | None = None, ingest_mode: str = "full"):
+    """Tarea completa: descarga, extrae audio y transcribe.
+
+    Se reemplaza por una cadena para que la descarga corra en la cola de IO
+    y la transcripción en la de ASR.
+    """
+    from celery import chain
+    
+    LOG.info(f"Starting complete VOD processing for job {job_id}")
+    return self.replace(chain(
+        download_and_extract_audio.si(job_id, source_url, user_id, ingest_mode),
+        transcribe_vod_audio.si(job_id),
+    ))
 
-@celery.task(name="app.tasks.process_vod.process_vod_with_clips",bind=True) 
+@celery.task(name=PROCESS_VOD_WITH_CLIPS, bind=True)
 def process_vod_with_clips(
     self, 
     job_id: str, 
     source_url: str, 
     user_id: int | None = None,
-    max_clips: int = 10
+    max_clips: int = 10,
+    caption_mode: str = "none",
+    ingest_mode: str = "full"
 ):
-    """Pipeline completo: descarga + transcribe + análisis + clips"""
-    try:
-        LOG.info(f"Starting complete VOD processing with clips for job {job_id}")
-        # Publish initial progress
-        self.update_state(state='PROGRESS', meta={'status': 'started', 'current': 0, 'total': 4, 'job_id': job_id})
-        
-        # Importar tareas directamente
-        from app.tasks.process_vod import download_and_extract_audio, transcribe_vod_audio
-        from app.tasks.analyze_audio import analyze_audio_segments, generate_clips_task
-        
-        # 1. Descargar y extraer audio - EJECUTAR SINCRONO
-        LOG.info(f"Step 1/4: Downloading and extracting audio for {job_id}")
-        self.update_state(state='PROGRESS', meta={'status': 'downloading', 'current': 1, 'total': 4, 'job_id': job_id})
-        download_result = download_and_extract_audio(job_id, source_url, user_id)
-        LOG.info(f"Download completed: {download_result}")
-        
-        # 2. Transcribir audio - EJECUTAR SINCRONO
-        LOG.info(f"Step 2/4: Transcribing audio for {job_id}")
-        self.update_state(state='PROGRESS', meta={'status': 'transcribing', 'current': 2, 'total': 4, 'job_id': job_id})
-        transcript_result = transcribe_vod_audio(job_id)
-        LOG.info(f"Transcription completed: {transcript_result}")
-        
-        # 3. Analizar audio - EJECUTAR SINCRONO
-        LOG.info(f"Step 3/4: Analyzing audio segments for {job_id}")
-        self.update_state(state='PROGRESS', meta={'status': 'analyzing', 'current': 3, 'total': 4, 'job_id': job_id})
-        analysis_result = analyze_audio_segments(job_id)
-        LOG.info(f"Analysis completed: {len(analysis_result.get('segments', []))} segments found")
-        
-        # 4. Generar clips - EJECUTAR SINCRONO
-        LOG.info(f"Step 4/4: Generating clips for {job_id}")
-        self.update_state(state='PROGRESS', meta={'status': 'generating_clips', 'current': 4, 'total': 4, 'job_id': job_id})
-        clips_result = generate_clips_task(job_id, max_clips)
-        LOG.info(f"Clips generation completed: {clips_result.get('clips_generated', 0)} clips")
-        
-        # Resultado completo
-        final_result = {
-            "job_id": job_id,
-            "status": "completed",
-            "pipeline_steps": {
-                "download": download_result,
-                "transcription": transcript_result,
-                "analysis": analysis_result,
-                "clips": clips_result
-            },
-            "summary": {
-                "clips_generated": clips_result.get('clips_generated', 0),
-                "total_size_mb": clips_result.get('total_size_mb', 0),
-                "processing_time": clips_result.get('generation_time', 0)
-            }
-        }
-        
-        LOG.info(f"Complete VOD processing finished for {job_id}")
-        return sanitize_for_json(final_result)
-        
-    except Exception as e:
-        LOG.exception(f"Complete VOD processing with clips failed for job {job_id}: {e}")
-        # Actualizar estado en caso de error
-        # Ensure the meta includes the exception type and message so backends can reconstruct the error
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'error': str(e),
-                'exc_type': type(e).__name__,
-                'exc_message': str(e),
-                'job_id': job_id
-            }
-        )
-        raise
\ No newline at end of file
+    """Pipeline completo: descarga + transcribe + análisis + clips.
+
+    Cada etapa se ejecuta como tarea propia en la cola de su clase de recurso
+    (ver app.tasks.pipeline); el id de esta tarea pasa a la última de la cadena.
+    """
+    from app.tasks.pipeline import build_clips_pipeline
+    
+    LOG.info(f"Starting complete VOD processing with clips for job {job_id}")
+    self.update_state(state='PROGRESS', meta={'status': 'started', 'current': 0, 'total': 4, 'job_id': job_id})
+    publish_progress(job_id, 'pipeline', step='started', current=0, total=4)
+    return self.replace(build_clips_pipeline(
+        job_id, source_url, user_id, max_clips, caption_mode=caption_mode, ingest_mode=ingest_mode
+    ))
@@ -0,0 +1,11 @@
+from app.celery_app import celery
+from app.services.scheduler import JobScheduler
+import logging
+
+LOG = logging.getLogger(__name__)
+
+@celery.task
+def release_scheduled_job(ticket: str):
+    """Callback (link y link_error) de todo job despachado por el scheduler"""
+    LOG.info(f"Releasing scheduled job {ticket}")
+    JobScheduler().release(ticket)
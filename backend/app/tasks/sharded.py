@@ -0,0 +1,335 @@
+from celery import chord, group
+from app.celery_app import celery
+from app.services.audio_analyzer import AudioAnalyzer
+from app.services.minio_client import get_minio_client
+from app.services.progress import publish_progress
+from app.services.redis_client import get_redis_client
+from app.services.segment_selection import DEFAULT_MAX_OVERLAP, DEFAULT_MIN_GAP
+from app.services.wav_io import read_wav_info_from_minio, read_wav_frames_from_minio, pcm16_to_wav_bytes
+from app.services.whisper_client import transcribe_audio_from_minio
+from app.services.visual_activity import load_visual_activity
+from app.services.segment_table import SegmentTable, save_segment_table, load_segment_table
+from app.services.analysis_store import save_analysis_result
+from app.tasks.analyze_audio import ANALYSIS_TOP_N, candidate_mask
+from app.tasks.process_vod import save_transcript, index_job_transcript
+from app.tasks.signatures import PROCESS_VOD_WITH_CLIPS_SHARDED, DEFAULT_SHARD_SECONDS
+import io
+import json
+import logging
+import time
+
+LOG = logging.getLogger(__name__)
+
+# Solape de audio extra de cada shard para Whisper
+DEFAULT_TRANSCRIPTION_OVERLAP = 15.0
+
+def plan_window_shards(num_windows: int, windows_per_shard: int) -> list[tuple[int, int]]:
+    """Reparte la rejilla global de ventanas en rangos [first, last) contiguos"""
+    return [
+        (first, min(first + windows_per_shard, num_windows))
+        for first in range(0, num_windows, windows_per_shard)
+    ]
+
+def plan_time_shards(duration: float, shard_seconds: float) -> list[tuple[float, float]]:
+    """Divide [0, duration) en núcleos de shard_seconds; el último absorbe el resto"""
+    bounds = []
+    start = 0.0
+    while start < duration:
+        end = start + shard_seconds
+        if duration - end < shard_seconds / 4:
+            end = duration
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+# ===============================
+# ANÁLISIS DE AUDIO (MAP-REDUCE)
+# ===============================
+
+@celery.task(bind=True)
+def analyze_audio_sharded(
+    self,
+    job_id: str,
+    window_size: float = 30.0,
+    step_size: float = 10.0,
+    energy_threshold: float = 0.01,
+    shard_seconds: float = DEFAULT_SHARD_SECONDS,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP
+):
+    """Reparte el análisis en shards temporales y se reemplaza por un chord map-reduce"""
+    bucket = "vods"
+    audio_object = f"{job_id}/audio.wav"
+    info = read_wav_info_from_minio(get_minio_client(), bucket, audio_object)
+
+    analyzer = AudioAnalyzer(window_size=window_size, step_size=step_size)
+    num_windows = analyzer.count_windows(info.num_frames, info.sample_rate)
+    windows_per_shard = max(1, int(shard_seconds // step_size))
+    shards = plan_window_shards(num_windows, windows_per_shard)
+
+    LOG.info(f"Sharded analysis for {job_id}: {num_windows} windows in {len(shards)} shards")
+    get_redis_client().delete(_windows_done_key(job_id))
+    publish_progress(job_id, "analyzing", windows_done=0, windows_total=num_windows, shards_total=len(shards))
+
+    merge = merge_shard_analyses.s(
+        job_id, window_size, step_size, energy_threshold, num_windows, len(shards), time.time(),
+        max_overlap, min_gap
+    )
+    if not shards:
+        return merge_shard_analyses([], *merge.args)
+
+    return self.replace(chord(
+        group(
+            analyze_audio_shard.s(
+                job_id, index, first, last, window_size, step_size, energy_threshold, num_windows,
+                max_overlap, min_gap
+            )
+            for index, (first, last) in enumerate(shards)
+        ),
+        merge
+    ))
+
+def _windows_done_key(job_id: str) -> str:
+    return f"progress:{job_id}:windows_done"
+
+@celery.task(bind=True)
+def analyze_audio_shard(
+    self,
+    job_id: str,
+    shard_index: int,
+    first_window: int,
+    last_window: int,
+    window_size: float,
+    step_size: float,
+    energy_threshold: float,
+    windows_total: int,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP
+):
+    """Map: analiza un rango de ventanas y guarda todos sus candidatos sin suprimir.
+
+    La supresión de solapes es voraz y encadena ventanas vecinas, así que un top-N
+    local seguido de otro global no equivale al análisis de una pasada en los bordes
+    de shard. Los candidatos van a MinIO como tabla binaria (el backend de Celery
+    solo lleva el nombre del objeto) y el reduce aplica la supresión una vez.
+    """
+    client = get_minio_client()
+    visual_activity = load_visual_activity(client, "vods", job_id)
+    analyzer = AudioAnalyzer(window_size=window_size, step_size=step_size, visual_activity=visual_activity)
+    segments = analyzer.analyze_windows_from_minio("vods", f"{job_id}/audio.wav", first_window, last_window)
+    analyzer.attach_visual_scores(segments)
+    filtered_segments = segments.filter(candidate_mask(segments, energy_threshold))
+    candidates_object = save_segment_table(
+        client, "vods", f"{job_id}/shards/analysis_{shard_index:03d}.npy", filtered_segments
+    )
+
+    redis_client = get_redis_client()
+    windows_done = redis_client.incrby(_windows_done_key(job_id), len(segments))
+    redis_client.expire(_windows_done_key(job_id), 24 * 3600)
+    publish_progress(job_id, "analyzing", windows_done=windows_done, windows_total=windows_total)
+
+    LOG.info(f"Shard {shard_index} of {job_id}: windows {first_window}-{last_window}, {len(filtered_segments)} candidates")
+    return {
+        "shard_index": shard_index,
+        "total_segments": len(segments),
+        "filtered_segments": len(filtered_segments),
+        "candidates_object": candidates_object
+    }
+
+@celery.task(bind=True)
+def merge_shard_analyses(
+    self,
+    shard_results: list,
+    job_id: str,
+    window_size: float,
+    step_size: float,
+    energy_threshold: float,
+    num_windows: int,
+    shards_count: int,
+    started_at: float,
+    max_overlap: float = DEFAULT_MAX_OVERLAP,
+    min_gap: float = DEFAULT_MIN_GAP
+):
+    """Reduce: une los candidatos de todos los shards y elige el top-N global.
+
+    Cada ventana de la rejilla global pertenece a un único shard (el que contiene
+    su inicio), así que las ventanas que cruzan bordes no aparecen duplicadas y
+    una única supresión de solapes da el mismo resultado que el análisis sin shards.
+    """
+    client = get_minio_client()
+    shard_results = sorted(shard_results, key=lambda r: r["shard_index"])
+    candidates = SegmentTable.concatenate([
+        load_segment_table(client, "vods", result["candidates_object"]) for result in shard_results
+    ])
+    analyzer = AudioAnalyzer(window_size=window_size, step_size=step_size)
+    top_segments = analyzer.rank_segments_by_energy(
+        candidates, top_n=ANALYSIS_TOP_N, max_overlap=max_overlap, min_gap=min_gap
+    )
+
+    analysis_result = {
+        "job_id": job_id,
+        "total_segments": sum(r["total_segments"] for r in shard_results),
+        "filtered_segments": sum(r["filtered_segments"] for r in shard_results),
+        "top_segments": len(top_segments),
+        "analysis_duration": time.time() - started_at,
+        "parameters": {
+            "window_size": window_size,
+            "step_size": step_size,
+            "energy_threshold": energy_threshold,
+            "max_overlap": max_overlap,
+            "min_gap": min_gap,
+            "shards": shards_count
+        }
+    }
+    save_analysis_result(job_id, analysis_result, top_segments)
+    for result in shard_results:
+        client.remove_object("vods", result["candidates_object"])
+    get_redis_client().delete(_windows_done_key(job_id))
+    publish_progress(job_id, "analyzing", windows_done=num_windows, windows_total=num_windows)
+
+    LOG.info(f"Sharded analysis merged for {job_id}: {len(top_segments)} segments from {shards_count} shards")
+    return analysis_result
+
+# ===============================
+# TRANSCRIPCIÓN (MAP-REDUCE)
+# ===============================
+
+@celery.task(bind=True)
+def transcribe_vod_audio_sharded(
+    self,
+    job_id: str,
+    shard_seconds: float = DEFAULT_SHARD_SECONDS,
+    overlap_seconds: float = DEFAULT_TRANSCRIPTION_OVERLAP
+):
+    """Transcribe el audio por shards en paralelo y se reemplaza por un chord map-reduce"""
+    info = read_wav_info_from_minio(get_minio_client(), "vods", f"{job_id}/audio.wav")
+    shards = plan_time_shards(info.duration, shard_seconds)
+    LOG.info(f"Sharded transcription for {job_id}: {len(shards)} shards")
+    publish_progress(job_id, "transcribing", percent=0.0, shards_total=len(shards))
+
+    return self.replace(chord(
+        group(
+            transcribe_audio_shard.s(job_id, index, core_start, core_end, overlap_seconds, index == len(shards) - 1)
+            for index, (core_start, core_end) in enumerate(shards)
+        ),
+        merge_shard_transcripts.s(job_id)
+    ))
+
+@celery.task(bind=True)
+def transcribe_audio_shard(
+    self,
+    job_id: str,
+    shard_index: int,
+    core_start: float,
+    core_end: float,
+    overlap_seconds: float,
+    is_last: bool
+):
+    """Map: transcribe [core_start - overlap, core_end + overlap) y conserva solo
+    los segmentos que empiezan dentro del núcleo del shard."""
+    client = get_minio_client()
+    bucket = "vods"
+    audio_object = f"{job_id}/audio.wav"
+    info = read_wav_info_from_minio(client, bucket, audio_object)
+
+    start = max(0.0, core_start - overlap_seconds)
+    end = min(info.duration, core_end + overlap_seconds)
+    pcm = read_wav_frames_from_minio(
+        client, bucket, audio_object, info, int(start * info.sample_rate), int(end * info.sample_rate)
+    )
+    wav_bytes = pcm16_to_wav_bytes(pcm, info)
+
+    shard_audio_object = f"{job_id}/shards/audio_{shard_index:03d}.wav"
+    client.put_object(bucket, shard_audio_object, io.BytesIO(wav_bytes), length=len(wav_bytes), content_type="audio/wav")
+    try:
+        transcription = transcribe_audio_from_minio(bucket, shard_audio_object)
+    finally:
+        client.remove_object(bucket, shard_audio_object)
+
+    segments = []
+    for segment in transcription["segments"]:
+        segment = dict(segment)
+        segment["start"] += start
+        segment["end"] += start
+        if "words" in segment:
+            segment["words"] = [
+                {**word, "start": word["start"] + start, "end": word["end"] + start}
+                for word in segment["words"]
+            ]
+        if core_start <= segment["start"] and (is_last or segment["start"] < core_end):
+            segments.append(segment)
+
+    payload = json.dumps({
+        "shard_index": shard_index,
+        "language": transcription.get("language"),
+        "segments": segments
+    }).encode("utf-8")
+    shard_transcript_object = f"{job_id}/shards/transcript_{shard_index:03d}.json"
+    client.put_object(bucket, shard_transcript_object, io.BytesIO(payload), length=len(payload), content_type="application/json")
+
+    LOG.info(f"Transcribed shard {shard_index} of {job_id}: {start:.1f}s-{end:.1f}s, {len(segments)} segments kept")
+    return {"shard_index": shard_index, "transcript_obj": shard_transcript_object, "segments_count": len(segments)}
+
+@celery.task(bind=True)
+def merge_shard_transcripts(self, shard_results: list, job_id: str):
+    """Reduce: concatena las transcripciones parciales en transcript.json"""
+    client = get_minio_client()
+    bucket = "vods"
+
+    segments = []
+    language = None
+    for result in sorted(shard_results, key=lambda r: r["shard_index"]):
+        data = client.get_object(bucket, result["transcript_obj"])
+        try:
+            partial = json.loads(data.read().decode("utf-8"))
+        finally:
+            data.close()
+            data.release_conn()
+        language = language or partial.get("language")
+        segments.extend(partial["segments"])
+
+    segments.sort(key=lambda s: s["start"])
+    for index, segment in enumerate(segments):
+        segment["id"] = index
+
+    transcription = {"text": "".join(s.get("text", "") for s in segments), "segments": segments, "language": language}
+    transcript_obj = save_transcript(job_id, transcription, bucket)
+
+    for result in shard_results:
+        client.remove_object(bucket, result["transcript_obj"])
+
+    publish_progress(job_id, "transcribing", percent=100.0, segments_count=len(segments))
+    index_job_transcript.delay(job_id, language)
+    return {
+        "job_id": job_id,
+        "transcript_obj": transcript_obj,
+        "language": language,
+        "segments_count": len(segments)
+    }
+
+# ===============================
+# PIPELINE COMPLETO EN MODO SHARDED
+# ===============================
+
+@celery.task(name=PROCESS_VOD_WITH_CLIPS_SHARDED, bind=True)
+def process_vod_with_clips_sharded(
+    self,
+    job_id: str,
+    source_url: str,
+    user_id: int | None = None,
+    max_clips: int = 10,
+    shard_seconds: float = DEFAULT_SHARD_SECONDS,
+    shard_transcription: bool = False,
+    caption_mode: str = "none",
+    ingest_mode: str = "full"
+):
+    """Pipeline completo con análisis (y opcionalmente transcripción) repartidos entre workers"""
+    from app.tasks.pipeline import build_clips_pipeline
+
+    LOG.info(f"Starting sharded VOD processing with clips for job {job_id}")
+    publish_progress(job_id, 'pipeline', step='started', current=0, total=4)
+    return self.replace(build_clips_pipeline(
+        job_id, source_url, user_id, max_clips,
+        sharded=True, shard_seconds=shard_seconds, shard_transcription=shard_transcription,
+        caption_mode=caption_mode, ingest_mode=ingest_mode
+    ))
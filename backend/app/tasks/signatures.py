@@ -0,0 +1,24 @@
+"""Firmas de las tareas que la API encola: nombre registrado en Celery y defaults.
+
+La API despacha por nombre (JobScheduler -> celery.send_task) y no importa los
+módulos de tareas, que cargan las dependencias de análisis, encoding y ASR. Cada
+tarea se registra con el nombre de aquí, así que un cambio de módulo no rompe el
+despacho.
+"""
+
+DOWNLOAD_AND_EXTRACT_AUDIO = "app.tasks.process_vod.download_and_extract_audio"
+DOWNLOAD_FULL_VIDEO = "app.tasks.process_vod.download_full_video"
+TRANSCRIBE_VOD_AUDIO = "app.tasks.process_vod.transcribe_vod_audio"
+PROCESS_VOD_COMPLETE = "app.tasks.process_vod.process_vod_complete"
+PROCESS_VOD_WITH_CLIPS = "app.tasks.process_vod.process_vod_with_clips"
+PROCESS_VOD_WITH_CLIPS_SHARDED = "app.tasks.sharded.process_vod_with_clips_sharded"
+ANALYZE_AUDIO_SEGMENTS = "app.tasks.analyze_audio.analyze_audio_segments"
+GENERATE_CLIPS = "app.tasks.analyze_audio.generate_clips_task"
+GENERATE_WINDOW_CLIP = "app.tasks.analyze_audio.generate_window_clip_task"
+START_LIVE_INGEST = "app.tasks.live.start_live_ingest"
+# Callbacks que el scheduler enlaza a los jobs de la API que no publican su propio final
+JOB_COMPLETED = "app.tasks.pipeline.job_completed"
+JOB_FAILED = "app.tasks.pipeline.job_failed"
+
+# Duración del núcleo de cada shard del pipeline fragmentado
+DEFAULT_SHARD_SECONDS = 1800.0
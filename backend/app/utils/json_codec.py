@@ -0,0 +1,41 @@
+import orjson
+import numpy as np
+
+# Tipos numpy (arrays y escalares), dataclasses y datetimes se codifican en C sin recorrer el objeto
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+CELERY_CONTENT_TYPE = "application/x-orjson"
+
+
+def _default(obj):
+    """Lo que orjson no conoce: arrays no contiguos, tablas/filas de segmentos, objetos simples"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "to_dicts"):
+        return obj.to_dicts()
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if hasattr(obj, "__dict__"):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+    options = JSON_OPTIONS
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    if sort_keys:
+        options |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=_default, option=options)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+def register_celery_serializer():
+    """Registra "orjson" en kombu para mensajes y resultados de Celery"""
+    from kombu.serialization import register
+    register("orjson", dumps, loads, content_type=CELERY_CONTENT_TYPE, content_encoding="binary")
+
@@ -0,0 +1,29 @@
+"""Arranca un worker de Celery para una clase de recurso.
+
+Uso: python -m app.worker <vod|io|encode|analysis|asr> [opciones extra de celery worker]
+"""
+import sys
+from app.celery_app import celery, DEFAULT_WORKER_CLASSES, worker_class_settings
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in DEFAULT_WORKER_CLASSES:
+        sys.exit(f"usage: python -m app.worker <{'|'.join(DEFAULT_WORKER_CLASSES)}> [celery worker options]")
+
+    name, extra = argv[0], argv[1:]
+    settings = worker_class_settings(name)
+    celery.worker_main([
+        "worker",
+        "--loglevel=info",
+        "-Q", ",".join(settings["queues"]),
+        "-P", settings["pool"],
+        "--concurrency", str(settings["concurrency"]),
+        "--prefetch-multiplier", str(settings["prefetch"]),
+        "-n", f"{name}@%h",
+        *extra,
+    ])
+
+
+if __name__ == "__main__":
+    main()
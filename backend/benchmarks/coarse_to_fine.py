@@ -0,0 +1,63 @@
+"""Compara el análisis exhaustivo con la búsqueda coarse-to-fine sobre audio sintético.
+
+Uso (desde backend/):
+    python -m benchmarks.coarse_to_fine --minutes 60 --top-n 10
+
+Mide el tiempo de cada método y el solape del top-N: fracción de los segmentos del
+análisis exhaustivo que tienen un segmento coarse-to-fine con IoU >= --iou.
+"""
+import argparse
+import time
+import numpy as np
+from app.services.audio_analyzer import AudioAnalyzer, DEFAULT_REFINE_STEP
+from app.services.segment_selection import temporal_iou
+
+
+def synthetic_vod(minutes: float, sr: int, events: int, seed: int) -> np.ndarray:
+    """Ruido de fondo con ráfagas de energía de duración y volumen aleatorios"""
+    rng = np.random.default_rng(seed)
+    y = rng.normal(scale=0.02, size=int(minutes * 60 * sr)).astype(np.float32)
+    for _ in range(events):
+        length = int(rng.uniform(5, 40) * sr)
+        start = rng.integers(0, len(y) - length)
+        tone = np.sin(2 * np.pi * rng.uniform(200, 2000) * np.arange(length) / sr).astype(np.float32)
+        y[start:start + length] += rng.uniform(0.1, 0.6) * tone + rng.normal(scale=0.1, size=length).astype(np.float32)
+    return np.clip(y, -1.0, 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=30.0)
+    parser.add_argument("--sr", type=int, default=16000)
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--window", type=float, default=30.0)
+    parser.add_argument("--refine-step", type=float, default=DEFAULT_REFINE_STEP)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    y = synthetic_vod(args.minutes, args.sr, args.events, args.seed)
+    print(f"Synthetic VOD: {args.minutes:.0f} min at {args.sr} Hz, {args.events} events")
+
+    exhaustive = AudioAnalyzer(window_size=args.window, step_size=args.refine_step)
+    started = time.perf_counter()
+    reference = exhaustive.rank_segments_by_energy(exhaustive._create_sliding_windows(y, args.sr), args.top_n)
+    exhaustive_time = time.perf_counter() - started
+
+    analyzer = AudioAnalyzer(window_size=args.window)
+    started = time.perf_counter()
+    found, stats = analyzer.coarse_to_fine_segments(
+        lambda start, end: y[start:end], len(y), args.sr, args.top_n, args.refine_step
+    )
+    coarse_time = time.perf_counter() - started
+
+    matched = sum(1 for ref in reference if any(temporal_iou(ref, seg) >= args.iou for seg in found))
+    print(f"exhaustive:     {exhaustive_time:8.2f}s")
+    print(f"coarse-to-fine: {coarse_time:8.2f}s  ({exhaustive_time / max(coarse_time, 1e-9):.1f}x faster)")
+    print(f"refined audio:  {stats['refined_seconds']:.0f}s of {len(y) / args.sr:.0f}s in {stats['candidates']} candidates")
+    print(f"top-{args.top_n} overlap: {matched}/{len(reference)} (IoU >= {args.iou})")
+
+
+if __name__ == "__main__":
+    main()
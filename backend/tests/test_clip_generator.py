@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+from app.services.clip_generator import ClipGenerator
+
+
+@dataclass
+class Segment:
+    start_time: float
+    end_time: float
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+
+def _unbounded_outputs(cmd, outputs):
+    """Salidas que ffmpeg escribiría hasta el final de la fuente"""
+    input_index = cmd.index("-i")
+    if "-t" in cmd[:input_index]:
+        return []
+    unbounded, previous = [], input_index + 1
+    for output in outputs:
+        index = cmd.index(output)
+        if not {"-t", "-frames:v"} & set(cmd[previous:index]):
+            unbounded.append(output)
+        previous = index + 1
+    return unbounded
+
+
+def test_caption_both_outputs_are_bounded():
+    segment = Segment(600.0, 630.0)
+    cmd = ClipGenerator(caption_mode="both")._build_ffmpeg_command(
+        segment, "input.mp4", "clean.mp4", "captioned.mp4", "captions.srt", source_offset=0.0
+    )
+    assert cmd[cmd.index("-t") + 1] == str(segment.duration)
+    assert _unbounded_outputs(cmd, ["clean.mp4", "captioned.mp4"]) == []
+
+
+def test_preview_outputs_are_bounded():
+    segment = Segment(600.0, 630.0)
+    previews = {"preview": "preview.mp4", "poster": "poster.jpg", "sprite": "sprite.jpg"}
+    cmd = ClipGenerator()._build_ffmpeg_command(
+        segment, "section.mp4", "clean.mp4", None, None, source_offset=590.0, preview_paths=previews
+    )
+    assert cmd[cmd.index("-ss") + 1] == "10.0"
+    assert _unbounded_outputs(cmd, ["clean.mp4", *previews.values()]) == []
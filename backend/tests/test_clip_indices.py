@@ -0,0 +1,30 @@
+from app.tasks import analyze_audio
+from app.tasks.analyze_audio import _analysis_clip_indices, _clip_objects
+
+
+def _clip(index, origin="analysis"):
+    return {
+        "clip_index": index, "origin": origin,
+        "object_name": f"job/renders/r{index}.mp4", "srt_object": f"job/clips/clip_{index:02d}.srt",
+        "assets": {"poster": f"job/renders/r{index}.jpg"},
+    }
+
+
+def test_rerender_reuses_previous_analysis_indices(monkeypatch):
+    monkeypatch.setattr(analyze_audio, "_reserve_clip_index", lambda *args: (_ for _ in ()).throw(AssertionError))
+    previous = [_clip(i) for i in range(10)]
+    existing = {"clips": previous + [_clip(10, origin="search")]}
+    assert _analysis_clip_indices("job", existing, previous, 10) == list(range(10))
+    assert _analysis_clip_indices("job", existing, previous, 4) == [0, 1, 2, 3]
+
+
+def test_rerender_reserves_only_missing_indices(monkeypatch):
+    reserved = []
+    monkeypatch.setattr(analyze_audio, "_reserve_clip_index", lambda job_id, existing, count: reserved.append(count) or 11)
+    previous = [_clip(0), _clip(1)]
+    assert _analysis_clip_indices("job", {"clips": previous}, previous, 4) == [0, 1, 11, 12]
+    assert reserved == [2]
+
+
+def test_clip_objects_cover_renders_subtitles_and_assets():
+    assert _clip_objects(_clip(3)) == {"job/renders/r3.mp4", "job/clips/clip_03.srt", "job/renders/r3.jpg"}
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+import numpy as np
+from app.services.segment_selection import select_top_segments, select_top_indices
+
+
+@dataclass
+class Window:
+    start_time: float
+    end_time: float
+    composite_score: float
+
+
+def test_keeps_candidate_within_max_overlap():
+    # IoU 5/55 ≈ 0.09
+    best, overlapping = Window(0.0, 30.0, 1.0), Window(25.0, 55.0, 0.9)
+    for max_overlap in (0.1, 0.5):
+        assert select_top_segments([best, overlapping], 2, max_overlap=max_overlap) == [best, overlapping]
+
+
+def test_suppresses_candidate_over_max_overlap():
+    best, overlapping = Window(0.0, 30.0, 1.0), Window(10.0, 40.0, 0.9)
+    assert select_top_segments([best, overlapping], 2, max_overlap=0.1) == [best]
+
+
+def test_min_gap_only_separates_disjoint_windows():
+    best = Window(0.0, 30.0, 1.0)
+    close, overlapping, far = Window(32.0, 62.0, 0.9), Window(28.0, 58.0, 0.8), Window(40.0, 70.0, 0.7)
+    selected = select_top_segments([best, close, overlapping, far], 3, max_overlap=0.1, min_gap=5.0)
+    assert selected == [best, overlapping]
+
+
+def test_matches_nlargest_at_full_overlap():
+    windows = [Window(0.0, 30.0, 1.0), Window(10.0, 40.0, 0.9), Window(20.0, 50.0, 0.8)]
+    assert select_top_segments(windows, 3, max_overlap=1.0) == windows
+    assert select_top_segments(windows, 3, max_overlap=0.999) == windows
+
+
+def test_select_top_indices_matches_select_top_segments():
+    rng = np.random.default_rng(0)
+    starts = np.sort(rng.uniform(0, 600, 200))
+    ends = starts + rng.uniform(5, 40, 200)
+    scores = rng.uniform(0, 1, 200)
+    windows = [Window(float(s), float(e), float(c)) for s, e, c in zip(starts, ends, scores)]
+    for max_overlap, min_gap in ((0.1, 0.0), (0.5, 0.0), (0.1, 5.0), (1.0, 0.0)):
+        indices = select_top_indices(starts, ends, scores, 10, max_overlap=max_overlap, min_gap=min_gap)
+        expected = select_top_segments(windows, 10, max_overlap=max_overlap, min_gap=min_gap)
+        assert [windows[i] for i in indices] == expected
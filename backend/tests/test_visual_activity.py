@@ -0,0 +1,25 @@
+import numpy as np
+from app.services.audio_features import composite_score
+from app.services.visual_activity import VISUAL_WEIGHT, activity_percentiles
+
+
+def test_percentiles_are_relative_to_the_vod():
+    calm = np.array([0.01, 0.02, 0.03, 0.04], dtype=np.float32)
+    busy = calm + 0.5
+    np.testing.assert_allclose(activity_percentiles(calm), [0.0, 0.25, 0.5, 0.75])
+    np.testing.assert_allclose(activity_percentiles(busy), activity_percentiles(calm))
+
+
+def test_percentiles_are_idempotent_and_constant_series_is_zero():
+    series = np.array([0.3, 0.1, 0.3, 0.9], dtype=np.float32)
+    once = activity_percentiles(series)
+    np.testing.assert_array_equal(activity_percentiles(once), once)
+    assert not activity_percentiles(np.full(5, 0.4, dtype=np.float32)).any()
+
+
+def test_visual_term_does_not_override_a_louder_moment():
+    # Grito claro sin movimiento frente a momento tranquilo en el segundo más movido del VOD
+    loud = composite_score(0.15, 0.3, 2000.0, 0.0)
+    busy = composite_score(0.05, 0.1, 2000.0, 1.0)
+    assert loud > busy
+    assert composite_score(0.05, 0.1, 2000.0, 1.0) - composite_score(0.05, 0.1, 2000.0, 0.0) <= VISUAL_WEIGHT + 1e-9
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useRouter } from 'next/router';
 import axios from 'axios';
 
@@ -29,6 +29,89 @@ const formatTime = (seconds) => {
   return `${mins}:${secs.toString().padStart(2, '0')}`;
 };
 
+// Assets ligeros de preview (proxy, póster, sprite, pista de miniaturas); null en clips antiguos
+const assetUrl = (jobId, clip, asset) =>
+  clip?.assets ? `${API_BASE}/clips/${jobId}/assets/${clip.clip_index}/${asset}` : null;
+
+const parseVttTime = (value) => {
+  const [h, m, s] = value.split(':');
+  return Number(h) * 3600 + Number(m) * 60 + Number(s);
+};
+
+// Cues "inicio --> fin" + "sprite#xywh=x,y,w,h" de la pista de miniaturas
+const parseThumbnailTrack = (text) => {
+  const cues = [];
+  const lines = text.split('\n');
+  for (let i = 0; i < lines.length - 1; i += 1) {
+    if (!lines[i].includes('-->')) continue;
+    const [start, end] = lines[i].split('-->').map(t => parseVttTime(t.trim()));
+    const [, xywh] = lines[i + 1].split('#xywh=');
+    if (!xywh) continue;
+    const [x, y, w, h] = xywh.split(',').map(Number);
+    cues.push({ start, end, x, y, w, h });
+  }
+  return cues;
+};
+
+// Póster del clip; al pasar el ratón recorre el sprite (la pista se pide solo al primer hover)
+function SpriteScrubber({ jobId, clip }) {
+  const [cues, setCues] = useState(null);
+  const [cue, setCue] = useState(null);
+  const [scale, setScale] = useState(1);
+  const loading = useRef(false);
+
+  const loadCues = async () => {
+    if (cues || loading.current) return;
+    loading.current = true;
+    try {
+      const response = await axios.get(assetUrl(jobId, clip, 'thumbnails'), { responseType: 'text' });
+      setCues(parseThumbnailTrack(response.data));
+    } catch (err) {
+      setCues([]);
+    }
+  };
+
+  const onMove = (event) => {
+    if (!cues || cues.length === 0) return;
+    const rect = event.currentTarget.getBoundingClientRect();
+    const time = ((event.clientX - rect.left) / rect.width) * Number(clip.duration);
+    const next = cues.find(c => time >= c.start && time < c.end) ?? cues[cues.length - 1];
+    // La celda del sprite es pequeña: se escala para cubrir la tarjeta
+    setScale(Math.max(rect.width / next.w, rect.height / next.h));
+    setCue(next);
+  };
+
+  return (
+    <div
+      className="absolute inset-0 overflow-hidden rounded-t-lg"
+      onMouseEnter={loadCues}
+      onMouseMove={onMove}
+      onMouseLeave={() => setCue(null)}
+    >
+      {cue ? (
+        <div
+          style={{
+            backgroundImage: `url(${assetUrl(jobId, clip, 'sprite')})`,
+            backgroundPosition: `-${cue.x}px -${cue.y}px`,
+            backgroundRepeat: 'no-repeat',
+            width: cue.w,
+            height: cue.h,
+            transform: `scale(${scale})`,
+            transformOrigin: 'top left',
+          }}
+        />
+      ) : (
+        <img
+          src={assetUrl(jobId, clip, 'poster')}
+          alt={`Clip ${clip.clip_index + 1}`}
+          loading="lazy"
+          className="w-full h-full object-cover"
+        />
+      )}
+    </div>
+  );
+}
+
 export default function ClipsPage() {
   const router = useRouter();
   const { jobId } = router.query;
@@ -37,6 +120,7 @@ export default function ClipsPage() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedClip, setSelectedClip] = useState(null);
+  const [publication, setPublication] = useState({ completed: true, clipsExpected: 0 });
 
   useEffect(() => {
     if (jobId) {
@@ -46,8 +130,21 @@ export default function ClipsPage() {
     }
   }, [jobId]);
 
-  const fetchClips = async () => {
-    setLoading(true);
+  // Mientras el job siga publicando clips, refrescar la lista con cada evento
+  useEffect(() => {
+    if (!jobId || publication.completed || typeof window === 'undefined' || !window.EventSource) return undefined;
+    const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (['clip_ready', 'completed', 'failed'].includes(event.stage)) {
+        fetchClips({ silent: true });
+      }
+    };
+    return () => source.close();
+  }, [jobId, publication.completed]);
+
+  const fetchClips = async ({ silent = false } = {}) => {
+    if (!silent) setLoading(true);
     try {
       const response = await axios.get(`${API_BASE}/clips/${jobId}`);
       const fetchedClips = (response.data.clips || []).map(c => ({
@@ -57,13 +154,17 @@ export default function ClipsPage() {
           : null,
       }));
       setClips(fetchedClips);
+      setPublication({
+        completed: response.data.completed !== false,
+        clipsExpected: response.data.clips_expected ?? fetchedClips.length,
+      });
       if (fetchedClips.length > 0) {
-        setSelectedClip(fetchedClips[0]);
+        setSelectedClip(prev => prev ?? fetchedClips[0]);
       }
     } catch (err) {
-      setError(err.response?.data?.detail || 'Failed to load clips');
+      if (!silent) setError(err.response?.data?.detail || 'Failed to load clips');
     } finally {
-      setLoading(false);
+      if (!silent) setLoading(false);
     }
   };
 
@@ -85,6 +186,11 @@ export default function ClipsPage() {
           <p className="text-text-secondary">
             Job ID: <span className="font-mono text-primary/80">{jobId}</span>
           </p>
+          {!publication.completed && (
+            <p className="text-sm text-primary mt-2">
+              Rendering in progress: {clips.length} of {publication.clipsExpected} clips ready
+            </p>
+          )}
         </div>
 
         {clips.length === 0 ? (
@@ -110,9 +216,13 @@ export default function ClipsPage() {
                     }`}
                   >
                     <div className="relative h-40 bg-background rounded-t-lg flex items-center justify-center">
-                      <svg xmlns="http://www.w3.org/2000/svg" className="h-12 w-12 text-secondary" viewBox="0 0 20 20" fill="currentColor">
-                        <path fillRule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM9.555 7.168A1 1 0 008 8v4a1 1 0 001.555.832l3-2a1 1 0 000-1.664l-3-2z" clipRule="evenodd" />
-                      </svg>
+                      {clip.assets ? (
+                        <SpriteScrubber jobId={jobId} clip={clip} />
+                      ) : (
+                        <svg xmlns="http://www.w3.org/2000/svg" className="h-12 w-12 text-secondary" viewBox="0 0 20 20" fill="currentColor">
+                          <path fillRule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM9.555 7.168A1 1 0 008 8v4a1 1 0 001.555.832l3-2a1 1 0 000-1.664l-3-2z" clipRule="evenodd" />
+                        </svg>
+                      )}
                       <span className="absolute bottom-2 right-2 bg-black/50 text-white text-xs px-2 py-1 rounded">
                         {formatTime(clip.start_time)} - {formatTime(clip.end_time)}
                       </span>
@@ -138,10 +248,27 @@ export default function ClipsPage() {
                     Clip {selectedClip.clip_index + 1}
                   </h2>
                   
-                  {/* Mock Video Player */}
-                  <div className="aspect-video bg-black rounded-lg mb-4 flex items-center justify-center">
-                    <p className="text-text-secondary">Video Preview</p>
-                  </div>
+                  {/* Reproductor sobre el proxy de preview; el MP4 completo solo se baja con Download */}
+                  {selectedClip.assets ? (
+                    <video
+                      key={selectedClip.clip_index}
+                      className="aspect-video w-full bg-black rounded-lg mb-4"
+                      controls
+                      preload="metadata"
+                      poster={assetUrl(jobId, selectedClip, 'poster')}
+                      src={assetUrl(jobId, selectedClip, 'preview')}
+                      crossOrigin="anonymous"
+                    >
+                      {selectedClip.vtt_object && (
+                        <track kind="subtitles" label="Subtitles" src={`${API_BASE}/clips/${jobId}/vtt/${selectedClip.clip_index}`} default />
+                      )}
+                      <track kind="metadata" label="thumbnails" src={assetUrl(jobId, selectedClip, 'thumbnails')} />
+                    </video>
+                  ) : (
+                    <div className="aspect-video bg-black rounded-lg mb-4 flex items-center justify-center">
+                      <p className="text-text-secondary">Video Preview</p>
+                    </div>
+                  )}
 
                   {/* Stats */}
                   <div className="space-y-3 text-sm mb-6">
@@ -173,6 +300,14 @@ export default function ClipsPage() {
                     >
                       Download Clip (MP4)
                     </button>
+                    {selectedClip.captioned_object && (
+                      <button 
+                        onClick={() => window.open(`${API_BASE}/clips/${jobId}/download/${selectedClip.clip_index}?captioned=true`, '_blank')} 
+                        className="w-full text-center py-3 bg-secondary hover:bg-primary/50 text-text-main font-semibold rounded-lg transition-colors"
+                      >
+                        Download Clip with Captions (MP4)
+                      </button>
+                    )}
                     {selectedClip.has_srt && (
                       <button 
                         onClick={() => window.open(`${API_BASE}/clips/${jobId}/srt/${selectedClip.clip_index}`, '_blank')} 
@@ -204,7 +339,7 @@ export default function ClipsPage() {
                     View Full Transcript
                   </button>
                   <button 
-                    onClick={() => clips.forEach(c => setTimeout(() => window.open(`${API_BASE}/clips/${jobId}/download/${c.clip_index}`, '_blank'), c.clip_index * 300))} 
+                    onClick={() => window.open(`${API_BASE}/clips/${jobId}/bundle?format=zip`, '_blank')} 
                     className="py-3 bg-primary/80 hover:bg-primary text-white font-semibold rounded-lg transition-colors"
                   >
                     Download All Clips
@@ -31,7 +31,12 @@ export default function Dashboard() {
       setResult(response.data);
       setJobId(response.data.job_id);
       setTaskId(response.data.task_id);
-      startProgressPolling(response.data.task_id, response.data.job_id);
+      const queue = response.data.queue;
+      if (queue?.state === 'queued') {
+        const minutes = Math.ceil(queue.estimated_start_in / 60);
+        setProgress({ state: 'QUEUED', status: `Queued: position ${queue.position}, starts in ~${minutes} min`, percent: 0 });
+      }
+      startProgressStream(response.data.task_id, response.data.job_id);
     } catch (err) {
       setError(err.response?.data?.detail || 'Processing failed to start');
       setLoading(false);
@@ -39,6 +44,93 @@ export default function Dashboard() {
     }
   };
 
+  // Traduce un evento de progreso del backend a estado de la UI
+  const STEP_WEIGHTS = { downloading: [0, 35], transcribing: [35, 65], analyzing: [65, 75], generating_clips: [75, 100] };
+
+  const formatMB = (bytes) => (Number.isFinite(Number(bytes)) ? (bytes / (1024 * 1024)).toFixed(1) : '?');
+
+  const applyProgressEvent = (event, currentJobId) => {
+    setProgress(prev => {
+      const next = { ...(prev || {}), state: 'PROGRESS' };
+      const stepPercent = (step, fraction) => {
+        const [from, to] = STEP_WEIGHTS[step] || [0, 0];
+        return from + (to - from) * Math.min(Math.max(fraction, 0), 1);
+      };
+
+      switch (event.stage) {
+        case 'pipeline':
+          next.status = `Step ${event.current}/${event.total}: ${event.step.replace('_', ' ')}`;
+          if (STEP_WEIGHTS[event.step]) next.percent = Math.max(next.percent || 0, stepPercent(event.step, 0));
+          break;
+        case 'downloading':
+          next.status = `Downloading ${formatMB(event.downloaded_bytes)} / ${formatMB(event.total_bytes)} MB`;
+          if (event.percent != null) next.percent = stepPercent('downloading', event.percent / 100);
+          break;
+        case 'transcribing':
+          next.status = `Transcribing... ${event.percent ?? 0}%`;
+          next.percent = stepPercent('transcribing', (event.percent ?? 0) / 100);
+          break;
+        case 'analyzing':
+          next.status = `Analyzing audio windows ${event.windows_done}/${event.windows_total}`;
+          next.percent = stepPercent('analyzing', event.windows_done / event.windows_total);
+          break;
+        case 'clip_ready': {
+          const clipsReady = new Set([...(prev?.clipsReady || []), event.clip.clip_index]);
+          next.clipsReady = [...clipsReady];
+          next.status = `Clip ${clipsReady.size}/${event.clips_total} ready`;
+          next.percent = stepPercent('generating_clips', clipsReady.size / event.clips_total);
+          break;
+        }
+        case 'completed':
+          next.state = 'SUCCESS';
+          next.status = 'Completed! Redirecting...';
+          next.percent = 100;
+          break;
+        case 'failed':
+          next.state = 'FAILURE';
+          next.status = event.error || 'Processing failed';
+          break;
+        default:
+          break;
+      }
+      return next;
+    });
+
+    if (event.stage === 'completed') {
+      setLoading(false);
+      setTimeout(() => router.push(`/clips/${currentJobId}`), 2000);
+    } else if (event.stage === 'failed') {
+      setLoading(false);
+      setError(event.error || 'Processing failed');
+    }
+  };
+
+  // Progreso empujado por el servidor (SSE); si no está disponible se vuelve al polling
+  const startProgressStream = (currentTaskId, currentJobId) => {
+    if (typeof window === 'undefined' || !window.EventSource) {
+      startProgressPolling(currentTaskId, currentJobId);
+      return;
+    }
+    const source = new EventSource(`${API_BASE}/jobs/${currentJobId}/events`);
+    let receivedEvents = false;
+
+    source.onmessage = (message) => {
+      receivedEvents = true;
+      const event = JSON.parse(message.data);
+      applyProgressEvent(event, currentJobId);
+      if (event.stage === 'completed' || event.stage === 'failed') {
+        source.close();
+      }
+    };
+    source.onerror = () => {
+      // EventSource reconecta solo; si nunca llegó a funcionar, usar polling
+      if (!receivedEvents) {
+        source.close();
+        startProgressPolling(currentTaskId, currentJobId);
+      }
+    };
+  };
+
   const startProgressPolling = (currentTaskId, currentJobId) => {
     const pollInterval = setInterval(async () => {
       try {
@@ -128,7 +220,7 @@ export default function Dashboard() {
               </div>
               <p className="text-sm text-text-secondary mb-3">{progress.status}</p>
               <div className="w-full bg-secondary rounded-full h-2.5">
-                <div className={`h-2.5 rounded-full ${progress.state === 'SUCCESS' ? 'bg-green-500' : 'bg-primary'} transition-all duration-500`} style={{ width: progress.state === 'SUCCESS' ? '100%' : '50%' }}></div>
+                <div className={`h-2.5 rounded-full ${progress.state === 'SUCCESS' ? 'bg-green-500' : 'bg-primary'} transition-all duration-500`} style={{ width: progress.state === 'SUCCESS' ? '100%' : `${Math.round(progress.percent ?? 50)}%` }}></div>
               </div>
             </div>
           )}
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions
+from whisper.tokenizer import get_tokenizer
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Ventanas de 30 s (la entrada fija del encoder) por lote: todas pasan juntas por el encoder
+BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", "8"))
+# Mismos umbrales de reintento/silencio que whisper.transcribe
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+BEST_OF = 5
+# Segundos por token de timestamp
+TIME_PRECISION = 0.02
+
+
+@dataclass
+class _Request:
+    """Una transcripción en curso: su audio, ventanas pendientes y resultados por ventana"""
+    request_id: int
+    audio: np.ndarray
+    on_progress: Optional[Callable[[float], None]]
+    future: Future
+    language: Optional[str] = None
+    windows_total: int = 0
+    results: Dict[int, List[dict]] = field(default_factory=dict)
+
+
+@dataclass
+class _Window:
+    request: _Request
+    index: int
+    temperature_index: int = 0
+
+    @property
+    def offset(self) -> float:
+        return self.index * N_SAMPLES / SAMPLE_RATE
+
+    @property
+    def duration(self) -> float:
+        return min(N_SAMPLES, len(self.request.audio) - self.index * N_SAMPLES) / SAMPLE_RATE
+
+
+class InferenceScheduler:
+    """Planificador de inferencia compartido por todas las peticiones del servicio.
+
+    Cada petición trocea su audio en ventanas fijas de 30 s y las encola; un único
+    hilo, dueño del modelo, forma lotes con ventanas de distintas peticiones y los
+    pasa juntos por el encoder y el decoder (whisper.decode acepta un lote de mels).
+    Con varias transcripciones a la vez el modelo trabaja con lotes llenos en lugar
+    de alternar llamadas sueltas.
+
+    Una ventana solo comparte lote con otras del mismo idioma y temperatura (son
+    opciones del lote). La primera ventana de cada petición detecta el idioma y
+    las demás esperan a conocerlo; las que no pasan los umbrales de whisper se
+    reencolan con la siguiente temperatura. Los lotes se llenan por turnos entre
+    peticiones, así que una transcripción larga no retrasa indefinidamente a las demás.
+    """
+
+    def __init__(self, model, batch_size: int = BATCH_SIZE):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.fp16 = model.device != torch.device("cpu")
+        self.condition = threading.Condition()
+        # request_id -> ventanas pendientes, en orden de llegada de las peticiones
+        self.pending: "OrderedDict[int, List[_Window]]" = OrderedDict()
+        self.next_request_id = 0
+        self.thread = threading.Thread(target=self._run, name="whisper-inference", daemon=True)
+        self.thread.start()
+
+    def submit(self, audio: np.ndarray, on_progress: Optional[Callable[[float], None]] = None) -> Future:
+        """Encola el audio (float32, 16 kHz) y devuelve un Future con {"segments", "text", "language"}"""
+        future: Future = Future()
+        with self.condition:
+            request = _Request(self.next_request_id, audio, on_progress, future)
+            self.next_request_id += 1
+            request.windows_total = max(1, -(-len(audio) // N_SAMPLES))
+            self.pending[request.request_id] = [_Window(request, i) for i in range(request.windows_total)]
+            self.condition.notify()
+        return future
+
+    def transcribe(self, audio: np.ndarray, on_progress: Optional[Callable[[float], None]] = None) -> dict:
+        return self.submit(audio, on_progress).result()
+
+    def _ready(self, window: _Window) -> bool:
+        # Hasta conocer el idioma solo puede decodificarse la primera ventana
+        return window.request.language is not None or window.index == 0
+
+    def _next_batch(self) -> List[_Window]:
+        """Ventanas listas del grupo (idioma, temperatura) de la petición más antigua, por turnos"""
+        candidates = {
+            request_id: [w for w in windows if self._ready(w)]
+            for request_id, windows in self.pending.items()
+        }
+        first = next((ready[0] for ready in candidates.values() if ready), None)
+        if first is None:
+            return []
+        key = (first.request.language, first.temperature_index)
+        queues = [
+            [w for w in ready if (w.request.language, w.temperature_index) == key]
+            for ready in candidates.values()
+        ]
+        batch = []
+        while len(batch) < self.batch_size and any(queues):
+            for queue in queues:
+                if queue and len(batch) < self.batch_size:
+                    batch.append(queue.pop(0))
+        for window in batch:
+            windows = self.pending[window.request.request_id]
+            windows.remove(window)
+            if not windows:
+                del self.pending[window.request.request_id]
+        return batch
+
+    def _run(self):
+        while True:
+            with self.condition:
+                batch = self._next_batch()
+                while not batch:
+                    self.condition.wait()
+                    batch = self._next_batch()
+            try:
+                self._decode_batch(batch)
+            except Exception as e:
+                LOG.exception("Batch inference failed: %s", e)
+                self._fail({window.request.request_id: window.request for window in batch}.values(), e)
+
+    def _fail(self, requests, error: Exception):
+        with self.condition:
+            for request in requests:
+                self.pending.pop(request.request_id, None)
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    def _decode_batch(self, batch: List[_Window]):
+        started = time.monotonic()
+        language = batch[0].request.language
+        temperature = TEMPERATURES[batch[0].temperature_index]
+        mel = torch.stack([
+            log_mel_spectrogram(
+                pad_or_trim(w.request.audio[w.index * N_SAMPLES:(w.index + 1) * N_SAMPLES]),
+                self.model.dims.n_mels
+            )
+            for w in batch
+        ]).to(self.model.device)
+        options = DecodingOptions(
+            language=language,
+            temperature=temperature,
+            best_of=BEST_OF if temperature > 0 else None,
+            fp16=self.fp16,
+        )
+        results = whisper.decode(self.model, mel, options)
+        LOG.info(
+            "Decoded batch of %d windows from %d requests (t=%.1f) in %.2fs",
+            len(batch), len({w.request.request_id for w in batch}), temperature, time.monotonic() - started
+        )
+
+        retry = []
+        finished = []
+        for window, result in zip(batch, results):
+            request = window.request
+            if request.future.done():
+                continue
+            if request.language is None:
+                request.language = result.language
+            if self._needs_fallback(result) and window.temperature_index + 1 < len(TEMPERATURES):
+                window.temperature_index += 1
+                retry.append(window)
+                continue
+            request.results[window.index] = self._window_segments(window, result)
+            if request.on_progress:
+                request.on_progress(round(100 * len(request.results) / request.windows_total, 1))
+            if len(request.results) == request.windows_total:
+                finished.append(request)
+
+        with self.condition:
+            for window in retry:
+                self.pending.setdefault(window.request.request_id, []).append(window)
+            self.condition.notify()
+        for request in finished:
+            request.future.set_result(self._assemble(request))
+
+    @staticmethod
+    def _needs_fallback(result) -> bool:
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return False  # silencio: no se reintenta
+        return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+    def _window_segments(self, window: _Window, result) -> List[dict]:
+        """Segmentos con tiempos absolutos a partir de los tokens de timestamp de la ventana"""
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return []
+        tokenizer = get_tokenizer(
+            self.model.is_multilingual, num_languages=self.model.num_languages,
+            language=result.language, task="transcribe"
+        )
+        timestamp_begin = tokenizer.timestamp_begin
+        segments = []
+        start = None
+        text_tokens: List[int] = []
+        for token in result.tokens:
+            if token < timestamp_begin:
+                text_tokens.append(token)
+                continue
+            position = (token - timestamp_begin) * TIME_PRECISION
+            if text_tokens and start is not None:
+                segments.append((start, position, text_tokens))
+                text_tokens = []
+                start = None
+            else:
+                start = position
+        if text_tokens:
+            # Texto sin timestamp de cierre (la ventana corta una frase): llega hasta el final
+            segments.append((start or 0.0, window.duration, text_tokens))
+
+        return [
+            {
+                "seek": int(window.offset * 100),
+                "start": round(window.offset + min(seg_start, window.duration), 3),
+                "end": round(window.offset + min(max(seg_end, seg_start), window.duration), 3),
+                "text": tokenizer.decode(tokens),
+                "tokens": tokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }
+            for seg_start, seg_end, tokens in segments
+            if tokenizer.decode(tokens).strip()
+        ]
+
+    @staticmethod
+    def _assemble(request: _Request) -> dict:
+        segments = []
+        for index in range(request.windows_total):
+            for segment in request.results[index]:
+                segments.append({"id": len(segments), **segment})
+        return {
+            "segments": segments,
+            "text": "".join(segment["text"] for segment in segments),
+            "language": request.language,
+        }
+
@@ -1,27 +1,72 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import whisper
 import uvicorn
 from pathlib import Path
 import tempfile
 import os
+import json
+import time
+import asyncio
+import threading
 from minio import Minio
+import redis
 import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from inference_scheduler import InferenceScheduler
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 app = FastAPI(title="Whisper Service")
 
-# Carga lazy del modelo para evitar bloquear el arranque del servicio
+# Carga lazy del modelo para evitar bloquear el arranque del servicio; whisper y torch
+# también se importan al cargarlo, así /health responde en cuanto arranca el proceso
 model = None
 model_name = os.environ.get("WHISPER_MODEL", "base")
 model_loading = False
 model_error = None
+# Un único modelo en memoria; las peticiones comparten su planificador de lotes
+scheduler = None
+scheduler_lock = threading.Lock()
+
+# Mismo canal/snapshot que usa el backend (app/services/progress.py)
+PROGRESS_TTL_SECONDS = 24 * 3600
+# Un único cliente (y pool de conexiones) para todo el proceso: el planificador publica
+# progreso una vez por ventana; redis-py conecta en el primer comando
+redis_client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://redis:6379/0"))
 
 class TranscribeFromMinIORequest(BaseModel):
     bucket: str = "vods"
     object_name: str  # ej: "job_id/audio.wav"
+    progress_job_id: str | None = None  # si se indica, se publica el avance en Redis
+
+
+def publish_transcription_progress(job_id: str, percent: float):
+    """Publica el porcentaje de transcripción en el canal de progreso del job"""
+    try:
+        payload = json.dumps({"job_id": job_id, "stage": "transcribing", "ts": time.time(), "percent": percent})
+        pipe = redis_client.pipeline()
+        pipe.publish(f"progress:{job_id}", payload)
+        pipe.hset(f"progress:{job_id}:snapshot", "transcribing", payload)
+        pipe.expire(f"progress:{job_id}:snapshot", PROGRESS_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        LOG.warning("Failed to publish transcription progress for %s: %s", job_id, e)
+
+
+def get_scheduler() -> "InferenceScheduler":
+    """Planificador de inferencia por lotes sobre el modelo (se crea al cargar el modelo)"""
+    global scheduler
+    from inference_scheduler import InferenceScheduler
+    mdl = get_model()
+    with scheduler_lock:
+        if scheduler is None:
+            scheduler = InferenceScheduler(mdl)
+            LOG.info("Inference scheduler started (batch size %d)", scheduler.batch_size)
+    return scheduler
 
 
 def get_model():
@@ -36,6 +81,7 @@ def get_model():
     try:
         model_loading = True
         LOG.info("Loading Whisper model '%s'...", model_name)
+        import whisper
         model = whisper.load_model(model_name)
         LOG.info("Whisper model '%s' loaded successfully", model_name)
         model_error = None
@@ -46,6 +92,14 @@ def get_model():
         raise HTTPException(status_code=500, detail=f"Failed to load model: {e}")
     finally:
         model_loading = False
+
+
+def load_audio(path: str):
+    """Audio mono float32 a 16 kHz (ffmpeg) con el formato que espera el modelo"""
+    from whisper.audio import load_audio as whisper_load_audio
+    return whisper_load_audio(path)
+
+
 def get_minio_client():
     """Crear cliente MinIO con las mismas configuraciones del backend"""
     endpoint = os.environ.get("MINIO_ENDPOINT", "minio:9000")
@@ -71,13 +125,15 @@ async def transcribe(file: UploadFile = File(...)):
     with open(temp_path, "wb") as f:
         f.write(await file.read())
 
-    # Cargar modelo si es necesario
-    mdl = get_model()
-
-    result = mdl.transcribe(str(temp_path))
-    
-    # Limpiar archivo temporal
-    temp_path.unlink(missing_ok=True)
+    try:
+        # ffmpeg y la primera carga del modelo bloquean: van al threadpool, no al event loop
+        audio = await run_in_threadpool(load_audio, str(temp_path))
+        inference = await run_in_threadpool(get_scheduler)
+        # Se espera al resultado sin bloquear el event loop
+        result = await asyncio.wrap_future(inference.submit(audio))
+    finally:
+        # Limpiar archivo temporal
+        temp_path.unlink(missing_ok=True)
     
     return {"segments": result["segments"], "text": result["text"]}
 @app.post("/transcribe-from-minio")
@@ -107,10 +163,12 @@ def transcribe_from_minio(req: TranscribeFromMinIORequest):
                 
                 LOG.info(f"Starting transcription of {temp_file_path}...")
                 
-                # Cargar modelo si es necesario
-                mdl = get_model()
-                # Transcribir usando Whisper
-                result = mdl.transcribe(temp_file_path)
+                audio = load_audio(temp_file_path)
+                on_progress = None
+                if req.progress_job_id:
+                    on_progress = lambda percent: publish_transcription_progress(req.progress_job_id, percent)
+                # Las ventanas de esta petición se decodifican en lote con las de las demás
+                result = get_scheduler().transcribe(audio, on_progress)
                 
                 LOG.info("Transcription completed successfully")
                 